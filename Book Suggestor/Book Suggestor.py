@@ -1,18 +1,30 @@
-import random
 import logging
-from typing import List, Optional
-from fastapi import FastAPI, Query, HTTPException
+import os
+import sys
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, Query, HTTPException, Request
 from pydantic import BaseModel
 import uvicorn
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.cache import query_key
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog
+from common.logs import log_event
+from common.metrics import instrument
+from common.registry import REGISTRY
+from common.scheduler import SCHEDULER, lifespan
+
 # Logging config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("book_suggestor_api")
 
-app = FastAPI(title="Book Suggestor API", version="1.0")
 
-# Mocked book data
-BOOK_DB = [
+app = FastAPI(title="Book Suggestor API", version="1.0", lifespan=lifespan)
+instrument(app, "books")
+
+# Mocked book data, stored column-wise
+BOOK_DB = Catalog([
     {"title": "1984", "author": "George Orwell", "genre": "dystopian", "decade": 1940},
     {"title": "Pride and Prejudice", "author": "Jane Austen", "genre": "romance", "decade": 1810},
     {"title": "The Hobbit", "author": "J.R.R. Tolkien", "genre": "fantasy", "decade": 1930},
@@ -22,7 +34,7 @@ BOOK_DB = [
     {"title": "Dune", "author": "Frank Herbert", "genre": "science fiction", "decade": 1960},
     {"title": "The Alchemist", "author": "Paulo Coelho", "genre": "philosophical", "decade": 1980},
     # Add more as needed
-]
+], keys=("genre",), ranges=("decade",))
 
 class Book(BaseModel):
     title: str
@@ -30,35 +42,47 @@ class Book(BaseModel):
     genre: str
     decade: int
 
+BOOK_CATALOG = REGISTRY.catalog(
+    "books", lambda: LiveCatalog(os.environ.get("BOOK_CATALOG_PATH"), fallback=BOOK_DB, model=Book, key=("title", "author"))
+)
+
+BOOK_CACHE = REGISTRY.cache("books")
+
+
+def book_filters(genre: Optional[str] = None, author: Optional[str] = None, decade: Optional[int] = None) -> Dict[str, Any]:
+    """`Catalog.select` arguments for a /suggest-books query (also run by bench.micro)."""
+    return dict(equals={"genre": genre, "decade": decade}, contains={"author": author})
+
+
 @app.get("/", tags=["Health"])
 def root():
     return {"status": "ok", "message": "Book Suggestor API is online."}
 
 
 @app.get("/suggest-books", response_model=List[Book], summary="Suggest books based on filters")
-def suggest_books(
+async def suggest_books(
+    request: Request,
     genre: Optional[str] = Query(None, description="Book genre (e.g., fantasy, drama)"),
     author: Optional[str] = Query(None, description="Author name"),
     decade: Optional[int] = Query(None, ge=1800, le=2020, description="Decade of publication"),
-    limit: int = Query(5, ge=1, le=20, description="Number of books to recommend")
+    limit: int = Query(5, ge=1, le=20, description="Number of books to recommend"),
+    seed: Optional[int] = Query(None, description="Seed for reproducible results")
 ):
-    logger.info(f"Suggesting books for genre={genre}, author={author}, decade={decade}, limit={limit}")
+    log_event(logger, "Suggesting books", genre=genre, author=author, decade=decade, limit=limit)
 
-    results = BOOK_DB
-    if genre:
-        results = [book for book in results if book["genre"].lower() == genre.lower()]
-    if author:
-        results = [book for book in results if author.lower() in book["author"].lower()]
-    if decade:
-        results = [book for book in results if book["decade"] == decade]
+    catalog = BOOK_CATALOG.current
+    filters = query_key(genre=genre, author=author, decade=decade)
+    row_ids = await BOOK_CACHE.select_async(catalog.version, filters, lambda: SCHEDULER.run(
+        BOOK_CATALOG, catalog, Catalog.select, **book_filters(genre, author, decade)
+    ))
 
-    if not results:
+    if len(row_ids) == 0:
         logger.warning("No matching books found.")
         raise HTTPException(status_code=404, detail="No books found for given filters.")
 
-    random.shuffle(results)
-    return results[:limit]
+    return BOOK_CACHE.sampled_response(request, catalog, filters, row_ids, limit, seed)
 
 
 if __name__ == "__main__":
-    uvicorn.run("book_suggestor_api:app", host="0.0.0.0", port=8000, workers=4, log_level="info")
+    os.environ.setdefault("WEB_CONCURRENCY", "4")
+    uvicorn.run("Book Suggestor:app", app_dir=os.path.dirname(os.path.abspath(__file__)), host="0.0.0.0", port=8000, log_level="info")
@@ -1,16 +1,27 @@
-from fastapi import FastAPI, Query, HTTPException
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, Query, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from typing import List, Optional
 import random
 import uvicorn
 import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.logs import log_event
+from common.metrics import instrument
+from common.news_feed import Headline, NewsFeed, drain_queue, follow_file, ingest
+from common.pubsub import EVICTED, Hub
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("celebrity_news_api")
 
-app = FastAPI(title="Celebrity News Updater API", version="1.0")
-
-# Simulated celebrity news database
+# Simulated celebrity news database, used to seed the feed at startup
 CELEBRITY_NEWS_DB = {
     "Taylor Swift": [
         "Taylor Swift announces new album release date.",
@@ -34,32 +45,180 @@ CELEBRITY_NEWS_DB = {
     ]
 }
 
+
+def normalize_name(name: str) -> str:
+    return name.strip().title()
+
+
+# Bounded per-celebrity ring buffers of timestamped headlines
+NEWS_FEED = NewsFeed(per_celebrity=100, combined=1000)
+for celebrity, headlines in CELEBRITY_NEWS_DB.items():
+    for headline in headlines:
+        NEWS_FEED.add(celebrity, headline)
+
+# Stand-in for a message broker: records put here are ingested when no source file is configured
+NEWS_QUEUE: "asyncio.Queue[dict]" = asyncio.Queue()
+
+# Pushes each ingested headline to stream/long-poll subscribers of that celebrity
+NEWS_HUB = Hub(max_queue=100)
+
+# Seconds between SSE keep-alive comments on idle streams
+HEARTBEAT_INTERVAL = 15
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Stream new headlines from CELEBRITY_NEWS_SOURCE (a JSON-lines file) or from NEWS_QUEUE
+    source_path = os.environ.get("CELEBRITY_NEWS_SOURCE")
+    source = follow_file(source_path) if source_path else drain_queue(NEWS_QUEUE)
+    task = asyncio.create_task(
+        ingest(NEWS_FEED, source, normalize_name, on_headline=lambda item: NEWS_HUB.publish(item.name, item))
+    )
+    yield
+    task.cancel()
+
+
+app = FastAPI(title="Celebrity News Updater API", version="1.0", lifespan=lifespan)
+instrument(app, "celebrities")
+
+
+class NewsItem(BaseModel):
+    seq: int
+    name: str
+    headline: str
+    published_at: float
+
+
+class NewsPollResponse(BaseModel):
+    cursor: int
+    items: List[NewsItem]
+
+
+def subscription_names(names: Optional[List[str]]) -> Optional[List[str]]:
+    """Normalized celebrity names from a `names` query, or None for every celebrity."""
+    if not names:
+        return None
+    return [normalize_name(name) for value in names for name in value.split(",") if name.strip()] or None
+
+
+def format_event(item: Headline) -> str:
+    return f"id: {item.seq}\nevent: headline\ndata: {json.dumps(item._asdict())}\n\n"
+
+
 @app.get("/celebrity-news", summary="Get latest news about a celebrity")
-def get_celebrity_news(
-    name: Optional[str] = Query(None, description="Celebrity name to get news for")
+async def get_celebrity_news(
+    response: Response,
+    name: Optional[str] = Query(None, description="Celebrity name to get news for"),
+    since: Optional[int] = Query(None, ge=0, description="Only return headlines newer than this cursor"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of headlines to return"),
 ) -> List[str]:
     """
-    Returns recent news headlines about a given celebrity.
-    If no name is provided, news from random celebrities will be returned.
+    Returns recent news headlines about a given celebrity, oldest first.
+    If no name is provided, news from random celebrities will be returned,
+    or with `since`, every celebrity's headlines newer than the cursor.
+    The `X-News-Cursor` response header holds the cursor to pass as `since`
+    on the next call.
     """
-    logger.info(f"Fetching news for celebrity: {name or 'random selection'}")
-    
+    log_event(logger, "Fetching celebrity news", name=name, since=since, limit=limit)
+
     try:
         if name:
-            name = name.strip().title()
-            if name not in CELEBRITY_NEWS_DB:
+            name = normalize_name(name)
+            if name not in NEWS_FEED:
                 raise HTTPException(status_code=404, detail="Celebrity not found.")
-            return CELEBRITY_NEWS_DB[name]
+            items = NEWS_FEED.latest(name, since, limit)
+        elif since is not None:
+            items = NEWS_FEED.latest(None, since, limit)
         else:
             # Randomly return 1 headline from 3 different celebrities
-            random_celebrities = random.sample(list(CELEBRITY_NEWS_DB.items()), k=3)
-            mixed_news = [random.choice(news_list) for _, news_list in random_celebrities]
-            return mixed_news
+            random_celebrities = random.sample(NEWS_FEED.names, k=min(3, len(NEWS_FEED.names)))
+            buffers = [NEWS_FEED.buffer(celebrity) for celebrity in random_celebrities]
+            items = [buffer[random.randrange(len(buffer))] for buffer in buffers]
+
+        cursor = max((item.seq for item in items), default=since or 0) if since is not None else NEWS_FEED.cursor
+        response.headers["X-News-Cursor"] = str(cursor)
+        return [item.headline for item in items]
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to fetch celebrity news")
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
+
+@app.get("/celebrity-news/stream", summary="Stream new headlines as Server-Sent Events")
+async def stream_celebrity_news(
+    names: Optional[List[str]] = Query(None, description="Celebrities to follow (repeat or comma-separate); all if omitted"),
+    since: Optional[int] = Query(None, ge=0, description="Replay buffered headlines newer than this cursor first"),
+    last_event_id: Optional[str] = Header(None, description="Set by EventSource on reconnect; same as `since`"),
+):
+    """
+    Pushes each new headline for the subscribed celebrities as an SSE `headline`
+    event whose id is its cursor. Clients that fall too far behind are sent an
+    `evicted` event and disconnected; they can reconnect with Last-Event-ID.
+    """
+    topics = subscription_names(names)
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    log_event(logger, "Opening news stream", topics=topics, since=since)
+
+    # Subscribe before reading the backlog so nothing published in between is missed
+    subscription = NEWS_HUB.subscribe(topics)
+    backlog = NEWS_FEED.latest_many(topics, since, NEWS_FEED.per_celebrity) if since is not None else []
+
+    async def events():
+        last_seq = backlog[-1].seq if backlog else (since or 0)
+        try:
+            yield "retry: 3000\n\n"
+            for item in backlog:
+                yield format_event(item)
+            while True:
+                item = await subscription.get(timeout=HEARTBEAT_INTERVAL)
+                if item is None:
+                    yield ": keep-alive\n\n"
+                elif item is EVICTED:
+                    yield "event: evicted\ndata: {}\n\n"
+                    return
+                elif item.seq > last_seq:
+                    last_seq = item.seq
+                    yield format_event(item)
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/celebrity-news/poll", response_model=NewsPollResponse, summary="Long-poll for new headlines")
+async def poll_celebrity_news(
+    names: Optional[List[str]] = Query(None, description="Celebrities to follow (repeat or comma-separate); all if omitted"),
+    since: Optional[int] = Query(None, ge=0, description="Cursor from the previous poll; defaults to now"),
+    timeout: float = Query(25, ge=0, le=60, description="Seconds to wait for a new headline"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of headlines to return"),
+):
+    """
+    Fallback for clients without SSE support: returns headlines newer than
+    `since` immediately if there are any, otherwise waits up to `timeout`
+    seconds for the next one.
+    """
+    topics = subscription_names(names)
+    if since is None:
+        since = NEWS_FEED.cursor
+
+    items = NEWS_FEED.latest_many(topics, since, limit)
+    if not items and timeout > 0:
+        with NEWS_HUB.subscribe(topics) as subscription:
+            await subscription.get(timeout=timeout)
+        items = NEWS_FEED.latest_many(topics, since, limit)
+
+    return NewsPollResponse(
+        cursor=items[-1].seq if items else since,
+        items=[NewsItem(**item._asdict()) for item in items],
+    )
+
 if __name__ == "__main__":
     # Run with multiple workers for concurrency
-    uvicorn.run("celebrity_news_api:app", host="0.0.0.0", port=8002, log_level="info", workers=4)
+    uvicorn.run("Celebrity news updater:app", app_dir=os.path.dirname(os.path.abspath(__file__)), host="0.0.0.0", port=8002, log_level="info", workers=4)
@@ -1,16 +1,28 @@
-import random
 import logging
-from typing import List, Optional
-from fastapi import FastAPI, Query, HTTPException
+import os
+import sys
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, Query, HTTPException, Request
 from pydantic import BaseModel
 import uvicorn
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.cache import query_key
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog
+from common.logs import log_event
+from common.metrics import instrument
+from common.registry import REGISTRY
+from common.scheduler import SCHEDULER, lifespan
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("game_finder_api")
 
-app = FastAPI(title="Game Finder API", version="1.0")
 
-GAME_DB = [
+app = FastAPI(title="Game Finder API", version="1.0", lifespan=lifespan)
+instrument(app, "games")
+
+GAME_DB = Catalog([
     {"title": "The Legend of Zelda: Breath of the Wild", "platform": "Nintendo", "genre": "adventure"},
     {"title": "God of War", "platform": "PlayStation", "genre": "action"},
     {"title": "Minecraft", "platform": "All", "genre": "sandbox"},
@@ -19,37 +31,52 @@ GAME_DB = [
     {"title": "Stardew Valley", "platform": "All", "genre": "simulation"},
     {"title": "Fortnite", "platform": "All", "genre": "battle royale"},
     {"title": "Celeste", "platform": "PC", "genre": "platformer"},
-]
+], searchable=("title", "platform", "genre"))
 
 class Game(BaseModel):
     title: str
     platform: str
     genre: str
 
+GAME_CATALOG = REGISTRY.catalog(
+    "games", lambda: LiveCatalog(os.environ.get("GAME_CATALOG_PATH"), fallback=GAME_DB, model=Game, key=("title", "platform"))
+)
+
+GAME_CACHE = REGISTRY.cache("games")
+
+
+def game_filters(platform: Optional[str] = None, genre: Optional[str] = None, q: Optional[str] = None) -> Dict[str, Any]:
+    """`Catalog.select` arguments for a /suggest-games query (also run by bench.micro)."""
+    return dict(contains={"platform": platform, "genre": genre}, text=q)
+
+
 @app.get("/", tags=["Health"])
 def root():
     return {"status": "ok", "message": "Game Finder API is online."}
 
 @app.get("/suggest-games", response_model=List[Game], summary="Suggest video games to play")
-def suggest_games(
+async def suggest_games(
+    request: Request,
     platform: Optional[str] = Query(None, description="Platform (e.g., PC, Nintendo)"),
     genre: Optional[str] = Query(None, description="Genre (e.g., RPG, adventure)"),
-    limit: int = Query(5, ge=1, le=20, description="Number of games to recommend")
+    q: Optional[str] = Query(None, description="Free-text search across title, platform and genre"),
+    limit: int = Query(5, ge=1, le=20, description="Number of games to recommend"),
+    seed: Optional[int] = Query(None, description="Seed for reproducible results")
 ):
-    logger.info(f"Suggesting games for platform={platform}, genre={genre}, limit={limit}")
+    log_event(logger, "Suggesting games", platform=platform, genre=genre, q=q, limit=limit)
 
-    results = GAME_DB
-    if platform:
-        results = [game for game in results if platform.lower() in game["platform"].lower()]
-    if genre:
-        results = [game for game in results if genre.lower() in game["genre"].lower()]
+    catalog = GAME_CATALOG.current
+    filters = query_key(platform=platform, genre=genre, q=q)
+    row_ids = await GAME_CACHE.select_async(catalog.version, filters, lambda: SCHEDULER.run(
+        GAME_CATALOG, catalog, Catalog.select, **game_filters(platform, genre, q)
+    ))
 
-    if not results:
+    if len(row_ids) == 0:
         logger.warning("No matching games found.")
         raise HTTPException(status_code=404, detail="No games found for given filters.")
 
-    random.shuffle(results)
-    return results[:limit]
+    return GAME_CACHE.sampled_response(request, catalog, filters, row_ids, limit, seed)
 
 if __name__ == "__main__":
-    uvicorn.run("game_finder_api:app", host="0.0.0.0", port=8001, workers=4, log_level="info")
+    os.environ.setdefault("WEB_CONCURRENCY", "4")
+    uvicorn.run("Game finder:app", app_dir=os.path.dirname(os.path.abspath(__file__)), host="0.0.0.0", port=8001, log_level="info")
@@ -1,18 +1,31 @@
 import logging
-from typing import List, Optional
-from fastapi import FastAPI, Query, HTTPException
+import os
+import sys
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, Query, HTTPException, Request
 from pydantic import BaseModel
-import random
 import uvicorn
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.cache import query_key
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog
+from common.logs import log_event
+from common.metrics import instrument
+from common.registry import REGISTRY
+from common.scheduler import SCHEDULER, lifespan
+from common.similarity import LiveSimilarity
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("movie_recommender_api")
 
-app = FastAPI(title="Movie Recommender API", version="1.0")
 
-# Sample movie database
-MOVIE_DB = [
+app = FastAPI(title="Movie Recommender API", version="1.0", lifespan=lifespan)
+instrument(app, "movies")
+
+# Sample movie database, stored column-wise
+MOVIE_DB = Catalog([
     {"title": "Inception", "genre": "sci-fi", "language": "english", "year": 2010},
     {"title": "Interstellar", "genre": "sci-fi", "language": "english", "year": 2014},
     {"title": "Parasite", "genre": "thriller", "language": "korean", "year": 2019},
@@ -22,7 +35,7 @@ MOVIE_DB = [
     {"title": "Spirited Away", "genre": "fantasy", "language": "japanese", "year": 2001},
     {"title": "3 Idiots", "genre": "comedy", "language": "hindi", "year": 2009},
     # Add more entries as needed
-]
+], keys=("genre", "language"), ranges=("year",))
 
 # Response model
 class Movie(BaseModel):
@@ -31,6 +44,22 @@ class Movie(BaseModel):
     language: str
     year: int
 
+MOVIE_CATALOG = REGISTRY.catalog(
+    "movies", lambda: LiveCatalog(os.environ.get("MOVIE_CATALOG_PATH"), fallback=MOVIE_DB, model=Movie, key=("title", "year"))
+)
+
+MOVIE_CACHE = REGISTRY.cache("movies")
+
+# Feature weights for "more like this"; release years 30 apart count as unrelated
+MOVIE_SIMILARITY = LiveSimilarity(categorical={"genre": 1.0, "language": 0.75}, numeric={"year": (0.75, 30)})
+
+
+def movie_filters(
+    genre: Optional[str] = None, language: Optional[str] = None, year_from: Optional[int] = None, year_to: Optional[int] = None
+) -> Dict[str, Any]:
+    """`Catalog.select` arguments for a /recommend query (also run by bench.micro)."""
+    return dict(equals={"genre": genre, "language": language}, ranges={"year": (year_from, year_to)})
+
 
 @app.get("/", tags=["Health"])
 async def health_check():
@@ -39,37 +68,68 @@ async def health_check():
 
 @app.get("/recommend", response_model=List[Movie], summary="Get movie recommendations")
 async def recommend_movies(
+    request: Request,
     genre: Optional[str] = Query(None, description="Preferred genre"),
     language: Optional[str] = Query(None, description="Preferred language"),
     year: Optional[int] = Query(None, ge=1900, le=2050, description="Preferred release year"),
-    limit: int = Query(5, ge=1, le=20, description="Number of recommendations to return")
+    year_from: Optional[int] = Query(None, ge=1900, le=2050, description="Earliest release year"),
+    year_to: Optional[int] = Query(None, ge=1900, le=2050, description="Latest release year"),
+    limit: int = Query(5, ge=1, le=20, description="Number of recommendations to return"),
+    seed: Optional[int] = Query(None, description="Seed for reproducible results")
 ):
     """
-    Recommend movies based on genre, language, and year.
+    Recommend movies based on genre, language, and year (or a year range).
     If no filter is provided, random movies are returned.
     """
-    logger.info(f"Received recommendation request with genre={genre}, language={language}, year={year}, limit={limit}")
+    log_event(
+        logger, "Received recommendation request",
+        genre=genre, language=language, year=year, year_from=year_from, year_to=year_to, limit=limit,
+    )
 
-    # Filter the movie DB based on query
-    filtered = MOVIE_DB
-
-    if genre:
-        filtered = [m for m in filtered if m["genre"].lower() == genre.lower()]
-    if language:
-        filtered = [m for m in filtered if m["language"].lower() == language.lower()]
     if year:
-        filtered = [m for m in filtered if m["year"] == year]
+        year_from = year_to = year
+
+    # Resolve the filters through the catalog indexes, then fetch only the sampled rows
+    catalog = MOVIE_CATALOG.current
+    filters = query_key(genre=genre, language=language, year_from=year_from, year_to=year_to)
+    row_ids = await MOVIE_CACHE.select_async(catalog.version, filters, lambda: SCHEDULER.run(
+        MOVIE_CATALOG, catalog, Catalog.select, **movie_filters(genre, language, year_from, year_to)
+    ))
 
-    if not filtered:
+    if len(row_ids) == 0:
         logger.warning("No matching movies found")
         raise HTTPException(status_code=404, detail="No matching movies found.")
 
-    # Shuffle and return up to `limit` results
-    random.shuffle(filtered)
-    logger.info(f"Returning {min(limit, len(filtered))} recommendations")
-    return filtered[:limit]
+    log_event(logger, "Returning recommendations", count=min(limit, len(row_ids)))
+    return MOVIE_CACHE.sampled_response(request, catalog, filters, row_ids, limit, seed)
+
+
+
+@app.get("/recommend/similar", response_model=List[Movie], summary="Recommend movies similar to a given movie")
+async def recommend_similar(
+    request: Request,
+    title: str = Query(..., description="Title of a movie in the catalog"),
+    limit: int = Query(5, ge=1, le=20, description="Number of recommendations to return")
+):
+    """
+    Rank the catalog by similarity to the given movie (genre, language and
+    release year) and return the closest matches, most similar first.
+    """
+    log_event(logger, "Received similarity request", title=title, limit=limit)
+
+    catalog = MOVIE_CATALOG.current
+    matches = await SCHEDULER.run(MOVIE_CATALOG, catalog, Catalog.select, equals={"title": title})
+    if len(matches) == 0:
+        logger.warning("Movie not found in catalog")
+        raise HTTPException(status_code=404, detail="Movie not found.")
+
+    async def rank():
+        return catalog.json_array(await SCHEDULER.run(MOVIE_CATALOG, catalog, MOVIE_SIMILARITY.similar, int(matches[0]), limit))
+
+    return await MOVIE_CACHE.json_response_async(request, catalog.version, query_key(similar_to=title, limit=limit), rank)
 
 
 if __name__ == "__main__":
-    # Run with: uvicorn movie_recommender_api:app --host 0.0.0.0 --port 8000 --workers 4
-    uvicorn.run("movie_recommender_api:app", host="0.0.0.0", port=8000, log_level="info", workers=4)
+    # Run with: WEB_CONCURRENCY=4 uvicorn "Movie recommender:app" --app-dir "Movie recommender" --host 0.0.0.0 --port 8004
+    os.environ.setdefault("WEB_CONCURRENCY", "4")
+    uvicorn.run("Movie recommender:app", app_dir=os.path.dirname(os.path.abspath(__file__)), host="0.0.0.0", port=8004, log_level="info")
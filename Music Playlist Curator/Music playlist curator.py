@@ -1,18 +1,33 @@
-import random
 import logging
-from typing import List, Optional
-from fastapi import FastAPI, Query, HTTPException
+import os
+import sys
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.cache import query_key
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog
+from common.logs import log_event
+from common.metrics import instrument
+from common.playlist import PlaylistEngine
+from common.registry import REGISTRY
+from common.scheduler import SCHEDULER, lifespan
+from common.similarity import LiveSimilarity
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("music_playlist_curator_api")
 
-app = FastAPI(title="Music Playlist Curator API", version="1.0")
 
-# Sample music track database (mocked)
-MUSIC_DB = [
+app = FastAPI(title="Music Playlist Curator API", version="1.0", lifespan=lifespan)
+instrument(app, "music")
+
+# Sample music track database (mocked), stored column-wise
+MUSIC_DB = Catalog([
     {"title": "Blinding Lights", "artist": "The Weeknd", "genre": "pop", "mood": "energetic", "decade": 2020},
     {"title": "Someone Like You", "artist": "Adele", "genre": "pop", "mood": "sad", "decade": 2010},
     {"title": "Bohemian Rhapsody", "artist": "Queen", "genre": "rock", "mood": "dramatic", "decade": 1970},
@@ -24,7 +39,7 @@ MUSIC_DB = [
     {"title": "Imagine", "artist": "John Lennon", "genre": "rock", "mood": "hopeful", "decade": 1970},
     {"title": "Blowin' in the Wind", "artist": "Bob Dylan", "genre": "folk", "mood": "thoughtful", "decade": 1960},
     # Add more tracks as needed
-]
+], keys=("genre", "mood"), ranges=("decade",))
 
 # Response model
 class Track(BaseModel):
@@ -34,6 +49,32 @@ class Track(BaseModel):
     mood: str
     decade: int
 
+MUSIC_CATALOG = REGISTRY.catalog(
+    "music", lambda: LiveCatalog(os.environ.get("MUSIC_CATALOG_PATH"), fallback=MUSIC_DB, model=Track, key=("title", "artist"))
+)
+
+MUSIC_CACHE = REGISTRY.cache("music")
+
+# Feature weights for "more like this"; decades 30 years apart count as unrelated
+MUSIC_SIMILARITY = LiveSimilarity(
+    categorical={"genre": 1.0, "mood": 1.0, "artist": 0.75}, numeric={"decade": (0.75, 30)}
+)
+
+# Energy level of each mood, so generated playlists move between moods gradually
+MOOD_LEVELS = {
+    "peaceful": 0, "sad": 1, "thoughtful": 1, "hopeful": 2, "romantic": 2,
+    "dramatic": 3, "happy": 3, "angsty": 4, "motivational": 4, "energetic": 5,
+}
+
+# Generation time allowed per playlist; playlists that use it up end early
+PLAYLIST_BUDGET_SECONDS = 0.25
+PLAYLIST_ENGINE = PlaylistEngine(MOOD_LEVELS, budget=PLAYLIST_BUDGET_SECONDS)
+
+
+def track_filters(genre: Optional[str] = None, mood: Optional[str] = None, decade: Optional[int] = None) -> Dict[str, Any]:
+    """`Catalog.select` arguments for a /curate-playlist query (also run by bench.micro)."""
+    return dict(equals={"genre": genre, "mood": mood, "decade": decade})
+
 
 @app.get("/", tags=["Health"])
 async def health_check():
@@ -42,36 +83,101 @@ async def health_check():
 
 @app.get("/curate-playlist", response_model=List[Track], summary="Generate a music playlist")
 async def curate_playlist(
+    request: Request,
     genre: Optional[str] = Query(None, description="Preferred music genre (e.g., pop, rock, hip-hop)"),
     mood: Optional[str] = Query(None, description="Preferred mood (e.g., happy, sad, energetic)"),
     decade: Optional[int] = Query(None, ge=1950, le=2020, description="Preferred decade (e.g., 1980)"),
-    limit: int = Query(5, ge=1, le=20, description="Number of songs to include in the playlist")
+    limit: int = Query(5, ge=1, le=20, description="Number of songs to include in the playlist"),
+    seed: Optional[int] = Query(None, description="Seed for reproducible results")
 ):
     """
     Create a personalized music playlist based on genre, mood, and decade.
     Defaults to a random mix if no filter is provided.
     """
-    logger.info(f"Received request: genre={genre}, mood={mood}, decade={decade}, limit={limit}")
+    log_event(logger, "Received playlist request", genre=genre, mood=mood, decade=decade, limit=limit)
 
-    filtered_tracks = MUSIC_DB
+    catalog = MUSIC_CATALOG.current
+    filters = query_key(genre=genre, mood=mood, decade=decade)
+    row_ids = await MUSIC_CACHE.select_async(catalog.version, filters, lambda: SCHEDULER.run(
+        MUSIC_CATALOG, catalog, Catalog.select, **track_filters(genre, mood, decade)
+    ))
 
-    if genre:
-        filtered_tracks = [track for track in filtered_tracks if track["genre"].lower() == genre.lower()]
-    if mood:
-        filtered_tracks = [track for track in filtered_tracks if track["mood"].lower() == mood.lower()]
-    if decade:
-        filtered_tracks = [track for track in filtered_tracks if track["decade"] == decade]
-
-    if not filtered_tracks:
+    if len(row_ids) == 0:
         logger.warning("No matching tracks found.")
         raise HTTPException(status_code=404, detail="No matching tracks found.")
 
-    random.shuffle(filtered_tracks)
-    selected = filtered_tracks[:limit]
-    logger.info(f"Returning {len(selected)} tracks.")
-    return selected
+    log_event(logger, "Returning tracks", count=min(limit, len(row_ids)))
+    return MUSIC_CACHE.sampled_response(request, catalog, filters, row_ids, limit, seed)
+
+
+
+@app.get("/curate-playlist/similar", response_model=List[Track], summary="Find tracks similar to a given track")
+async def curate_similar(
+    request: Request,
+    title: str = Query(..., description="Title of a track in the catalog"),
+    artist: Optional[str] = Query(None, description="Artist, to pick between tracks sharing a title"),
+    limit: int = Query(5, ge=1, le=20, description="Number of songs to include in the playlist")
+):
+    """
+    Rank the catalog by similarity to the given track (genre, mood, artist
+    and decade) and return the closest matches, most similar first.
+    """
+    log_event(logger, "Received similarity request", title=title, artist=artist, limit=limit)
+
+    catalog = MUSIC_CATALOG.current
+    matches = await SCHEDULER.run(MUSIC_CATALOG, catalog, Catalog.select, equals={"title": title, "artist": artist})
+    if len(matches) == 0:
+        logger.warning("Track not found in catalog.")
+        raise HTTPException(status_code=404, detail="Track not found.")
+
+    async def rank():
+        return catalog.json_array(await SCHEDULER.run(MUSIC_CATALOG, catalog, MUSIC_SIMILARITY.similar, int(matches[0]), limit))
+
+    return await MUSIC_CACHE.json_response_async(
+        request, catalog.version, query_key(similar_to=title, artist=artist, limit=limit), rank
+    )
+
+
+
+@app.get(
+    "/curate-playlist/generate",
+    response_class=StreamingResponse,
+    responses={200: {"description": "One Track object per line", "content": {"application/x-ndjson": {}}}},
+    summary="Generate a long, smoothly sequenced playlist",
+)
+async def generate_playlist(
+    genre: Optional[str] = Query(None, description="Keep the playlist within this genre"),
+    mood: Optional[str] = Query(None, description="Mood to start from (e.g., peaceful, energetic)"),
+    decade: Optional[int] = Query(None, ge=1950, le=2020, description="Decade to start from"),
+    length: int = Query(100, ge=1, le=1000, description="Number of tracks in the playlist"),
+    artist_gap: int = Query(5, ge=1, le=50, description="Songs by the same artist are at least this many positions apart, i.e. artist_gap - 1 other tracks between them"),
+    seed: Optional[int] = Query(None, description="Seed for reproducible results")
+):
+    """
+    Generate a playlist of up to `length` tracks, streamed as NDJSON while it
+    is sequenced. Consecutive tracks change mood and decade gradually, the
+    same artist never appears twice within `artist_gap` tracks and no track
+    repeats, so the playlist ends early once the catalog runs out of
+    eligible tracks.
+    """
+    log_event(logger, "Generating playlist", genre=genre, mood=mood, decade=decade, length=length, artist_gap=artist_gap)
+
+    catalog = MUSIC_CATALOG.current
+    # Sequencing is lazy, so tracks are sent as they are chosen; a worker process has to collect them to return them
+    if SCHEDULER.lane(MUSIC_CATALOG, catalog) == "process":
+        sequence = PLAYLIST_ENGINE.playlist
+    else:
+        sequence = PLAYLIST_ENGINE.generate
+    tracks = await SCHEDULER.run(
+        MUSIC_CATALOG, catalog, sequence, length, artist_gap, genre=genre, mood=mood, decade=decade, seed=seed
+    )
+    if tracks is None:
+        logger.warning("No matching tracks found.")
+        raise HTTPException(status_code=404, detail="No matching tracks found.")
+    return StreamingResponse(catalog.json_lines(tracks), media_type="application/x-ndjson")
 
 
 if __name__ == "__main__":
-    # Run with: uvicorn music_playlist_curator_api:app --host 0.0.0.0 --port 8000 --workers 4
-    uvicorn.run("music_playlist_curator_api:app", host="0.0.0.0", port=8000, log_level="info", workers=4)
+    # Run with: WEB_CONCURRENCY=4 uvicorn "Music playlist curator:app" --app-dir "Music Playlist Curator" --host 0.0.0.0 --port 8005
+    os.environ.setdefault("WEB_CONCURRENCY", "4")
+    uvicorn.run("Music playlist curator:app", app_dir=os.path.dirname(os.path.abspath(__file__)), host="0.0.0.0", port=8005, log_level="info")
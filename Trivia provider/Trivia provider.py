@@ -1,59 +1,198 @@
-from fastapi import FastAPI, Query, HTTPException
-from typing import Optional, List, Dict
+from fastapi import FastAPI, Query, HTTPException, Request, Response
+from pydantic import BaseModel
+from typing import NamedTuple, Optional, List, Dict, Sequence
+import base64
+import json
 import random
+import secrets
 import uvicorn
 import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog
+from common.logs import log_event
+from common.metrics import instrument
+from common.registry import REGISTRY
+from common.sampling import Permutation
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("trivia_provider_api")
 
 app = FastAPI(title="Trivia Provider API", version="1.0")
+instrument(app, "trivia")
+
+# Simulated trivia database, stored column-wise with an index on category
+TRIVIA_DB = Catalog([
+    {"category": "general", "question": "What is the capital of France?", "answer": "Paris"},
+    {"category": "general", "question": "What planet is known as the Red Planet?", "answer": "Mars"},
+    {"category": "science", "question": "What is the chemical symbol for water?", "answer": "H₂O"},
+    {"category": "science", "question": "What gas do plants absorb from the atmosphere?", "answer": "Carbon Dioxide"},
+    {"category": "history", "question": "Who was the first President of the United States?", "answer": "George Washington"},
+    {"category": "history", "question": "In which year did World War II end?", "answer": "1945"},
+    {"category": "sports", "question": "How many players are there in a football team?", "answer": "11"},
+    {"category": "sports", "question": "Which country won the FIFA World Cup in 2018?", "answer": "France"},
+    {"category": "tech", "question": "Who founded Microsoft?", "answer": "Bill Gates"},
+    {"category": "tech", "question": "What does 'CPU' stand for?", "answer": "Central Processing Unit"},
+], keys=("category",))
+
+
+class TriviaQuestion(BaseModel):
+    question: str
+    answer: str
+
+
+TRIVIA_CATALOG = REGISTRY.catalog(
+    "trivia", lambda: LiveCatalog(os.environ.get("TRIVIA_CATALOG_PATH"), fallback=TRIVIA_DB, model=TriviaQuestion, key=("category", "question"))
+)
+TRIVIA_CACHE = REGISTRY.cache("trivia")
+
+MAX_QUESTIONS_PER_REQUEST = 100
+
+
+class QuizCursor(NamedTuple):
+    """
+    Where a quiz stands: its category, the seed of its question order, the
+    catalog version it started on and how far it has drawn. That is all a
+    seeded Permutation needs, so the cursor travels as the session token
+    and any worker can continue the quiz without keeping state.
+    """
+
+    category: str
+    seed: int
+    version: str
+    offset: int
+
+    def token(self) -> str:
+        data = json.dumps(list(self), separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+    @classmethod
+    def parse(cls, token: str) -> Optional["QuizCursor"]:
+        """The cursor in `token`, or None when it is not one."""
+        try:
+            category, seed, version, offset = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        except (ValueError, TypeError):
+            return None
+        if not (isinstance(category, str) and isinstance(version, str) and type(seed) is int and type(offset) is int and offset >= 0):
+            return None
+        return cls(category, seed, version, offset)
+
+    def draw(self, catalog: Catalog, row_ids: Sequence[int], n: int) -> List[Dict[str, str]]:
+        """The next `n` questions (fewer once the category is exhausted), never repeating one."""
+        permutation = Permutation(len(row_ids), self.seed)
+        positions = range(min(self.offset, len(row_ids)), min(self.offset + n, len(row_ids)))
+        return catalog.rows([row_ids[permutation[i]] for i in positions])
+
+
+class TriviaSession(BaseModel):
+    session_id: str
+    category: str
+    total: int
+    remaining: int
+
+
+class TriviaDraw(BaseModel):
+    session_id: str  # to draw the following questions with
+    questions: List[TriviaQuestion]
+    remaining: int
+
+
+def category_questions(catalog: Catalog, category: str) -> Sequence[int]:
+    """Row ids of the questions in `category`; 404 when it has none."""
+    row_ids = catalog.select(equals={"category": category}) if category.strip() else ()
+    if len(row_ids) == 0:
+        raise HTTPException(status_code=404, detail=f"Category '{category}' not found.")
+    return row_ids
 
-# Simulated trivia database
-TRIVIA_DB: Dict[str, List[Dict[str, str]]] = {
-    "general": [
-        {"question": "What is the capital of France?", "answer": "Paris"},
-        {"question": "What planet is known as the Red Planet?", "answer": "Mars"},
-    ],
-    "science": [
-        {"question": "What is the chemical symbol for water?", "answer": "H₂O"},
-        {"question": "What gas do plants absorb from the atmosphere?", "answer": "Carbon Dioxide"},
-    ],
-    "history": [
-        {"question": "Who was the first President of the United States?", "answer": "George Washington"},
-        {"question": "In which year did World War II end?", "answer": "1945"},
-    ],
-    "sports": [
-        {"question": "How many players are there in a football team?", "answer": "11"},
-        {"question": "Which country won the FIFA World Cup in 2018?", "answer": "France"},
-    ],
-    "tech": [
-        {"question": "Who founded Microsoft?", "answer": "Bill Gates"},
-        {"question": "What does 'CPU' stand for?", "answer": "Central Processing Unit"},
-    ]
-}
 
 @app.get("/trivia", summary="Get a random trivia question")
 def get_trivia(
-    category: Optional[str] = Query("general", description="Category of trivia (e.g., general, science, history, sports, tech)")
+    request: Request,
+    category: Optional[str] = Query("general", description="Category of trivia (e.g., general, science, history, sports, tech)"),
+    seed: Optional[int] = Query(None, description="Seed for a reproducible question")
 ) -> Dict[str, str]:
     """
     Returns a random trivia question and answer from a specified category.
     If no category is provided, 'general' is used as default.
     """
-    logger.info(f"Fetching trivia for category: {category}")
+    log_event(logger, "Fetching trivia", category=category)
     category = category.lower()
-
-    if category not in TRIVIA_DB:
-        raise HTTPException(status_code=404, detail=f"Category '{category}' not found.")
+    catalog = TRIVIA_CATALOG.current
+    row_ids = category_questions(catalog, category)
 
     try:
-        trivia_item = random.choice(TRIVIA_DB[category])
-        return trivia_item
+        if seed is not None:
+            return TRIVIA_CACHE.json_response(
+                request, catalog.version, (("category", category), ("seed", seed)),
+                lambda: catalog.json_row(row_ids[random.Random(seed).randrange(len(row_ids))]),
+            )
+        return Response(catalog.json_row(row_ids[random.randrange(len(row_ids))]), media_type="application/json")
     except Exception as e:
         logger.exception("Failed to fetch trivia")
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
+
+@app.post("/trivia/sessions", response_model=TriviaSession, status_code=201, summary="Start a quiz session")
+def create_session(
+    category: str = Query("general", description="Category of trivia (e.g., general, science, history, sports, tech)"),
+    seed: Optional[int] = Query(None, description="Seed for a reproducible question order")
+):
+    """
+    Start a quiz over a category. Questions are then drawn with
+    `/trivia/sessions/{session_id}/next` and never repeat within the session.
+    """
+    category = category.lower()
+    catalog = TRIVIA_CATALOG.current
+    row_ids = category_questions(catalog, category)
+    cursor = QuizCursor(category, secrets.randbits(64) if seed is None else seed, catalog.version, 0)
+    log_event(logger, "Started trivia session", category=category)
+    return TriviaSession(session_id=cursor.token(), category=category, total=len(row_ids), remaining=len(row_ids))
+
+
+@app.get("/trivia/sessions/{session_id}/next", response_model=TriviaDraw, summary="Draw the next questions of a quiz session")
+def next_questions(
+    session_id: str,
+    n: int = Query(1, ge=1, le=MAX_QUESTIONS_PER_REQUEST, description="Number of questions to draw")
+):
+    """
+    Draw the next `n` questions of the session without replacement. Once
+    the category is exhausted, fewer (eventually no) questions are returned.
+    The response carries the `session_id` to draw the following questions
+    with; drawing again with the same one returns the same questions.
+    """
+    cursor = QuizCursor.parse(session_id)
+    if cursor is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    catalog = TRIVIA_CATALOG.current
+    if catalog.version != cursor.version:
+        raise HTTPException(status_code=410, detail="The questions changed since this session started; start a new one.")
+    row_ids = category_questions(catalog, cursor.category)
+    questions = cursor.draw(catalog, row_ids, n)
+    following = cursor._replace(offset=min(cursor.offset + n, len(row_ids)))
+    return TriviaDraw(session_id=following.token(), questions=questions, remaining=len(row_ids) - following.offset)
+
+
+@app.get("/trivia/pack", response_model=List[TriviaQuestion], summary="Get a batch of distinct trivia questions")
+def get_trivia_pack(
+    request: Request,
+    category: str = Query("general", description="Category of trivia (e.g., general, science, history, sports, tech)"),
+    n: int = Query(10, ge=1, le=MAX_QUESTIONS_PER_REQUEST, description="Number of questions in the pack"),
+    seed: Optional[int] = Query(None, description="Seed for a reproducible pack")
+):
+    """
+    Returns up to `n` distinct questions from a category in one response,
+    e.g. a whole quiz at once.
+    """
+    category = category.lower()
+    log_event(logger, "Fetching trivia pack", category=category, n=n)
+    catalog = TRIVIA_CATALOG.current
+    row_ids = category_questions(catalog, category)
+    return TRIVIA_CACHE.sampled_response(request, catalog, (("category", category), ("pack", True)), row_ids, n, seed)
+
+
 if __name__ == "__main__":
-    uvicorn.run("trivia_provider_api:app", host="0.0.0.0", port=8003, log_level="info", workers=4)
+    uvicorn.run("Trivia provider:app", app_dir=os.path.dirname(os.path.abspath(__file__)), host="0.0.0.0", port=8003, log_level="info", workers=4)
@@ -1,24 +1,84 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from fastapi import FastAPI, HTTPException, Query, Body
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 import uvicorn
 import logging
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog
+from common.logs import log_event
+from common.metrics import instrument
+from common.progress_store import open_progress_store
+from common.registry import REGISTRY
 
 # Logger config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("tv_show_tracker_api")
 
-app = FastAPI(title="TV Show Tracker API", version="1.0")
+# User -> show progress, in a SQLite file shared by every worker. TV_TRACKER_BACKEND=log selects the
+# append-only log instead; "memory" keeps it in the process, which restricts the service to one worker.
+TV_TRACKER_BACKEND = os.environ.get("TV_TRACKER_BACKEND", "sqlite")
+TV_TRACKER_PATH = os.environ.get("TV_TRACKER_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "tv_progress.db")
+USER_SHOWS_DB = open_progress_store(TV_TRACKER_BACKEND, TV_TRACKER_PATH)
 
-# In-memory simulated DB for simplicity
-USER_SHOWS_DB: Dict[str, Dict[str, int]] = {}
-TV_SHOWS = {
-    "Stranger Things": 8,
-    "The Office": 24,
-    "Breaking Bad": 13,
-    "Game of Thrones": 10,
-    "The Mandalorian": 8
-}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Flush pending group commits before the worker exits
+    USER_SHOWS_DB.close()
+
+
+app = FastAPI(title="TV Show Tracker API", version="1.0", lifespan=lifespan)
+instrument(app, "tv")
+
+TV_SHOWS = Catalog([
+    {"show_name": "Stranger Things", "total_episodes": 8},
+    {"show_name": "The Office", "total_episodes": 24},
+    {"show_name": "Breaking Bad", "total_episodes": 13},
+    {"show_name": "Game of Thrones", "total_episodes": 10},
+    {"show_name": "The Mandalorian", "total_episodes": 8},
+])
+
+class TvShow(BaseModel):
+    show_name: str
+    total_episodes: int
+
+TV_SHOWS_CATALOG = REGISTRY.catalog(
+    "tv_shows", lambda: LiveCatalog(os.environ.get("TV_SHOWS_CATALOG_PATH"), fallback=TV_SHOWS, model=TvShow, key=("show_name",))
+)
+
+
+class EpisodeCounts:
+    """Show name -> number of episodes for the catalog TV_SHOWS_CATALOG serves, rebuilt after it changes."""
+
+    def __init__(self, live: LiveCatalog):
+        self.live = live
+        self._catalog: Optional[Catalog] = None
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def current(self) -> Dict[str, int]:
+        catalog = self.live.current
+        with self._lock:
+            if self._catalog is not catalog:
+                names, episodes = catalog.columns["show_name"], catalog.columns["total_episodes"]
+                self._counts = {names.value(i): episodes.value(i) for i in range(catalog.size)}
+                self._catalog = catalog
+            return self._counts
+
+
+# Show names are matched exactly, as tracked progress is stored under them
+EPISODE_COUNTS = EpisodeCounts(TV_SHOWS_CATALOG)
+
+# Upper bound on items accepted by a single batch request
+MAX_BATCH_ITEMS = 10000
 
 class TrackRequest(BaseModel):
     username: str
@@ -33,39 +93,163 @@ class NextEpisodeResponse(BaseModel):
     total_episodes: int
     show_name: str
 
-@app.post("/track-episode", response_model=WatchedResponse, summary="Track a watched episode")
-def track_episode(data: TrackRequest):
-    logger.info(f"Tracking episode for {data.username}: {data.show_name} ep {data.episode_watched}")
+class ContinueWatchingItem(NextEpisodeResponse):
+    last_watched_at: datetime
+
+class ShowStats(BaseModel):
+    show_name: str
+    total_episodes: int
+    viewers: int
+    completed: int
+    # Viewers whose furthest episode is 1, 2, ... total_episodes
+    histogram: List[int]
+
+class BatchItemError(BaseModel):
+    index: int
+    status_code: int
+    detail: str
+
+class BatchTrackResponse(BaseModel):
+    tracked: int
+    errors: List[BatchItemError]
 
-    if data.show_name not in TV_SHOWS:
-        raise HTTPException(status_code=404, detail="TV show not found.")
 
-    total_eps = TV_SHOWS[data.show_name]
+def validate_track(data: TrackRequest, shows: Dict[str, int]) -> Optional[HTTPException]:
+    """Return the error for an invalid tracking request, or None if it can be applied."""
+    if data.show_name not in shows:
+        return HTTPException(status_code=404, detail="TV show not found.")
+
+    total_eps = shows[data.show_name]
     if data.episode_watched < 1 or data.episode_watched > total_eps:
-        raise HTTPException(status_code=400, detail=f"Invalid episode. Must be between 1 and {total_eps}.")
+        return HTTPException(status_code=400, detail=f"Invalid episode. Must be between 1 and {total_eps}.")
+    return None
+
 
-    user_shows = USER_SHOWS_DB.setdefault(data.username, {})
-    user_shows[data.show_name] = max(user_shows.get(data.show_name, 0), data.episode_watched)
+@app.post("/track-episode", response_model=WatchedResponse, summary="Track a watched episode")
+def track_episode(data: TrackRequest):
+    log_event(logger, "Tracking episode", username=data.username, show_name=data.show_name, episode=data.episode_watched)
+
+    error = validate_track(data, EPISODE_COUNTS.current())
+    if error:
+        raise error
+
+    USER_SHOWS_DB.track(data.username, data.show_name, data.episode_watched)
 
     return WatchedResponse(message="Episode tracked successfully.")
 
+@app.post("/track-episodes:batch", response_model=BatchTrackResponse, summary="Track many watched episodes at once")
+def track_episodes_batch(items: List[TrackRequest]):
+    """
+    Apply a burst of tracking requests (e.g. a device sync) in one pass.
+    Valid items are committed together; invalid ones are skipped and
+    reported by their position in the request.
+    """
+    log_event(logger, "Tracking episode batch", count=len(items))
+
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items. At most {MAX_BATCH_ITEMS} per batch.")
+
+    shows = EPISODE_COUNTS.current()
+    valid = []
+    errors = []
+    for index, data in enumerate(items):
+        error = validate_track(data, shows)
+        if error:
+            errors.append(BatchItemError(index=index, status_code=error.status_code, detail=error.detail))
+        else:
+            valid.append((data.username, data.show_name, data.episode_watched))
+
+    if valid:
+        USER_SHOWS_DB.track_many(valid)
+
+    return BatchTrackResponse(tracked=len(valid), errors=errors)
+
 @app.get("/next-episode", response_model=NextEpisodeResponse, summary="Get next episode to watch")
 def next_episode(
     username: str = Query(..., description="Username"),
     show_name: str = Query(..., description="TV show name")
 ):
-    logger.info(f"Fetching next episode for {username} - {show_name}")
+    log_event(logger, "Fetching next episode", username=username, show_name=show_name)
 
-    if show_name not in TV_SHOWS:
+    shows = EPISODE_COUNTS.current()
+    if show_name not in shows:
         raise HTTPException(status_code=404, detail="TV show not found.")
 
-    total_eps = TV_SHOWS[show_name]
-    watched = USER_SHOWS_DB.get(username, {}).get(show_name, 0)
+    total_eps = shows[show_name]
+    watched = USER_SHOWS_DB.watched(username, show_name)
 
     if watched >= total_eps:
         return NextEpisodeResponse(show_name=show_name, total_episodes=total_eps, next_episode=None)
 
     return NextEpisodeResponse(show_name=show_name, total_episodes=total_eps, next_episode=watched + 1)
 
+@app.get("/next-episodes", response_model=List[NextEpisodeResponse], summary="Get next episodes for every show in progress")
+def next_episodes(username: str = Query(..., description="Username")):
+    """
+    Returns the next episode of every show the user has started but not finished.
+    """
+    log_event(logger, "Fetching next episodes", username=username)
+
+    shows = EPISODE_COUNTS.current()
+    results = []
+    for show_name, watched in USER_SHOWS_DB.shows_for(username).items():
+        total_eps = shows.get(show_name)
+        if total_eps is None or watched >= total_eps:
+            continue
+        results.append(NextEpisodeResponse(show_name=show_name, total_episodes=total_eps, next_episode=watched + 1))
+    return results
+
+@app.get("/continue-watching", response_model=List[ContinueWatchingItem], summary="Get unfinished shows, most recently watched first")
+def continue_watching(
+    username: str = Query(..., description="Username"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of shows to return")
+):
+    """
+    Returns the next episode of the user's unfinished shows, ordered by when
+    they last tracked an episode of each.
+    """
+    log_event(logger, "Fetching continue watching", username=username, limit=limit)
+
+    shows = EPISODE_COUNTS.current()
+    results = []
+    for show_name, watched, last_watched in USER_SHOWS_DB.recent_for(username):
+        total_eps = shows.get(show_name)
+        if total_eps is None or watched >= total_eps:
+            continue
+        results.append(ContinueWatchingItem(
+            show_name=show_name, total_episodes=total_eps, next_episode=watched + 1,
+            last_watched_at=datetime.fromtimestamp(last_watched, timezone.utc),
+        ))
+        if len(results) == limit:
+            break
+    return results
+
+@app.get("/shows/{show_name}/stats", response_model=ShowStats, summary="Get viewer counts and progress for a show")
+def show_stats(show_name: str):
+    """
+    Returns how many users have started the show, how many finished it, and
+    how many stopped at each episode.
+    """
+    log_event(logger, "Fetching show stats", show_name=show_name)
+
+    shows = EPISODE_COUNTS.current()
+    if show_name not in shows:
+        raise HTTPException(status_code=404, detail="TV show not found.")
+
+    total_eps = shows[show_name]
+    histogram = [0] * total_eps
+    if total_eps:
+        for episode, viewers in USER_SHOWS_DB.histogram(show_name).items():
+            # Progress past the last episode (the show was shortened since) counts as finished
+            histogram[min(episode, total_eps) - 1] += viewers
+    return ShowStats(
+        show_name=show_name, total_episodes=total_eps,
+        viewers=sum(histogram), completed=histogram[-1] if histogram else 0, histogram=histogram,
+    )
+
 if __name__ == "__main__":
-    uvicorn.run("tv_show_tracker_api:app", host="0.0.0.0", port=8001, log_level="info", workers=4)
+    workers = 4
+    if TV_TRACKER_BACKEND == "memory":
+        logger.warning("Progress is kept in process memory; serving with a single worker so every request sees it")
+        workers = 1
+    uvicorn.run("Tv show tracker:app", app_dir=os.path.dirname(os.path.abspath(__file__)), host="0.0.0.0", port=8008, log_level="info", workers=workers)
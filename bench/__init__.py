@@ -0,0 +1,14 @@
+"""
+Benchmarks for the entertainment services.
+
+Run from the repository root:
+
+    python -m bench micro --sizes 1000 100000 1000000 --output micro.json
+    python -m bench load --mode both --size 100000 --concurrency 32 --output load.json
+    python -m bench compare micro.json baseline-micro.json
+
+`micro` times the catalog hot path of each endpoint on synthetic catalogs,
+`load` drives the HTTP endpoints in-process and through a local uvicorn,
+and `--baseline` (or `compare`) exits non-zero when a result regressed by
+more than the tolerance.
+"""
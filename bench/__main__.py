@@ -0,0 +1,84 @@
+import argparse
+import sys
+from typing import Any, Dict, Optional, Sequence
+
+from bench import report
+from bench.synthetic import GENERATORS
+
+
+def _finish(kind: str, results: Dict[str, Dict[str, Any]], args: argparse.Namespace, settings: Dict[str, Any]) -> int:
+    report.print_table(results)
+    document = {"results": results}
+    if args.output:
+        document = report.write_results(args.output, kind, results, settings)
+        print(f"Wrote {len(results)} results to {args.output}")
+    if args.baseline:
+        return _report_regressions(document, report.load_results(args.baseline), args.tolerance)
+    return 0
+
+
+def _report_regressions(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> int:
+    regressions = report.compare(current, baseline, tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"No regressions beyond {tolerance:.0%} against the baseline")
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmark the entertainment services.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_output_options(command: argparse.ArgumentParser) -> None:
+        command.add_argument("--output", help="Write results to this JSON file")
+        command.add_argument("--baseline", help="Compare against a previous results file and fail on regressions")
+        command.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown as a fraction (default 0.2)")
+
+    micro = commands.add_parser("micro", help="Time each endpoint's catalog hot path on synthetic catalogs")
+    micro.add_argument("--catalogs", nargs="*", default=list(GENERATORS), choices=list(GENERATORS))
+    micro.add_argument("--sizes", nargs="*", type=int, default=[1_000, 100_000, 1_000_000], help="Catalog sizes, up to 10^7")
+    micro.add_argument("--iterations", type=int, default=200, help="Timed calls per benchmark")
+    micro.add_argument("--max-seconds", type=float, default=5.0, help="Time limit per benchmark")
+    add_output_options(micro)
+
+    load = commands.add_parser("load", help="Load-test the HTTP endpoints in-process and/or through uvicorn")
+    load.add_argument("--mode", choices=("asgi", "uvicorn", "both"), default="asgi")
+    load.add_argument("--size", type=int, default=100_000, help="Rows per synthetic catalog")
+    load.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    load.add_argument("--requests", type=int, default=2000, help="Requests per target")
+    load.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    load.add_argument("--data-dir", help="Where synthetic catalog files are written (reused across runs)")
+    load.add_argument("--targets", nargs="*", help="Only URLs containing one of these substrings")
+    add_output_options(load)
+
+    compare = commands.add_parser("compare", help="Compare two results files")
+    compare.add_argument("current")
+    compare.add_argument("baseline")
+    compare.add_argument("--tolerance", type=float, default=0.2)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "micro":
+        from bench import micro as micro_bench
+        import gateway
+
+        results = micro_bench.run(gateway.MODULES, args.catalogs, args.sizes, args.iterations, args.max_seconds)
+        settings = {"catalogs": args.catalogs, "sizes": args.sizes, "iterations": args.iterations}
+        return _finish("micro", results, args, settings)
+
+    if args.command == "load":
+        from bench import load as load_bench
+
+        targets = load_bench.TARGETS
+        if args.targets:
+            targets = [url for url in targets if any(part in url for part in args.targets)]
+        results = load_bench.run(args.mode, args.size, args.concurrency, args.requests, args.workers, args.data_dir, targets)
+        settings = {"mode": args.mode, "size": args.size, "concurrency": args.concurrency, "requests": args.requests, "workers": args.workers}
+        return _finish("load", results, args, settings)
+
+    return _report_regressions(report.load_results(args.current), report.load_results(args.baseline), args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
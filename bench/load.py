@@ -0,0 +1,182 @@
+"""
+Load tests of the HTTP endpoints.
+
+Synthetic catalogs are written as catalog files and the services are
+pointed at them through their *_CATALOG_PATH variables, so the same data is
+served in-process (the gateway app driven through httpx's ASGI transport,
+no sockets) and by a local uvicorn running the gateway with real workers.
+Each target URL is requested by `concurrency` concurrent clients.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from bench.report import rss_mb, summarize, tree_rss_mb
+from bench.synthetic import synthetic_catalog
+from common.catalog_file import write_catalog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Catalog name -> variable the owning service reads its catalog file path from
+CATALOG_ENV = {
+    "books": "BOOK_CATALOG_PATH",
+    "games": "GAME_CATALOG_PATH",
+    "movies": "MOVIE_CATALOG_PATH",
+    "music": "MUSIC_CATALOG_PATH",
+    "events": "EVENT_CATALOG_PATH",
+    "podcasts": "PODCAST_CATALOG_PATH",
+}
+
+# Gateway URLs exercised by the load test
+TARGETS = [
+    "/books/suggest-books?genre=fantasy",
+    "/books/suggest-books?genre=fantasy&seed=7",
+    "/games/suggest-games?q=dragon",
+    "/movies/recommend?genre=drama&language=hindi",
+    "/movies/recommend/similar?title=Movie dragon 0",
+    "/music/curate-playlist?genre=pop&mood=happy",
+    "/music/curate-playlist/generate?length=200&mood=peaceful",
+    "/events/find-events?lat=28.61&lon=77.21&radius_km=20",
+    "/podcasts/suggest-podcasts?genre=science",
+    "/trivia/trivia?category=science",
+    "/celebrities/celebrity-news?name=Taylor Swift",
+    "/tv/next-episode?username=bench&show_name=The Office",
+    "/tv/continue-watching?username=bench",
+    "/digest?seed=7&events.lat=28.61&events.lon=77.21",
+]
+
+
+def prepare_catalogs(directory: str, size: int, seed: int = 0) -> Dict[str, str]:
+    """Write a synthetic file per catalog; returns the environment that points the services at them."""
+    os.makedirs(directory, exist_ok=True)
+    env = {}
+    for name, variable in CATALOG_ENV.items():
+        path = os.path.join(directory, f"{name}-{size}.cat")
+        if not os.path.exists(path):
+            write_catalog(synthetic_catalog(name, size, seed), path)
+        env[variable] = path
+    return env
+
+
+async def drive(client: Any, url: str, concurrency: int, requests: int) -> Dict[str, Any]:
+    """Issue `requests` GETs of `url` from `concurrency` concurrent workers."""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    remaining = min(5, requests)
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            begin = time.perf_counter()
+            response = await client.get(url)
+            await response.aread()
+            latencies.append(time.perf_counter() - begin)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    await worker_round(worker, 1, remaining)  # warm-up
+    latencies.clear()
+    statuses.clear()
+    remaining = requests
+    started = time.perf_counter()
+    await worker_round(worker, concurrency, requests)
+    result = summarize(latencies, time.perf_counter() - started)
+    result["statuses"] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+
+async def worker_round(worker: Any, concurrency: int, requests: int) -> None:
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+
+
+async def run_asgi(targets: Sequence[str], concurrency: int, requests: int) -> Dict[str, Dict[str, Any]]:
+    import httpx
+
+    sys.path.insert(0, ROOT)
+    import gateway
+
+    results = {}
+    async with gateway.app.router.lifespan_context(gateway.app):
+        transport = httpx.ASGITransport(app=gateway.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for url in targets:
+                result = await drive(client, url, concurrency, requests)
+                result["rss_mb"] = rss_mb()
+                results[f"asgi {url}"] = result
+                print(f"asgi {url}: p50 {result.get('p50_ms', 0):.2f} ms, {result.get('ops_per_s', 0):.0f} req/s", flush=True)
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(
+    targets: Sequence[str], concurrency: int, requests: int, workers: int, env: Dict[str, str], startup_timeout: float = 60.0
+) -> Dict[str, Dict[str, Any]]:
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "gateway:app", "--app-dir", ROOT, "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    results = {}
+    try:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+            await _wait_ready(client, server, startup_timeout)
+            for url in targets:
+                result = await drive(client, url, concurrency, requests)
+                result["rss_mb"] = tree_rss_mb(server.pid)
+                results[f"uvicorn x{workers} {url}"] = result
+                print(f"uvicorn x{workers} {url}: p50 {result.get('p50_ms', 0):.2f} ms, {result.get('ops_per_s', 0):.0f} req/s", flush=True)
+    finally:
+        server.terminate()
+        server.wait(10)
+    return results
+
+
+async def _wait_ready(client: Any, server: subprocess.Popen, timeout: float) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("uvicorn did not become ready")
+
+
+def run(
+    mode: str,
+    size: int,
+    concurrency: int,
+    requests: int,
+    workers: int = 4,
+    data_dir: Optional[str] = None,
+    targets: Optional[Sequence[str]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    env = prepare_catalogs(data_dir or os.path.join(tempfile.gettempdir(), "entertainment-bench"), size)
+    targets = list(targets or TARGETS)
+    results: Dict[str, Dict[str, Any]] = {}
+    if mode in ("asgi", "both"):
+        # The services read their catalog paths at import time
+        os.environ.update(env)
+        results.update(asyncio.run(run_asgi(targets, concurrency, requests)))
+    if mode in ("uvicorn", "both"):
+        results.update(asyncio.run(run_uvicorn(targets, concurrency, requests, workers, env)))
+    return results
@@ -0,0 +1,112 @@
+"""
+Microbenchmarks of the catalog hot path behind each endpoint.
+
+Every benchmark runs the same catalog calls as the endpoint it is named
+after (filtering, sampling and JSON encoding of the returned rows, or the
+similarity and playlist engines) against a synthetic catalog, without the
+HTTP layer, the scheduler or the query cache. Filters come from the
+services' own `*_filters` functions, which their handlers use too. The services' own engine objects are used,
+so their configured weights and budgets are what gets measured.
+"""
+import gc
+import time
+from datetime import date
+from typing import Any, Callable, Dict, Sequence
+
+from bench.report import rss_mb, summarize
+from bench.synthetic import synthetic_catalog
+from common.catalog import Catalog
+from common.sampling import sample
+
+Query = Callable[[Catalog], Any]
+
+
+def _rows(filters: Dict[str, Any], limit: int = 5) -> Query:
+    """Endpoint shape: filter with the service's own `Catalog.select` arguments, sample `limit` candidates, encode them."""
+    return lambda catalog: catalog.json_array(sample(Catalog.select(catalog, **filters), limit))
+
+
+def queries(services: Dict[str, Any]) -> Dict[str, Dict[str, Query]]:
+    """Benchmarks per catalog; `services` maps gateway prefixes to loaded service modules."""
+    books, games, movies = services["/books"], services["/games"], services["/movies"]
+    music, events, podcasts = services["/music"], services["/events"], services["/podcasts"]
+    return {
+        "books": {
+            "suggest-books": _rows(books.book_filters()),
+            "suggest-books?genre": _rows(books.book_filters(genre="fantasy")),
+            "suggest-books?genre&decade": _rows(books.book_filters(genre="fantasy", decade=1960)),
+            "suggest-books?author": _rows(books.book_filters(author="author 12")),
+        },
+        "games": {
+            "suggest-games?genre": _rows(games.game_filters(genre="rpg")),
+            "suggest-games?q": _rows(games.game_filters(q="dragon 1")),
+            "suggest-games?platform&q": _rows(games.game_filters(platform="pc", q="storm")),
+        },
+        "movies": {
+            "recommend?genre&language": _rows(movies.movie_filters(genre="drama", language="hindi")),
+            "recommend?year_from&year_to": _rows(movies.movie_filters(year_from=1990, year_to=1999)),
+            "recommend/similar": lambda c: c.json_array(movies.MOVIE_SIMILARITY.similar(c, 0, 5)),
+        },
+        "music": {
+            "curate-playlist?genre&mood": _rows(music.track_filters(genre="pop", mood="happy")),
+            "curate-playlist?decade": _rows(music.track_filters(decade=1980)),
+            "curate-playlist/similar": lambda c: c.json_array(music.MUSIC_SIMILARITY.similar(c, 0, 5)),
+            "curate-playlist/generate?length=500": lambda c: b"".join(
+                c.json_lines(music.PLAYLIST_ENGINE.generate(c, 500, mood="peaceful"))
+            ),
+        },
+        "events": {
+            "find-events?location": _rows(events.event_filters(location="delhi")),
+            "find-events?q": _rows(events.event_filters(q="tech")),
+            "find-events?lat&lon&radius_km": lambda c: c.json_array(events.EVENT_GEO.index(c).nearest(
+                28.61, 77.21, events.EVENT_GEO.select_within(c, 28.61, 77.21, 20, **events.event_filters()), 5
+            )),
+            "find-events?from&to": _rows(events.event_filters(date_from=date(2026, 6, 1), date_to=date(2026, 6, 7))),
+        },
+        "podcasts": {
+            "suggest-podcasts?genre": _rows(podcasts.podcast_filters(genre="science")),
+        },
+    }
+
+
+def time_query(query: Query, catalog: Catalog, iterations: int, max_seconds: float) -> Dict[str, Any]:
+    for _ in range(3):
+        query(catalog)  # warm up lazily built indexes and caches
+    latencies = []
+    gc.disable()
+    started = time.perf_counter()
+    try:
+        while len(latencies) < iterations and time.perf_counter() - started < max_seconds:
+            begin = time.perf_counter()
+            query(catalog)
+            latencies.append(time.perf_counter() - begin)
+    finally:
+        gc.enable()
+    return summarize(latencies, sum(latencies))
+
+
+def run(
+    services: Dict[str, Any],
+    catalogs: Sequence[str],
+    sizes: Sequence[int],
+    iterations: int = 200,
+    max_seconds: float = 5.0,
+    seed: int = 0,
+) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    benchmarks = queries(services)
+    for name in catalogs:
+        for size in sizes:
+            started = time.perf_counter()
+            catalog = synthetic_catalog(name, size, seed)
+            build_seconds = time.perf_counter() - started
+            for query_name, query in benchmarks[name].items():
+                result = time_query(query, catalog, iterations, max_seconds)
+                result["rss_mb"] = rss_mb()
+                result["build_s"] = round(build_seconds, 3)
+                key = f"{name}/{query_name}@{size}"
+                results[key] = result
+                print(f"{key}: p50 {result.get('p50_ms', 0):.3f} ms, p99 {result.get('p99_ms', 0):.3f} ms", flush=True)
+            del catalog
+            gc.collect()
+    return results
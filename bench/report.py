@@ -0,0 +1,109 @@
+"""Latency summaries, result files and baseline comparison."""
+import json
+import os
+import platform
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Metrics where a higher value is a regression; everything else compared is "higher is better"
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms")
+HIGHER_IS_BETTER = ("ops_per_s",)
+
+
+def summarize(latencies: Sequence[float], elapsed: float) -> Dict[str, float]:
+    """Percentiles (ms) and throughput of `latencies` (seconds) measured over `elapsed` seconds."""
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    if not len(ms):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": int(len(ms)),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+        "ops_per_s": round(len(ms) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def rss_mb(pid: Optional[int] = None) -> float:
+    """Resident set size of a process (this one by default), in MiB."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid is None:
+        import resource
+
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1 << 20 if platform.system() == "Darwin" else 1024), 1)
+    return 0.0
+
+
+def tree_rss_mb(pid: int) -> float:
+    """RSS of a process plus its direct children (e.g. uvicorn and its workers), in MiB."""
+    total = rss_mb(pid)
+    try:
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                with open(f"/proc/{entry}/stat") as fh:
+                    # The command name is parenthesized and may contain spaces
+                    if int(fh.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        total += rss_mb(int(entry))
+    except OSError:
+        pass
+    return round(total, 1)
+
+
+def write_results(path: str, kind: str, results: Dict[str, Dict[str, Any]], settings: Dict[str, Any]) -> Dict[str, Any]:
+    document = {
+        "kind": kind,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "machine": {"python": platform.python_version(), "numpy": np.__version__, "cpus": os.cpu_count(), "platform": platform.platform()},
+        "settings": settings,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(document, fh, indent=2)
+    return document
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """
+    Regressions of `current` against `baseline`: latency percentiles more
+    than `tolerance` (a fraction) higher, or throughput that much lower, for
+    every benchmark present in both.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        for metric in LOWER_IS_BETTER:
+            if metric in result and base.get(metric) and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {result[metric]}")
+        for metric in HIGHER_IS_BETTER:
+            if metric in result and base.get(metric) and result[metric] < base[metric] * (1 - tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {result[metric]}")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    width = max((len(name) for name in results), default=10)
+    print(f"{'benchmark':<{width}}  {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'rss MiB':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:<{width}}  {result.get('p50_ms', 0):>9.3f} {result.get('p95_ms', 0):>9.3f} "
+            f"{result.get('p99_ms', 0):>9.3f} {result.get('ops_per_s', 0):>10.1f} {result.get('rss_mb', 0):>8.1f}"
+        )
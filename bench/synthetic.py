@@ -0,0 +1,128 @@
+"""
+Synthetic catalogs shaped like each service's data.
+
+Columns are generated directly as NumPy code arrays over small
+vocabularies (StringColumn.from_codes), so even 10^7-row catalogs build in
+seconds without materializing a dict per row. Each catalog has the same
+fields and indexes as the service it stands in for, and its vocabularies
+contain the values used by the benchmark queries.
+"""
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from common.catalog import Catalog, Column, FloatColumn, IntColumn, StringColumn
+
+GENRES = ["fantasy", "drama", "thriller", "romance", "science fiction", "self-help", "dystopian", "history"]
+GAME_GENRES = ["adventure", "shooter", "rpg", "strategy", "puzzle", "racing", "sports", "simulation"]
+PLATFORMS = ["PC", "PlayStation", "Xbox", "Nintendo", "Mobile"]
+MOVIE_GENRES = ["drama", "sci-fi", "thriller", "romance", "action", "fantasy", "comedy", "horror"]
+LANGUAGES = ["english", "hindi", "japanese", "korean", "french", "spanish"]
+MUSIC_GENRES = ["pop", "rock", "hip-hop", "folk", "jazz", "edm", "soul", "metal"]
+MOODS = ["peaceful", "sad", "thoughtful", "hopeful", "romantic", "dramatic", "happy", "angsty", "motivational", "energetic"]
+EVENT_CATEGORIES = ["concert", "business", "entertainment", "food", "tech", "sports", "art"]
+PODCAST_GENRES = ["science", "news", "history", "true crime", "comedy", "cybersecurity", "business"]
+TITLE_WORDS = ["dragon", "shadow", "river", "empire", "light", "storm", "garden", "machine", "legend", "city"]
+# (city, lat, lon) that synthetic events cluster around
+CITIES = [
+    ("Delhi", 28.6139, 77.209), ("Mumbai", 19.076, 72.8777), ("Bangalore", 12.9716, 77.5946),
+    ("Chennai", 13.0827, 80.2707), ("Hyderabad", 17.385, 78.4867), ("London", 51.5072, -0.1276),
+    ("New York", 40.7128, -74.006), ("Tokyo", 35.6762, 139.6503), ("Sydney", -33.8688, 151.2093),
+]
+# Most distinct values generated for high-cardinality fields such as titles
+MAX_DISTINCT = 100_000
+
+
+def _pick(rng: np.random.Generator, values: Sequence[str], size: int, indexed: bool = False, searchable: bool = False) -> StringColumn:
+    return StringColumn.from_codes(list(values), rng.integers(0, len(values), size), indexed, searchable)
+
+
+def _names(prefix: str, count: int) -> List[str]:
+    return [f"{prefix} {TITLE_WORDS[i % len(TITLE_WORDS)]} {i}" for i in range(count)]
+
+
+def _distinct(size: int, ratio: int = 1) -> int:
+    return max(1, min(size // ratio, MAX_DISTINCT))
+
+
+def _ints(rng: np.random.Generator, values: Sequence[int], size: int, indexed: bool = False) -> IntColumn:
+    return IntColumn.build(rng.choice(np.asarray(values, dtype=np.int32), size), indexed)
+
+
+def books(rng: np.random.Generator, size: int) -> Dict[str, Column]:
+    return {
+        "title": _pick(rng, _names("The", _distinct(size)), size),
+        "author": _pick(rng, [f"Author {i}" for i in range(_distinct(size, 10))], size),
+        "genre": _pick(rng, GENRES, size, indexed=True),
+        "decade": _ints(rng, range(1800, 2030, 10), size, indexed=True),
+    }
+
+
+def games(rng: np.random.Generator, size: int) -> Dict[str, Column]:
+    return {
+        "title": _pick(rng, _names("Game", _distinct(size)), size, searchable=True),
+        "platform": _pick(rng, PLATFORMS, size, searchable=True),
+        "genre": _pick(rng, GAME_GENRES, size, searchable=True),
+    }
+
+
+def movies(rng: np.random.Generator, size: int) -> Dict[str, Column]:
+    return {
+        "title": _pick(rng, _names("Movie", _distinct(size)), size),
+        "genre": _pick(rng, MOVIE_GENRES, size, indexed=True),
+        "language": _pick(rng, LANGUAGES, size, indexed=True),
+        "year": _ints(rng, range(1950, 2026), size, indexed=True),
+    }
+
+
+def music(rng: np.random.Generator, size: int) -> Dict[str, Column]:
+    return {
+        "title": _pick(rng, _names("Song", _distinct(size)), size),
+        "artist": _pick(rng, [f"Artist {i}" for i in range(_distinct(size, 20))], size),
+        "genre": _pick(rng, MUSIC_GENRES, size, indexed=True),
+        "mood": _pick(rng, MOODS, size, indexed=True),
+        "decade": _ints(rng, range(1950, 2030, 10), size, indexed=True),
+    }
+
+
+def events(rng: np.random.Generator, size: int) -> Dict[str, Column]:
+    cities = rng.integers(0, len(CITIES), size)
+    lats = np.array([lat for _, lat, _ in CITIES])[cities] + rng.normal(0, 0.3, size)
+    lons = np.array([lon for _, _, lon in CITIES])[cities] + rng.normal(0, 0.3, size)
+    days = np.datetime64("2026-01-01") + np.arange(730)
+    dates = [str(day) for day in days]
+    starts = rng.integers(0, len(dates) - 7, size)
+    return {
+        "name": _pick(rng, _names("Event", _distinct(size)), size, searchable=True),
+        "location": StringColumn.from_codes([city for city, _, _ in CITIES], cities, searchable=True),
+        "category": _pick(rng, EVENT_CATEGORIES, size, searchable=True),
+        "lat": FloatColumn.build(np.clip(lats, -90, 90)),
+        "lon": FloatColumn.build(lons),
+        "start_date": StringColumn.from_codes(dates, starts, indexed=True),
+        "end_date": StringColumn.from_codes(dates, starts + rng.integers(0, 7, size), indexed=True),
+    }
+
+
+def podcasts(rng: np.random.Generator, size: int) -> Dict[str, Column]:
+    return {
+        "title": _pick(rng, _names("Podcast", _distinct(size)), size),
+        "genre": _pick(rng, PODCAST_GENRES, size),
+    }
+
+
+# Catalog name (as registered by the service) -> column generator
+GENERATORS: Dict[str, Callable[[np.random.Generator, int], Dict[str, Column]]] = {
+    "books": books,
+    "games": games,
+    "movies": movies,
+    "music": music,
+    "events": events,
+    "podcasts": podcasts,
+}
+
+
+def synthetic_catalog(name: str, size: int, seed: int = 0) -> Catalog:
+    """Synthetic stand-in for the `name` catalog with `size` rows."""
+    catalog = Catalog.from_columns(GENERATORS[name](np.random.default_rng(seed), size), size)
+    catalog.version = f"synthetic-{name}-{size}-{seed}"
+    return catalog
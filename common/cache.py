@@ -0,0 +1,191 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+
+from common import metrics
+from common.catalog import Catalog, normalize
+from common.sampling import sample
+
+
+def query_key(**params: Any) -> Tuple[Tuple[str, Any], ...]:
+    """Cache key for query parameters: empty values dropped, strings normalized."""
+    return tuple(
+        (name, normalize(value) if isinstance(value, str) else value)
+        for name, value in sorted(params.items())
+        if value is not None and value != ""
+    )
+
+
+class LRUCache:
+    """
+    Thread-safe LRU map bounded by entry count and total cost, with a TTL.
+    `cost` gives the weight of a value (e.g. number of row ids or bytes).
+    """
+
+    def __init__(self, max_entries: int, max_cost: int, ttl: float, cost: Callable[[Any], int] = lambda value: 1):
+        self.max_entries = max_entries
+        self.max_cost = max_cost
+        self.ttl = ttl
+        self._cost = cost
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._total_cost = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        cost = self._cost(value)
+        if cost > self.max_cost:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, cost, value)
+            self._total_cost += cost
+            while len(self._entries) > self.max_entries or self._total_cost > self.max_cost:
+                self._remove(next(iter(self._entries)))
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_cost = 0
+
+    def _remove(self, key: Hashable) -> None:
+        self._total_cost -= self._entries.pop(key)[1]
+
+
+class QueryCache:
+    """
+    Per-service cache of filtered candidate sets and encoded responses.
+
+    Candidate row ids are cached for every query. Encoded JSON bodies are
+    cached only for deterministic responses (e.g. when a `seed` is given) and
+    served with an ETag, answering 304 Not Modified when the client already
+    has them. Entries are keyed by the catalog version and the whole cache is
+    dropped as soon as a new version is seen, so a hot-swapped catalog is
+    never answered from stale entries.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_rows: int = 5_000_000, max_bytes: int = 64 << 20, ttl: float = 300.0):
+        self.candidates = LRUCache(max_entries, max_rows, ttl, cost=len)
+        self.responses = LRUCache(max_entries, max_bytes, ttl, cost=lambda entry: len(entry[1]))
+        self._version: Optional[str] = None
+
+    def select(self, version: Optional[str], key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Candidate row ids for `key`, computing and caching them on a miss."""
+        self._check_version(version)
+        key = (version, key)
+        with metrics.phase("filter"):
+            row_ids = self.candidates.get(key)
+            if row_ids is None:
+                row_ids = compute()
+                self._store(self.candidates, version, key, row_ids)
+        metrics.candidates(len(row_ids))
+        return row_ids
+
+    async def select_async(self, version: Optional[str], key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """`select` for candidates computed off the event loop (see common.scheduler)."""
+        self._check_version(version)
+        key = (version, key)
+        with metrics.phase("filter"):
+            row_ids = self.candidates.get(key)
+            if row_ids is None:
+                row_ids = await compute()
+                self._store(self.candidates, version, key, row_ids)
+        metrics.candidates(len(row_ids))
+        return row_ids
+
+    def json_response(self, request: Request, version: Optional[str], key: Hashable, build: Callable[[], Any]) -> Response:
+        """
+        JSON response for a deterministic query: the encoded body and its ETag
+        are cached, and a matching If-None-Match is answered with 304. `build`
+        returns either data to encode or an already encoded JSON body.
+        """
+        self._check_version(version)
+        key = (version, key)
+        entry = self.responses.get(key)
+        if entry is None:
+            entry = self._encode(build())
+            self._store(self.responses, version, key, entry)
+        return self._respond(request, *entry)
+
+    async def json_response_async(
+        self, request: Request, version: Optional[str], key: Hashable, build: Callable[[], Awaitable[Any]]
+    ) -> Response:
+        """`json_response` for bodies built off the event loop (see common.scheduler)."""
+        self._check_version(version)
+        key = (version, key)
+        entry = self.responses.get(key)
+        if entry is None:
+            entry = self._encode(await build())
+            self._store(self.responses, version, key, entry)
+        return self._respond(request, *entry)
+
+    def sampled_response(
+        self, request: Request, catalog: Catalog, key: Hashable, row_ids: Sequence[int], limit: int, seed: Optional[int]
+    ) -> Response:
+        """
+        Up to `limit` of the candidate `row_ids` of a query as a JSON array,
+        drawn without materializing the whole candidate set. A seeded draw is
+        deterministic, so it goes through `json_response` under `key` (the
+        query's normalized filters) extended with the limit and seed.
+        """
+        if seed is None:
+            return Response(catalog.json_array(sample(row_ids, limit)), media_type="application/json")
+        return self.json_response(
+            request, catalog.version, key + (("limit", limit), ("seed", seed)),
+            lambda: catalog.json_array(sample(row_ids, limit, seed)),
+        )
+
+    @staticmethod
+    def _respond(request: Request, etag: str, body: bytes) -> Response:
+        headers = {"ETag": etag}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def _check_version(self, version: Optional[str]) -> None:
+        if version != self._version:
+            self.candidates.clear()
+            self.responses.clear()
+            self._version = version
+
+    def _store(self, cache: LRUCache, version: Optional[str], key: Hashable, value: Any) -> None:
+        # Computed from a snapshot that was swapped out meanwhile: no lookup can ask for it again
+        if version == self._version:
+            cache.put(key, value)
+
+    @staticmethod
+    def _encode(data: Any) -> Tuple[str, bytes]:
+        if isinstance(data, bytes):
+            body = data
+        else:
+            body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', body
@@ -0,0 +1,457 @@
+import hashlib
+import json
+import sys
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from common.metrics import phase
+from common.trigram import TrigramIndex
+
+
+def normalize(value: Any) -> str:
+    """Normalized form used for case-insensitive matching."""
+    return str(value).strip().lower()
+
+
+EMPTY = np.empty(0, dtype=np.int32)
+
+
+class BytesTable:
+    """Read-only sequence of byte strings stored as one blob plus an offsets array."""
+
+    def __init__(self, buffer: Any, offsets: np.ndarray, start: int = 0):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._start = start
+
+    @classmethod
+    def build(cls, items: Sequence[bytes]) -> "BytesTable":
+        offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in items], out=offsets[1:])
+        return cls(b"".join(items), offsets)
+
+    @property
+    def blob(self) -> np.ndarray:
+        return np.frombuffer(self._buffer, dtype=np.uint8, count=int(self._offsets[-1]), offset=self._start)
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        if index < 0:
+            index += len(self)
+        begin = self._start + int(self._offsets[index])
+        end = self._start + int(self._offsets[index + 1])
+        return self._buffer[begin:end]
+
+
+class StringColumn:
+    """
+    Dictionary-encoded string column.
+
+    Each distinct raw value is stored once in `dictionary` and rows store an
+    int32 code into it. Raw values are further grouped by their normalized
+    form into the sorted `keys` table, which is what equality and substring
+    filters match on. Indexed columns also keep the row ids grouped by key
+    (CSR layout: `order[offsets[k]:offsets[k + 1]]` are the rows whose key
+    is k). Searchable columns add a trigram index over the keys for fast
+    substring matching. `dictionary` and `keys` only need to be sequences of
+    str, so a column can sit on top of a memory-mapped file as well as
+    Python lists.
+    """
+
+    def __init__(
+        self,
+        dictionary: Sequence[str],
+        codes: np.ndarray,
+        keys: Sequence[str],
+        key_codes: np.ndarray,
+        order: Optional[np.ndarray] = None,
+        offsets: Optional[np.ndarray] = None,
+        trigrams: Optional[TrigramIndex] = None,
+    ):
+        self.dictionary = dictionary
+        self.codes = codes
+        self.keys = keys
+        self.key_codes = key_codes
+        self.order = order
+        self.offsets = offsets
+        self.trigrams = trigrams
+
+    @classmethod
+    def build(cls, values: Sequence[str], indexed: bool = False, searchable: bool = False) -> "StringColumn":
+        code_of: Dict[str, int] = {}
+        dictionary: List[str] = []
+        codes = np.empty(len(values), dtype=np.int32)
+        for row_id, value in enumerate(values):
+            code = code_of.get(value)
+            if code is None:
+                code = code_of[value] = len(dictionary)
+                dictionary.append(sys.intern(value))
+            codes[row_id] = code
+        return cls.from_codes(dictionary, codes, indexed, searchable)
+
+    @classmethod
+    def from_codes(
+        cls, dictionary: Sequence[str], codes: np.ndarray, indexed: bool = False, searchable: bool = False
+    ) -> "StringColumn":
+        """Column from distinct raw values and each row's code into them, without a per-row Python loop."""
+        codes = np.asarray(codes, dtype=np.int32)
+        normalized = [normalize(value) for value in dictionary]
+        keys = sorted(set(normalized))
+        key_of = {key: key_code for key_code, key in enumerate(keys)}
+        key_codes = np.fromiter((key_of[key] for key in normalized), dtype=np.int32, count=len(normalized))
+
+        order = offsets = trigrams = None
+        if indexed or searchable:
+            row_keys = key_codes[codes]
+            order = np.argsort(row_keys, kind="stable").astype(np.int32)
+            counts = np.bincount(row_keys, minlength=len(keys))
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+        if searchable:
+            trigrams = TrigramIndex.build(keys)
+        return cls(dictionary, codes, keys, key_codes, order, offsets, trigrams)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def value(self, row_id: int) -> str:
+        return self.dictionary[self.codes[row_id]]
+
+    def find_key(self, value: Any) -> Optional[int]:
+        """Code of the normalized form of `value` in the sorted key table, or None."""
+        key = normalize(value)
+        key_code = bisect_left(self.keys, key)
+        if key_code < len(self.keys) and self.keys[key_code] == key:
+            return key_code
+        return None
+
+    def postings(self, key_code: int) -> np.ndarray:
+        return self.order[self.offsets[key_code]:self.offsets[key_code + 1]]
+
+    def rows_for_keys(self, key_codes: np.ndarray) -> np.ndarray:
+        """Row ids of every key in `key_codes`, by concatenating their postings."""
+        if len(key_codes) == 1:
+            return self.postings(int(key_codes[0]))
+        return np.concatenate([self.postings(key_code) for key_code in key_codes.tolist()])
+
+    def keys_containing(self, needle: str) -> np.ndarray:
+        """Codes of the keys containing the normalized `needle`."""
+        if self.trigrams is not None:
+            matches = self.trigrams.search(needle, self.keys)
+            if matches is not None:
+                return matches
+        return np.fromiter((code for code, key in enumerate(self.keys) if needle in key), dtype=np.int32)
+
+    def key_mask(self, ids: Any, key_codes: np.ndarray) -> np.ndarray:
+        """Boolean mask over `ids` of the rows whose key is in `key_codes`."""
+        return np.isin(self.key_codes[self.codes[ids]], key_codes)
+
+
+class IntColumn:
+    """Integer column, optionally with row ids pre-sorted by value for range lookups."""
+
+    def __init__(self, values: np.ndarray, order: Optional[np.ndarray] = None, sorted_values: Optional[np.ndarray] = None):
+        self.values = values
+        self.order = order
+        self.sorted_values = sorted_values
+
+    @classmethod
+    def build(cls, values: Sequence[int], indexed: bool = False) -> "IntColumn":
+        values = np.asarray(values, dtype=np.int32)
+        order = sorted_values = None
+        if indexed:
+            order = np.argsort(values, kind="stable").astype(np.int32)
+            sorted_values = values[order]
+        return cls(values, order, sorted_values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def value(self, row_id: int) -> int:
+        return int(self.values[row_id])
+
+
+class FloatColumn(IntColumn):
+    """Float64 column, e.g. coordinates; filtered like an integer column."""
+
+    @classmethod
+    def build(cls, values: Sequence[float], indexed: bool = False) -> "FloatColumn":
+        values = np.asarray(values, dtype=np.float64)
+        order = sorted_values = None
+        if indexed:
+            order = np.argsort(values, kind="stable").astype(np.int32)
+            sorted_values = values[order]
+        return cls(values, order, sorted_values)
+
+    def value(self, row_id: int) -> float:
+        return float(self.values[row_id])
+
+
+Column = Union[StringColumn, IntColumn, FloatColumn]
+Bounds = Tuple[Optional[Any], Optional[Any]]
+
+
+def infer_type(field: str, values: Sequence[Any]) -> type:
+    """
+    Type of the column holding `values`: str for text, float as soon as any
+    value is a float (so no value is truncated), int otherwise. Text mixed
+    with numbers is rejected rather than coerced either way.
+    """
+    if all(isinstance(value, str) for value in values):
+        return str
+    for value in values:
+        if isinstance(value, str):
+            raise ValueError(f"Field '{field}' mixes text and numbers")
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"Field '{field}' has unsupported type {type(value).__name__}")
+    return float if any(isinstance(value, float) for value in values) else int
+
+
+class Catalog:
+    """
+    Read-only, column-wise catalog of rows.
+
+    String columns are dictionary-encoded and integer and float columns are
+    NumPy arrays, so a row costs a few bytes per field instead of a dict.
+    `keys` names the string columns that get an inverted index, `ranges` the
+    numeric columns kept sorted for range queries and `searchable` the string
+    columns that also get a trigram index for substring and free-text
+    queries. Rows are only turned back into dicts when they are returned to a
+    client, unless `encode_rows` has pre-encoded them as JSON.
+    """
+
+    def __init__(
+        self,
+        rows: Sequence[Mapping[str, Any]],
+        keys: Sequence[str] = (),
+        ranges: Sequence[str] = (),
+        searchable: Sequence[str] = (),
+    ):
+        columns: Dict[str, Column] = {}
+        for field in (rows[0] if rows else ()):
+            values = [row[field] for row in rows]
+            kind = infer_type(field, values)
+            if kind is str:
+                columns[field] = StringColumn.build(values, indexed=field in keys, searchable=field in searchable)
+            elif kind is float:
+                columns[field] = FloatColumn.build(values, indexed=field in ranges)
+            else:
+                columns[field] = IntColumn.build(values, indexed=field in ranges)
+        self._set_columns(columns, len(rows))
+
+        digest = hashlib.blake2b(digest_size=16)
+        for row in rows:
+            digest.update(json.dumps(row, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        self.version = digest.hexdigest()
+
+    @classmethod
+    def from_columns(cls, columns: Mapping[str, Column], size: int) -> "Catalog":
+        """Wrap prebuilt columns, e.g. ones backed by a memory-mapped catalog file."""
+        catalog = cls.__new__(cls)
+        catalog._set_columns(dict(columns), size)
+        return catalog
+
+    def _set_columns(self, columns: Dict[str, Column], size: int) -> None:
+        self.columns = columns
+        self.fields: Tuple[str, ...] = tuple(columns)
+        self.size = size
+        self.searchable: Tuple[str, ...] = tuple(
+            field for field, column in columns.items() if isinstance(column, StringColumn) and column.trigrams is not None
+        )
+        # Content hash, the same in every worker; identifies the data for caches and ETags
+        self.version: Optional[str] = None
+        # Pre-encoded JSON object per row, see encode_rows
+        self.row_json: Optional[BytesTable] = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, row_id: int) -> Dict[str, Any]:
+        return {field: column.value(row_id) for field, column in self.columns.items()}
+
+    def rows(self, row_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        return [self[row_id] for row_id in row_ids]
+
+    def encode_rows(self, model: Any) -> "Catalog":
+        """
+        Validate every row against the Pydantic `model` once and keep its JSON
+        encoding, so responses are assembled from bytes instead of being
+        validated and serialized row by row on every request. Raises
+        pydantic.ValidationError if any row does not fit the model.
+        """
+        self.row_json = BytesTable.build([model.model_validate(self[i]).model_dump_json().encode("utf-8") for i in range(self.size)])
+        return self
+
+    def json_array(self, row_ids: Sequence[int]) -> bytes:
+        """JSON array of the given rows, from the pre-encoded rows when available."""
+        with phase("serialize"):
+            if self.row_json is None:
+                return json.dumps(self.rows(row_ids), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            row_json = self.row_json
+            return b"[" + b",".join([row_json[row_id] for row_id in row_ids]) + b"]"
+
+    def json_row(self, row_id: int) -> bytes:
+        """JSON object of one row, from the pre-encoded rows when available."""
+        if self.row_json is None:
+            return json.dumps(self[row_id], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return self.row_json[row_id]
+
+    def json_lines(self, row_ids: Iterable[int], chunk: int = 64) -> Iterator[bytes]:
+        """Rows as newline-delimited JSON, yielded `chunk` lines at a time as `row_ids` produces them."""
+        lines: List[bytes] = []
+        for row_id in row_ids:
+            lines.append(self.json_row(row_id))
+            if len(lines) == chunk:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+    def select(
+        self,
+        equals: Optional[Mapping[str, Any]] = None,
+        contains: Optional[Mapping[str, Optional[str]]] = None,
+        ranges: Optional[Mapping[str, Bounds]] = None,
+        text: Optional[str] = None,
+        within: Optional[np.ndarray] = None,
+    ) -> Sequence[int]:
+        """
+        Return the ids of rows matching every filter.
+
+        `equals` does case-insensitive equality, `contains` case-insensitive
+        substring matching, `ranges` inclusive (lo, hi) bounds on numeric
+        columns or, on string columns, in sorted key order (e.g. ISO dates),
+        `text` a substring match against any searchable column and `within`
+        restricts the result to the given row ids (e.g. from a spatial
+        index); empty filter values are ignored. Indexed columns provide
+        candidate lists and the smallest one drives the query, with the other
+        filters applied as vectorized masks over just those candidates. Without
+        any indexed filter the masks run over whole columns.
+        """
+        # Each entry is (candidate row ids or None, mask function over row ids)
+        filters: List[Tuple[Optional[np.ndarray], Callable[[Any], np.ndarray]]] = []
+
+        for field, value in (equals or {}).items():
+            if not value:
+                continue
+            column = self.columns[field]
+            if isinstance(column, IntColumn):
+                filters.append(self._range_filter(column, value, value))
+                continue
+            key_code = column.find_key(value)
+            if key_code is None:
+                return EMPTY
+            candidates = column.postings(key_code) if column.order is not None else None
+            filters.append((candidates, self._equals_mask(column, key_code)))
+
+        for field, needle in (contains or {}).items():
+            if not needle:
+                continue
+            column = self.columns[field]
+            key_codes = column.keys_containing(normalize(needle))
+            if not len(key_codes):
+                return EMPTY
+            candidates = column.rows_for_keys(key_codes) if column.order is not None else None
+            filters.append((candidates, lambda ids, column=column, key_codes=key_codes: column.key_mask(ids, key_codes)))
+
+        if text and self.searchable:
+            text_filter = self._text_filter(normalize(text))
+            if text_filter is None:
+                return EMPTY
+            filters.append(text_filter)
+
+        for field, (lo, hi) in (ranges or {}).items():
+            if lo is None and hi is None:
+                continue
+            column = self.columns[field]
+            if isinstance(column, StringColumn):
+                filters.append(self._key_range_filter(column, lo, hi))
+            else:
+                filters.append(self._range_filter(column, lo, hi))
+
+        if within is not None:
+            if not len(within):
+                return EMPTY
+            within = np.sort(np.asarray(within, dtype=np.int32))
+            filters.append((within, lambda ids: np.isin(ids, within, assume_unique=True)))
+
+        if not filters:
+            return range(self.size)
+
+        sized = [i for i, (candidates, _) in enumerate(filters) if candidates is not None]
+        if sized:
+            driver = min(sized, key=lambda i: len(filters[i][0]))
+            row_ids = filters[driver][0]
+            for i, (_, mask) in enumerate(filters):
+                if i != driver and len(row_ids):
+                    row_ids = row_ids[mask(row_ids)]
+            return row_ids
+
+        mask = filters[0][1](slice(None))
+        for _, other in filters[1:]:
+            mask &= other(slice(None))
+        return np.flatnonzero(mask).astype(np.int32)
+
+    def _text_filter(self, needle: str):
+        matches = []
+        for field in self.searchable:
+            column = self.columns[field]
+            key_codes = column.keys_containing(needle)
+            if len(key_codes):
+                matches.append((column, key_codes))
+        if not matches:
+            return None
+
+        candidates = np.unique(np.concatenate([column.rows_for_keys(key_codes) for column, key_codes in matches]))
+
+        def mask(ids):
+            result = matches[0][0].key_mask(ids, matches[0][1])
+            for column, key_codes in matches[1:]:
+                result |= column.key_mask(ids, key_codes)
+            return result
+
+        return candidates, mask
+
+    @staticmethod
+    def _equals_mask(column: StringColumn, key_code: int) -> Callable[[Any], np.ndarray]:
+        return lambda ids: column.key_codes[column.codes[ids]] == key_code
+
+    @staticmethod
+    def _key_range_filter(column: StringColumn, lo: Optional[str], hi: Optional[str]):
+        # Keys are sorted, so a range of values is a range of key codes
+        lo_code = 0 if lo is None else bisect_left(column.keys, normalize(lo))
+        hi_code = len(column.keys) - 1 if hi is None else bisect_right(column.keys, normalize(hi)) - 1
+
+        def mask(ids):
+            key_codes = column.key_codes[column.codes[ids]]
+            return (key_codes >= lo_code) & (key_codes <= hi_code)
+
+        candidates = None
+        if lo_code > hi_code:
+            candidates = EMPTY
+        elif column.order is not None:
+            candidates = column.order[column.offsets[lo_code]:column.offsets[hi_code + 1]]
+        return candidates, mask
+
+    @staticmethod
+    def _range_filter(column: IntColumn, lo: Optional[float], hi: Optional[float]):
+        lo_bound = -np.inf if lo is None else lo
+        hi_bound = np.inf if hi is None else hi
+
+        def mask(ids):
+            values = column.values[ids]
+            return (values >= lo_bound) & (values <= hi_bound)
+
+        candidates = None
+        if column.order is not None:
+            start = np.searchsorted(column.sorted_values, lo_bound, side="left")
+            stop = np.searchsorted(column.sorted_values, hi_bound, side="right")
+            candidates = column.order[start:stop]
+        return candidates, mask
@@ -0,0 +1,348 @@
+"""
+Binary on-disk catalog format, opened through `mmap`.
+
+Layout (little-endian):
+
+    prefix    magic, format version, offset and length of the metadata block
+    sections  8-byte aligned raw arrays: code columns, string tables,
+              numeric columns, the prebuilt filter and trigram indexes and,
+              optionally, the pre-encoded JSON of every row
+    metadata  JSON with the field list and the section offset table
+
+Workers map the file read-only and wrap the sections with `np.frombuffer`,
+so every process shares the same pages through the OS page cache and
+opening a catalog does no per-row parsing.
+
+Build a file with:
+
+    python -m common.catalog_file build games.jsonl games.cat --search title platform genre
+
+Add `--model "Game finder/Game finder.py:Game"` to validate the rows against
+the service's response model and store their JSON in the file. Without it,
+each service validates and encodes the rows itself when it maps the file,
+off the request path (see LiveCatalog).
+"""
+import argparse
+import csv
+import hashlib
+import importlib.util
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from common.catalog import BytesTable, Catalog, FloatColumn, IntColumn, StringColumn
+from common.trigram import TrigramIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PODCAT\x00\x00"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<8sIIQQ")  # magic, format version, reserved, metadata offset, metadata length
+_ALIGN = 8
+
+
+class StringTable(BytesTable):
+    """Read-only sequence of strings stored as a UTF-8 blob plus an offsets array."""
+
+    def __getitem__(self, index: int) -> str:
+        return super().__getitem__(index).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        blob = self._buffer[self._start:self._start + int(self._offsets[-1])]
+        bounds = self._offsets.tolist()
+        for begin, end in zip(bounds, bounds[1:]):
+            yield blob[begin:end].decode("utf-8")
+
+
+def _encode_strings(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _column_sections(field: str, column: Any) -> List[Tuple[str, np.ndarray]]:
+    if isinstance(column, StringColumn):
+        dict_offsets, dict_blob = _encode_strings(column.dictionary)
+        key_offsets, key_blob = _encode_strings(column.keys)
+        sections = [
+            (f"{field}.codes", column.codes),
+            (f"{field}.dictionary.offsets", dict_offsets),
+            (f"{field}.dictionary.blob", dict_blob),
+            (f"{field}.keys.offsets", key_offsets),
+            (f"{field}.keys.blob", key_blob),
+            (f"{field}.key_codes", column.key_codes),
+        ]
+        if column.order is not None:
+            sections += [(f"{field}.order", column.order), (f"{field}.offsets", column.offsets)]
+        if column.trigrams is not None:
+            sections += [
+                (f"{field}.trigrams.grams", column.trigrams.grams),
+                (f"{field}.trigrams.offsets", column.trigrams.offsets),
+                (f"{field}.trigrams.owners", column.trigrams.owners),
+            ]
+        return sections
+    sections = [(f"{field}.values", column.values)]
+    if column.order is not None:
+        sections += [(f"{field}.order", column.order), (f"{field}.sorted_values", column.sorted_values)]
+    return sections
+
+
+def write_catalog(catalog: Catalog, path: str) -> str:
+    """
+    Write `catalog` to `path` and return its version (a hash of the content).
+    The file is written next to `path` and moved into place atomically, so
+    workers watching `path` never see a partial file.
+    """
+    fields = []
+    sections: List[Tuple[str, np.ndarray]] = []
+    for field, column in catalog.columns.items():
+        fields.append({
+            "name": field,
+            "type": "str" if isinstance(column, StringColumn) else "float" if isinstance(column, FloatColumn) else "int",
+            "indexed": column.order is not None,
+            "searchable": getattr(column, "trigrams", None) is not None,
+        })
+        sections += _column_sections(field, column)
+    if catalog.row_json is not None:
+        sections += [("rows.json.offsets", catalog.row_json.offsets), ("rows.json.blob", catalog.row_json.blob)]
+
+    digest = hashlib.blake2b(digest_size=16)
+    table: Dict[str, List[Any]] = {}
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as fh:
+        fh.write(b"\0" * _PREFIX.size)
+        for name, array in sections:
+            array = np.ascontiguousarray(array)
+            fh.write(b"\0" * (-fh.tell() % _ALIGN))
+            table[name] = [fh.tell(), array.dtype.str, len(array)]
+            data = array.tobytes()
+            digest.update(name.encode("utf-8"))
+            digest.update(data)
+            fh.write(data)
+
+        version = digest.hexdigest()
+        meta = json.dumps({"size": catalog.size, "version": version, "fields": fields, "sections": table}).encode("utf-8")
+        meta_offset = fh.tell()
+        fh.write(meta)
+        fh.seek(0)
+        fh.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, 0, meta_offset, len(meta)))
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+    return version
+
+
+def open_catalog(path: str) -> Catalog:
+    """Memory-map a catalog file read-only and wrap its sections without copying."""
+    with open(path, "rb") as fh:
+        buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, format_version, _, meta_offset, meta_length = _PREFIX.unpack_from(buffer, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} catalog file")
+    meta = json.loads(buffer[meta_offset:meta_offset + meta_length])
+    table = meta["sections"]
+
+    def section(name: str) -> Optional[np.ndarray]:
+        if name not in table:
+            return None
+        offset, dtype, count = table[name]
+        return np.frombuffer(buffer, dtype=np.dtype(dtype), count=count, offset=offset)
+
+    def strings(name: str) -> StringTable:
+        return StringTable(buffer, section(f"{name}.offsets"), table[f"{name}.blob"][0])
+
+    columns: Dict[str, Any] = {}
+    for field in meta["fields"]:
+        name = field["name"]
+        if field["type"] == "str":
+            trigrams = None
+            if field.get("searchable"):
+                trigrams = TrigramIndex(
+                    section(f"{name}.trigrams.grams"),
+                    section(f"{name}.trigrams.offsets"),
+                    section(f"{name}.trigrams.owners"),
+                )
+            columns[name] = StringColumn(
+                strings(f"{name}.dictionary"),
+                section(f"{name}.codes"),
+                strings(f"{name}.keys"),
+                section(f"{name}.key_codes"),
+                section(f"{name}.order"),
+                section(f"{name}.offsets"),
+                trigrams,
+            )
+        else:
+            column_class = FloatColumn if field["type"] == "float" else IntColumn
+            columns[name] = column_class(section(f"{name}.values"), section(f"{name}.order"), section(f"{name}.sorted_values"))
+
+    catalog = Catalog.from_columns(columns, meta["size"])
+    catalog.version = meta["version"]
+    if "rows.json.offsets" in table:
+        catalog.row_json = BytesTable(buffer, section("rows.json.offsets"), table["rows.json.blob"][0])
+    return catalog
+
+
+class LiveCatalog:
+    """
+    The catalog a service currently serves.
+
+    With a `path`, the file is memory-mapped and a watcher thread re-checks
+    it every `check_interval` seconds; when it has been replaced (new inode,
+    size or mtime) the watcher maps the new file and swaps it in. Requests
+    only read the published catalog, so they never wait for a reload, and
+    those that already hold the old catalog keep using it until they
+    finish. Without a `path` the in-memory `fallback` is served.
+
+    With a Pydantic `model`, every catalog swapped in whose file does not
+    already carry pre-encoded rows is validated and encoded once on load
+    (see Catalog.encode_rows), on the watcher thread. `key` names the fields
+    that identify a row, which delta updates (common.loader) match on.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        fallback: Optional[Catalog] = None,
+        check_interval: float = 1.0,
+        model: Any = None,
+        key: Sequence[str] = (),
+    ):
+        self.path = path
+        self.check_interval = check_interval
+        self.model = model
+        self.key = tuple(key)
+        self._catalog = self._prepare(fallback) if fallback is not None else None
+        self._stat: Optional[Tuple[int, int, int]] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        if path:
+            self.reload()
+            threading.Thread(target=self._watch, name="catalog-watch", daemon=True).start()
+
+    @property
+    def current(self) -> Catalog:
+        """Snapshot to use for a whole request, so row ids stay consistent."""
+        return self._catalog
+
+    def reload(self) -> bool:
+        """Map the file again if it changed on disk; returns True when a new catalog was swapped in."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self._catalog is None:
+                    raise
+                return False
+            stat = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if stat == self._stat:
+                return False
+            self._catalog = self._prepare(open_catalog(self.path))
+            self._stat = stat
+            return True
+
+    def swap(self, catalog: Catalog) -> None:
+        """
+        Serve `catalog` from now on. With a `path` it is written there first
+        (atomically, outside the lock), so every worker watching the file
+        maps the new version; otherwise it replaces the in-memory catalog.
+        """
+        if self.path:
+            write_catalog(self._prepare(catalog), self.path)
+            self.reload()
+            return
+        catalog = self._prepare(catalog)
+        with self._lock:
+            self._catalog = catalog
+
+    def close(self) -> None:
+        """Stop watching the file."""
+        self._stopped.set()
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.check_interval):
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Reloading catalog %s failed", self.path)
+
+    def _prepare(self, catalog: Catalog) -> Catalog:
+        if self.model is not None and catalog.row_json is None:
+            catalog.encode_rows(self.model)
+        return catalog
+
+
+def _is_int(value: str) -> bool:
+    try:
+        int(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_float(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def read_source(path: str) -> List[Dict[str, Any]]:
+    """Read rows from a JSON array, JSON-lines or CSV file."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as fh:
+            rows = list(csv.DictReader(fh))
+        # CSV has no types; columns where every value is a number become int or float columns
+        for field in (rows[0] if rows else ()):
+            if all(_is_int(row[field]) for row in rows):
+                for row in rows:
+                    row[field] = int(row[field])
+            elif all(_is_float(row[field]) for row in rows):
+                for row in rows:
+                    row[field] = float(row[field])
+        return rows
+    with open(path, encoding="utf-8") as fh:
+        if path.endswith(".json"):
+            return json.load(fh)
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def load_model(spec: str) -> Any:
+    """Load a model class given as "path/to/service.py:ClassName"."""
+    path, _, name = spec.rpartition(":")
+    module_spec = importlib.util.spec_from_file_location("catalog_model_source", path)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return getattr(module, name)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build memory-mappable catalog files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Convert JSON/JSON-lines/CSV rows into a catalog file")
+    build.add_argument("source", help="Input .json, .jsonl or .csv file")
+    build.add_argument("output", help="Catalog file to write (replaced atomically)")
+    build.add_argument("--keys", nargs="*", default=[], help="String fields to index for equality filters")
+    build.add_argument("--ranges", nargs="*", default=[], help="Numeric fields to index for range filters")
+    build.add_argument("--search", nargs="*", default=[], help="String fields to index for substring and free-text search")
+    build.add_argument("--model", help='Validate and pre-encode rows with a response model, e.g. "Book Suggestor/Book Suggestor.py:Book"')
+    args = parser.parse_args(argv)
+
+    rows = read_source(args.source)
+    catalog = Catalog(rows, keys=args.keys, ranges=args.ranges, searchable=args.search)
+    if args.model:
+        catalog.encode_rows(load_model(args.model))
+    version = write_catalog(catalog, args.output)
+    print(f"Wrote {len(rows)} rows to {args.output} (version {version})")
+
+
+if __name__ == "__main__":
+    main()
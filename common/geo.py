@@ -0,0 +1,122 @@
+"""
+Spatial lookups over catalog rows with latitude/longitude columns.
+
+`GeoGrid` buckets rows into a uniform grid of `cell_degrees` cells, stored
+like the catalog's other indexes: row ids sorted by cell id, so the rows of
+a run of adjacent cells are one `searchsorted` range. A radius query only
+visits the cells overlapping the circle's bounding box and computes exact
+haversine distances for the rows in them, so its cost depends on how many
+rows are near the query point rather than on the size of the catalog.
+"""
+import math
+import threading
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from common.catalog import Catalog
+from common.metrics import phase
+from common.scheduler import shared
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from (lat, lon) to each of (lats, lons)."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoGrid:
+    """Grid index over row coordinates for radius queries."""
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, cell_degrees: float = 0.1):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_degrees = cell_degrees
+        self.lat_cells = math.ceil(180 / cell_degrees)
+        self.lon_cells = math.ceil(360 / cell_degrees)
+        cells = self._lat_cell(self.lats) * self.lon_cells + self._lon_cell(self.lons)
+        self.order = np.argsort(cells, kind="stable").astype(np.int32)
+        self.sorted_cells = cells[self.order]
+
+    @classmethod
+    def build(cls, catalog: Catalog, lat_field: str = "lat", lon_field: str = "lon", cell_degrees: float = 0.1) -> "GeoGrid":
+        return cls(catalog.columns[lat_field].values, catalog.columns[lon_field].values, cell_degrees)
+
+    def _lat_cell(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90) / self.cell_degrees), 0, self.lat_cells - 1).astype(np.int64)
+
+    def _lon_cell(self, lon):
+        return np.floor(((np.asarray(lon) + 180) % 360) / self.cell_degrees).astype(np.int64) % self.lon_cells
+
+    def _lon_ranges(self, lon: float, lat_lo: float, lat_hi: float, radius_km: float) -> List[Tuple[int, int]]:
+        """Inclusive longitude cell ranges covering the circle, split at the antimeridian."""
+        widest = max(abs(lat_lo), abs(lat_hi))
+        if widest >= 89.9:
+            return [(0, self.lon_cells - 1)]
+        half_width = radius_km / (KM_PER_DEGREE * math.cos(math.radians(widest)))
+        if half_width >= 180:
+            return [(0, self.lon_cells - 1)]
+        first = int(self._lon_cell(lon - half_width))
+        last = int(self._lon_cell(lon + half_width))
+        if first <= last:
+            return [(first, last)]
+        return [(first, self.lon_cells - 1), (0, last)]
+
+    def within(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Ids of the rows within `radius_km` of (lat, lon), in no particular order."""
+        half_height = radius_km / KM_PER_DEGREE
+        lat_lo, lat_hi = max(lat - half_height, -90.0), min(lat + half_height, 90.0)
+        lon_ranges = self._lon_ranges(lon, lat_lo, lat_hi, radius_km)
+        lat_rows = np.arange(int(self._lat_cell(lat_lo)), int(self._lat_cell(lat_hi)) + 1, dtype=np.int64)
+
+        lows = np.concatenate([lat_rows * self.lon_cells + first for first, _ in lon_ranges])
+        highs = np.concatenate([lat_rows * self.lon_cells + last for _, last in lon_ranges])
+        starts = np.searchsorted(self.sorted_cells, lows, side="left")
+        stops = np.searchsorted(self.sorted_cells, highs, side="right")
+        spans = [self.order[start:stop] for start, stop in zip(starts.tolist(), stops.tolist()) if stop > start]
+        if not spans:
+            return np.empty(0, dtype=np.int32)
+        candidates = np.concatenate(spans)
+        return candidates[haversine_km(lat, lon, self.lats[candidates], self.lons[candidates]) <= radius_km]
+
+    def nearest(self, lat: float, lon: float, row_ids: np.ndarray, limit: int) -> np.ndarray:
+        """The `limit` rows of `row_ids` closest to (lat, lon), nearest first."""
+        with phase("rank"):
+            row_ids = np.asarray(row_ids, dtype=np.int32)
+            distances = haversine_km(lat, lon, self.lats[row_ids], self.lons[row_ids])
+            if limit < len(row_ids):
+                top = np.argpartition(distances, limit - 1)[:limit]
+                row_ids, distances = row_ids[top], distances[top]
+            return row_ids[np.lexsort((row_ids, distances))]
+
+
+class LiveGeoGrid:
+    """GeoGrid for whichever catalog a LiveCatalog currently serves, rebuilt after it changes."""
+
+    def __init__(self, lat_field: str = "lat", lon_field: str = "lon", cell_degrees: float = 0.1):
+        self.lat_field = lat_field
+        self.lon_field = lon_field
+        self.cell_degrees = cell_degrees
+        self._catalog: Optional[Catalog] = None
+        self._grid: Optional[GeoGrid] = None
+        self._lock = threading.Lock()
+
+    def index(self, catalog: Catalog) -> GeoGrid:
+        with self._lock:
+            if self._catalog is not catalog:
+                self._grid = GeoGrid.build(catalog, self.lat_field, self.lon_field, self.cell_degrees)
+                self._catalog = catalog
+            return self._grid
+
+    def select_within(self, catalog: Catalog, lat: float, lon: float, radius_km: float, **filters: Any) -> np.ndarray:
+        """`catalog.select(**filters)`, restricted to rows within `radius_km` of (lat, lon)."""
+        return catalog.select(within=self.index(catalog).within(lat, lon, radius_km), **filters)
+
+    def __reduce__(self):
+        # Sent to worker processes by configuration; each process builds its own grid
+        return shared, (LiveGeoGrid, self.lat_field, self.lon_field, self.cell_degrees)
@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Generic, List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class GroupCommitter(Generic[T, R]):
+    """
+    Batches writes from many threads into one commit.
+
+    Callers `submit()` items and block until the batch containing them has
+    been applied. A background thread collects whatever arrives within
+    `max_delay` seconds (up to `max_batch` items) and hands it to
+    `apply_batch` in one call, so the cost of an fsync or transaction is
+    shared by every write in the batch.
+    """
+
+    def __init__(self, apply_batch: Callable[[List[T]], List[R]], max_batch: int = 1024, max_delay: float = 0.002):
+        self._apply_batch = apply_batch
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._pending: List[Tuple[List[T], Future]] = []
+        self._pending_items = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, items: Sequence[T]) -> List[R]:
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("GroupCommitter is closed")
+            self._pending.append((list(items), future))
+            self._pending_items += len(items)
+            self._cond.notify()
+        return future.result()
+
+    def close(self) -> None:
+        """Flush pending writes and stop the commit thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                deadline = time.monotonic() + self._max_delay
+                while self._pending_items < self._max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending, self._pending_items = self._pending, [], 0
+
+            items: List[Any] = [item for chunk, _ in batch for item in chunk]
+            try:
+                results = self._apply_batch(items)
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            start = 0
+            for chunk, future in batch:
+                future.set_result(results[start:start + len(chunk)])
+                start += len(chunk)
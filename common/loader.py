@@ -0,0 +1,684 @@
+"""
+Streaming catalog loads and incremental delta updates.
+
+`load_catalog` reads a JSON-lines or CSV file `chunk_rows` rows at a time
+and appends every chunk to column builders (codes into a growing
+dictionary for strings, NumPy chunks for numbers, one blob for the
+pre-encoded row JSON), so memory holds the finished columns plus a single
+chunk, never a dict per row. With a response model each chunk is
+validated in one Pydantic call; rows that fail are reported and skipped.
+
+A delta file holds upserts and deletes, matched on the catalog's key
+fields (case-insensitively for strings, like the filters):
+
+    {"op": "upsert", "title": "Dune", "author": "Frank Herbert", "genre": "science fiction", "decade": 1960}
+    {"op": "delete", "title": "The Da Vinci Code", "author": "Dan Brown"}
+
+`apply_delta` derives the next catalog from the current one without
+sorting its rows again: surviving rows keep their relative order, upserted
+rows are appended, and every filter index (key postings, sorted numeric
+values, trigrams) is merged from the old index and the delta in linear
+passes. Matching delta rows to existing ones is the exception: the key
+lookup is rebuilt from the current catalog for each delta, an O(N log N)
+argsort over its rows. The result is a new Catalog, swapped in atomically by LiveCatalog.swap while
+requests keep the snapshot they started with. `refresh_in_background`
+runs a load or delta for a LiveCatalog on the loader thread.
+
+Load a file or apply a delta to a catalog file with:
+
+    python -m common.loader load books.jsonl books.cat --keys genre --ranges decade --model "Book Suggestor/Book Suggestor.py:Book"
+    python -m common.loader apply books.cat changes.jsonl --key title author --model "Book Suggestor/Book Suggestor.py:Book"
+
+Services watching the file swap the new version in without a restart.
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+from bisect import bisect_left
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import TypeAdapter, ValidationError
+
+from common.catalog import BytesTable, Catalog, Column, FloatColumn, IntColumn, StringColumn, infer_type, normalize
+from common.catalog_file import LiveCatalog, load_model, open_catalog, write_catalog
+from common.trigram import TrigramIndex, trigrams
+
+DEFAULT_CHUNK_ROWS = 50_000
+# Rejected rows reported individually per load; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+Chunk = List[Tuple[int, Dict[str, Any]]]  # (line number, row)
+
+
+class RowError(NamedTuple):
+    line: int
+    message: str
+
+
+class LoadReport:
+    """Outcome of a load or delta: rows taken, rows rejected and the first errors."""
+
+    def __init__(self):
+        self.rows = 0
+        self.deleted = 0
+        self.rejected = 0
+        self.errors: List[RowError] = []
+
+    def reject(self, line: int, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(line, message))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "deleted": self.deleted,
+            "rejected": self.rejected,
+            "errors": [error._asdict() for error in self.errors],
+        }
+
+
+def read_chunks(path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS, report: Optional[LoadReport] = None) -> Iterator[Chunk]:
+    """
+    Rows of a JSON-lines or CSV file, `chunk_rows` at a time, with their
+    line numbers. Lines that are not valid JSON are rejected into `report`.
+    A JSON array (.json) is accepted too, but has to be parsed whole.
+    """
+    report = report if report is not None else LoadReport()
+    with open(path, newline="", encoding="utf-8") as fh:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(fh)
+            rows: Iterator[Tuple[int, Dict[str, Any]]] = ((reader.line_num, row) for row in reader)
+        elif path.endswith(".json"):
+            rows = enumerate(json.load(fh), start=1)
+        else:
+            yield from _json_line_chunks(fh, chunk_rows, report)
+            return
+        while True:
+            chunk = list(itertools.islice(rows, chunk_rows))
+            if not chunk:
+                return
+            yield chunk
+
+
+def _json_line_chunks(fh: Any, chunk_rows: int, report: LoadReport) -> Iterator[Chunk]:
+    lines = enumerate(fh, start=1)
+    while True:
+        batch = list(itertools.islice(lines, chunk_rows))
+        if not batch:
+            return
+        yield _parse_lines([(number, line) for number, line in batch if line.strip()], report)
+
+
+def _parse_lines(batch: List[Tuple[int, str]], report: LoadReport) -> Chunk:
+    """Parse JSON lines as one array in a single call, or line by line to find the bad ones."""
+    try:
+        rows = json.loads("[" + ",".join(line for _, line in batch) + "]")
+        if all(isinstance(row, dict) for row in rows):
+            return [(number, row) for (number, _), row in zip(batch, rows)]
+    except ValueError:
+        pass
+    chunk: Chunk = []
+    for number, line in batch:
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            report.reject(number, f"invalid JSON: {exc}")
+            continue
+        if not isinstance(row, dict):
+            report.reject(number, "not a JSON object")
+            continue
+        chunk.append((number, row))
+    return chunk
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Any) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def validate_batch(model: Any, rows: List[Dict[str, Any]]) -> Tuple[List[Any], Dict[int, str]]:
+    """
+    Validate `rows` against `model` in one call. Returns the models of the
+    valid rows, in order, and an error message per invalid row index.
+    """
+    adapter = _list_adapter(model)
+    try:
+        return adapter.validate_python(rows), {}
+    except ValidationError as exc:
+        invalid: Dict[int, str] = {}
+        for error in exc.errors():
+            index, *loc = error["loc"]
+            invalid.setdefault(index, f"{'.'.join(map(str, loc)) or 'row'}: {error['msg']}")
+    return adapter.validate_python([row for i, row in enumerate(rows) if i not in invalid]), invalid
+
+
+def _looks_int(value: str) -> bool:
+    return value.lstrip("-").isdigit()
+
+
+def _looks_float(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _infer_types(rows: List[Dict[str, Any]], infer_numbers: Sequence[str]) -> Dict[str, type]:
+    """Column type per field, from the first batch; `infer_numbers` fields may hold numbers as text (CSV)."""
+    types: Dict[str, type] = {}
+    for field in rows[0]:
+        # Rows missing the field are rejected when converted, not counted against its type
+        values = [row[field] for row in rows if row.get(field) is not None] or [rows[0][field]]
+        if field in infer_numbers and all(isinstance(v, str) for v in values):
+            types[field] = int if all(map(_looks_int, values)) else float if all(map(_looks_float, values)) else str
+        else:
+            types[field] = infer_type(field, values)
+    return types
+
+
+def _to_int(value: Any) -> int:
+    # int() would silently truncate a fractional float
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"{value!r} is not an integer")
+    return int(value)
+
+
+# Conversion of a value to each column type
+_CONVERTERS: Dict[type, Callable[[Any], Any]] = {str: str, int: _to_int, float: float}
+
+
+def column_types(catalog: Catalog) -> Dict[str, type]:
+    return {
+        field: str if isinstance(column, StringColumn) else float if isinstance(column, FloatColumn) else int
+        for field, column in catalog.columns.items()
+    }
+
+
+def index_spec(catalog: Catalog) -> Dict[str, List[str]]:
+    """The keys/ranges/searchable arguments that rebuild `catalog`'s indexes."""
+    spec: Dict[str, List[str]] = {"keys": [], "ranges": [], "searchable": []}
+    for field, column in catalog.columns.items():
+        if isinstance(column, StringColumn):
+            if column.trigrams is not None:
+                spec["searchable"].append(field)
+            elif column.order is not None:
+                spec["keys"].append(field)
+        elif column.order is not None:
+            spec["ranges"].append(field)
+    return spec
+
+
+class CatalogBuilder:
+    """
+    Columns of a catalog built chunk by chunk. Field types come from
+    `types` or are inferred from the first chunk; later rows are converted
+    to them and rejected if they do not fit, except that a float in a later
+    chunk turns an inferred int column into a float one. With a `model`, rows are
+    validated and their JSON encoding kept (as Catalog.encode_rows would).
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str] = (),
+        ranges: Sequence[str] = (),
+        searchable: Sequence[str] = (),
+        model: Any = None,
+        types: Optional[Dict[str, type]] = None,
+        infer_numbers: bool = False,
+    ):
+        self.keys = keys
+        self.ranges = ranges
+        self.searchable = searchable
+        self.model = model
+        self.types = types
+        self.infer_numbers = infer_numbers
+        self._inferred = types is None
+        self.size = 0
+        self._codes: Dict[str, Dict[str, int]] = {}
+        self._chunks: Dict[str, List[np.ndarray]] = {}
+        self._json: List[bytes] = []
+        self._digest = hashlib.blake2b(digest_size=16)
+
+    def add(self, chunk: Chunk, report: LoadReport) -> Tuple[List[int], Dict[str, List[Any]]]:
+        """
+        Append the valid rows of `chunk`. Returns their positions in the
+        chunk and, per field, their converted values.
+        """
+        rows = [row for _, row in chunk]
+        positions = list(range(len(chunk)))
+        encoded: Optional[List[bytes]] = None
+        if self.model is not None:
+            models, invalid = validate_batch(self.model, rows)
+            for index, message in sorted(invalid.items()):
+                report.reject(chunk[index][0], message)
+            positions = [i for i in positions if i not in invalid]
+            adapter = _list_adapter(self.model)
+            # Validated fields replace the raw ones; fields the model does not cover are kept as read
+            rows = [{**rows[i], **dumped} for i, dumped in zip(positions, adapter.dump_python(models, mode="json"))]
+            encoded = [item.model_dump_json().encode("utf-8") for item in models]
+        if not rows:
+            return [], {}
+        if self.types is None:
+            model_fields = getattr(self.model, "model_fields", {})
+            numeric_text = [field for field in rows[0] if field not in model_fields] if self.infer_numbers else []
+            self.types = _infer_types(rows, numeric_text)
+        elif self._inferred:
+            self._promote(rows)
+
+        fields = list(self.types.items())
+        try:
+            columns = {field: list(map(_CONVERTERS[column_type], [row[field] for row in rows])) for field, column_type in fields}
+        except (KeyError, TypeError, ValueError):
+            # Some row does not fit the column types: find and drop it row by row
+            fitting = [n for n, row in enumerate(rows) if self._fits(row, chunk[positions[n]][0], report)]
+            positions = [positions[n] for n in fitting]
+            rows = [rows[n] for n in fitting]
+            encoded = [encoded[n] for n in fitting] if encoded is not None else None
+            columns = {field: list(map(_CONVERTERS[column_type], [row[field] for row in rows])) for field, column_type in fields}
+        if not rows:
+            return [], {}
+
+        for field, column_type in fields:
+            if column_type is str:
+                code_of = self._codes.setdefault(field, {})
+                codes = np.fromiter((code_of.setdefault(value, len(code_of)) for value in columns[field]), dtype=np.int32, count=len(rows))
+                self._chunks.setdefault(field, []).append(codes)
+            else:
+                self._chunks.setdefault(field, []).append(np.asarray(columns[field], dtype=np.float64 if column_type is float else np.int32))
+        self._digest.update(json.dumps([columns[field] for field, _ in fields], ensure_ascii=False).encode("utf-8"))
+        if encoded is not None:
+            self._json.extend(encoded)
+        self.size += len(rows)
+        return positions, columns
+
+    def _promote(self, rows: List[Dict[str, Any]]) -> None:
+        """Turn int columns into float ones when `rows` has a float for them, as the first chunk would have."""
+        for field, column_type in self.types.items():
+            if column_type is int and any(isinstance(row.get(field), float) for row in rows):
+                self.types[field] = float
+                self._chunks[field] = [chunk.astype(np.float64) for chunk in self._chunks.get(field, [])]
+
+    def _fits(self, row: Dict[str, Any], line: int, report: LoadReport) -> bool:
+        try:
+            for field, column_type in self.types.items():
+                _CONVERTERS[column_type](row[field])
+        except KeyError as exc:
+            report.reject(line, f"missing field {exc}")
+            return False
+        except (TypeError, ValueError) as exc:
+            report.reject(line, f"wrong type for '{field}': {exc}")
+            return False
+        return True
+
+    def build(self) -> Catalog:
+        columns: Dict[str, Column] = {}
+        for field, column_type in (self.types or {}).items():
+            chunks = self._chunks.get(field) or [np.empty(0, dtype=np.float64 if column_type is float else np.int32)]
+            values = np.concatenate(chunks)
+            if column_type is str:
+                # Dicts keep insertion order, so the keys are the dictionary in code order
+                columns[field] = StringColumn.from_codes(
+                    list(self._codes.get(field, {})), values, field in self.keys, field in self.searchable
+                )
+            elif column_type is float:
+                columns[field] = FloatColumn.build(values, field in self.ranges)
+            else:
+                columns[field] = IntColumn.build(values, field in self.ranges)
+        catalog = Catalog.from_columns(columns, self.size)
+        catalog.version = self._digest.hexdigest()
+        if self.model is not None:
+            catalog.row_json = BytesTable.build(self._json)
+            self._json = []
+        return catalog
+
+
+def load_catalog(
+    path: str,
+    keys: Sequence[str] = (),
+    ranges: Sequence[str] = (),
+    searchable: Sequence[str] = (),
+    model: Any = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Tuple[Catalog, LoadReport]:
+    """Stream a JSON-lines or CSV file into a new catalog."""
+    report = LoadReport()
+    builder = CatalogBuilder(keys, ranges, searchable, model, infer_numbers=path.endswith(".csv"))
+    for chunk in read_chunks(path, chunk_rows, report):
+        builder.add(chunk, report)
+    if builder.types is None:
+        raise ValueError(f"{path} has no valid rows")
+    report.rows = builder.size
+    return builder.build(), report
+
+
+class _KeyLookup:
+    """
+    Finds a catalog's rows by the values of its key fields (strings compared
+    normalized). It is not kept between deltas: building one encodes every
+    row's key as an integer and argsorts them, O(N log N) in the catalog size.
+    """
+
+    def __init__(self, catalog: Catalog, fields: Sequence[str]):
+        self.lookups: List[Callable[[Any], Optional[int]]] = []
+        self.strides: List[int] = []
+        composite = np.zeros(catalog.size, dtype=np.int64)
+        stride = 1
+        for field in fields:
+            column = catalog.columns[field]
+            if isinstance(column, StringColumn):
+                ranks, domain = column.key_codes[column.codes], len(column.keys)
+                self.lookups.append(column.find_key)
+            else:
+                distinct, ranks = np.unique(column.values, return_inverse=True)
+                domain = len(distinct)
+                self.lookups.append(lambda value, distinct=distinct: _find_sorted(distinct, value))
+            self.strides.append(stride)
+            composite += ranks.astype(np.int64) * stride
+            stride *= max(domain, 1)
+            if stride >= 1 << 62:
+                raise ValueError(f"Key {tuple(fields)} has too many distinct values to combine")
+        self._order = np.argsort(composite, kind="stable").astype(np.int32)
+        self._sorted = composite[self._order]
+
+    def rows(self, key: Tuple[Any, ...]) -> np.ndarray:
+        """Ids of the rows whose key fields equal `key`."""
+        composite = 0
+        for lookup, stride, value in zip(self.lookups, self.strides, key):
+            rank = lookup(value)
+            if rank is None:
+                return np.empty(0, dtype=np.int32)
+            composite += rank * stride
+        start, stop = np.searchsorted(self._sorted, [composite, composite + 1])
+        return self._order[start:stop]
+
+
+def _find_sorted(values: np.ndarray, value: Any) -> Optional[int]:
+    i = int(np.searchsorted(values, value))
+    return i if i < len(values) and values[i] == value else None
+
+
+def _key_of(row: Dict[str, Any], fields: Sequence[str], types: Dict[str, type]) -> Tuple[Any, ...]:
+    return tuple(normalize(row[field]) if types[field] is str else _CONVERTERS[types[field]](row[field]) for field in fields)
+
+
+def apply_delta(
+    catalog: Catalog, path: str, key: Sequence[str], model: Any = None, chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Tuple[Catalog, LoadReport]:
+    """
+    Catalog with the upserts and deletes of the delta file at `path`
+    applied to `catalog`, matched on the `key` fields; the last operation on
+    a key wins. Upserts replace every row with their key. `catalog` itself
+    is not modified.
+    """
+    if not key:
+        raise ValueError("Applying a delta needs the catalog's key fields")
+    report = LoadReport()
+    types = column_types(catalog)
+    builder = CatalogBuilder(model=model, types=types)
+    # Normalized key -> delta row to append, or None to only delete
+    final: Dict[Tuple[Any, ...], Optional[int]] = {}
+    for chunk in read_chunks(path, chunk_rows, report):
+        operations: List[Tuple[str, Any]] = []
+        upserts: Chunk = []
+        for line, row in chunk:
+            operation = row.pop("op", None) or "upsert"
+            if operation == "delete":
+                try:
+                    operations.append(("delete", _key_of(row, key, types)))
+                except KeyError as exc:
+                    report.reject(line, f"missing key field {exc}")
+                except (TypeError, ValueError) as exc:
+                    report.reject(line, f"wrong key type: {exc}")
+            elif operation == "upsert":
+                operations.append(("upsert", len(upserts)))
+                upserts.append((line, row))
+            else:
+                report.reject(line, f"unknown op '{operation}'")
+        first_id = builder.size
+        positions, columns = builder.add(upserts, report)
+        accepted = {position: n for n, position in enumerate(positions)}
+        for operation, target in operations:
+            if operation == "delete":
+                final[target] = None
+            elif target in accepted:
+                n = accepted[target]
+                final[_key_of({field: columns[field][n] for field in key}, key, types)] = first_id + n
+
+    keep = np.ones(catalog.size, dtype=bool)
+    lookup = _KeyLookup(catalog, key)
+    for key_values, row_id in final.items():
+        existing = lookup.rows(key_values)
+        if row_id is None:
+            report.deleted += int(keep[existing].sum())
+        keep[existing] = False
+    new_ids = np.array(sorted(row_id for row_id in final.values() if row_id is not None), dtype=np.int32)
+    report.rows = len(new_ids)
+    return merge(catalog, keep, builder.build(), new_ids), report
+
+
+def merge(catalog: Catalog, keep: np.ndarray, added: Catalog, added_ids: np.ndarray) -> Catalog:
+    """
+    Rows of `catalog` where `keep` is set, followed by rows `added_ids` of
+    `added`, with `catalog`'s indexes carried over: each index is merged
+    from the old one and the few added rows instead of being rebuilt.
+    """
+    kept_ids = np.flatnonzero(keep).astype(np.int32)
+    # Old row id -> new row id, for the rows that are kept
+    renumber = (np.cumsum(keep, dtype=np.int64) - 1).astype(np.int32)
+    columns: Dict[str, Column] = {}
+    for field, column in catalog.columns.items():
+        other = added.columns[field]
+        if isinstance(column, StringColumn):
+            columns[field] = _merge_strings(column, other, keep, kept_ids, added_ids, renumber)
+        else:
+            columns[field] = _merge_numbers(column, other, keep, kept_ids, added_ids, renumber)
+    merged = Catalog.from_columns(columns, len(kept_ids) + len(added_ids))
+
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (catalog.version or "", added.version or ""):
+        digest.update(part.encode("utf-8"))
+    digest.update(np.flatnonzero(~keep).astype(np.int64).tobytes())
+    digest.update(np.asarray(added_ids, dtype=np.int64).tobytes())
+    merged.version = digest.hexdigest()
+
+    if catalog.row_json is not None and added.row_json is not None:
+        lengths = np.diff(catalog.row_json.offsets)
+        blob = catalog.row_json.blob
+        kept_blob = blob if keep.all() else blob[np.repeat(keep, lengths)]
+        added_rows = [added.row_json[row_id] for row_id in added_ids.tolist()]
+        offsets = np.zeros(len(kept_ids) + len(added_rows) + 1, dtype=np.int64)
+        np.cumsum(np.concatenate([lengths[kept_ids], [len(row) for row in added_rows]]), out=offsets[1:])
+        merged.row_json = BytesTable(kept_blob.tobytes() + b"".join(added_rows), offsets)
+    return merged
+
+
+def _merge_postings(
+    order: np.ndarray, offsets: np.ndarray, remap: np.ndarray, keep: np.ndarray, renumber: np.ndarray,
+    added_keys: np.ndarray, first_added: int, key_count: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    CSR postings (row ids grouped by key) of the kept rows, renumbered and
+    with keys remapped, plus the added rows (ids from `first_added`), each
+    appended at the end of its key's group. Linear in the number of rows.
+    """
+    old_keys = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+    survives = keep[order]
+    kept_rows = renumber[order[survives]]
+    kept_keys = remap[old_keys[survives]]
+    added_order = np.argsort(added_keys, kind="stable")
+    added_keys = added_keys[added_order]
+
+    kept_counts = np.bincount(kept_keys, minlength=key_count)
+    counts = kept_counts + np.bincount(added_keys, minlength=key_count)
+    new_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    # Both inputs are grouped by key, so an entry's place in its group is its index minus the group's first index
+    merged = np.empty(len(kept_rows) + len(added_keys), dtype=np.int32)
+    kept_rank = np.arange(len(kept_keys)) - np.searchsorted(kept_keys, kept_keys, side="left")
+    merged[new_offsets[kept_keys] + kept_rank] = kept_rows
+    added_rank = np.arange(len(added_keys)) - np.searchsorted(added_keys, added_keys, side="left")
+    merged[new_offsets[added_keys] + kept_counts[added_keys] + added_rank] = first_added + added_order.astype(np.int32)
+    return merged, new_offsets
+
+
+def _merge_trigrams(index: TrigramIndex, remap: np.ndarray, new_keys: Sequence[Tuple[int, str]], key_count: int) -> TrigramIndex:
+    """`index` with owners remapped to the new key codes and the trigrams of `new_keys` (code, key) added."""
+    old_grams = np.repeat(index.grams, np.diff(index.offsets))
+    gram_list: List[int] = []
+    owner_list: List[int] = []
+    for key_code, key in new_keys:
+        grams = trigrams(key)
+        gram_list.extend(grams)
+        owner_list.extend([key_code] * len(grams))
+    added_grams = np.array(gram_list, dtype=np.int64)
+    grams = np.union1d(index.grams, added_grams)
+
+    # (gram rank, owner) packed into one sortable int64; the old pairs are already in order
+    old_pairs = np.searchsorted(grams, old_grams).astype(np.int64) * key_count + remap[index.owners]
+    added_pairs = np.sort(np.searchsorted(grams, added_grams).astype(np.int64) * key_count + np.array(owner_list, dtype=np.int64))
+    pairs = np.insert(old_pairs, np.searchsorted(old_pairs, added_pairs), added_pairs)
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(pairs // key_count, minlength=len(grams))))).astype(np.int64)
+    return TrigramIndex(grams, offsets, (pairs % key_count).astype(np.int32))
+
+
+def _merge_strings(
+    column: StringColumn, other: StringColumn, keep: np.ndarray, kept_ids: np.ndarray, added_ids: np.ndarray, renumber: np.ndarray
+) -> StringColumn:
+    added_codes = other.codes[added_ids]
+    distinct = np.unique(added_codes)
+
+    # Reuse dictionary entries for values already present; only new values are appended
+    by_key: Optional[np.ndarray] = None
+    appended: List[str] = []
+    code_of: Dict[int, int] = {}
+    new_keys: Dict[str, None] = {}
+    for code in distinct.tolist():
+        value = other.dictionary[code]
+        key_code = column.find_key(value)
+        found = None
+        if key_code is not None:
+            if by_key is None:
+                by_key = np.argsort(column.key_codes, kind="stable")
+                sorted_keys = column.key_codes[by_key]
+            start, stop = np.searchsorted(sorted_keys, [key_code, key_code + 1])
+            found = next((int(c) for c in by_key[start:stop] if column.dictionary[int(c)] == value), None)
+        else:
+            new_keys[normalize(value)] = None
+        if found is None:
+            found = len(column.dictionary) + len(appended)
+            appended.append(value)
+        code_of[code] = found
+
+    keys: Sequence[str] = column.keys
+    remap = np.arange(len(column.keys), dtype=np.int32)
+    inserted: List[Tuple[int, str]] = []
+    if new_keys:
+        added_keys = sorted(new_keys)
+        positions = np.array([bisect_left(column.keys, key) for key in added_keys], dtype=np.int64)
+        remap = remap + np.searchsorted(positions, remap, side="right").astype(np.int32)
+        inserted = [(int(position) + i, key) for i, (position, key) in enumerate(zip(positions.tolist(), added_keys))]
+        # Two sorted runs: the sort is a single linear merge
+        keys = sorted(list(column.keys) + added_keys)
+    inserted_code = {key: code for code, key in inserted}
+
+    dictionary = column.dictionary if not appended else list(column.dictionary) + appended
+    appended_keys = np.array(
+        [inserted_code[normalize(value)] if normalize(value) in inserted_code else int(remap[column.find_key(value)]) for value in appended],
+        dtype=np.int32,
+    )
+    key_codes = np.concatenate([remap[column.key_codes], appended_keys]).astype(np.int32)
+    mapping = np.zeros(len(other.dictionary), dtype=np.int32)
+    mapping[distinct] = [code_of[code] for code in distinct.tolist()]
+    codes = np.concatenate([column.codes[kept_ids], mapping[added_codes]]).astype(np.int32)
+
+    order = offsets = trigrams_index = None
+    if column.order is not None:
+        order, offsets = _merge_postings(
+            column.order, column.offsets, remap, keep, renumber, key_codes[codes[len(kept_ids):]], len(kept_ids), len(keys)
+        )
+    if column.trigrams is not None:
+        trigrams_index = _merge_trigrams(column.trigrams, remap, inserted, len(keys)) if inserted else column.trigrams
+    return StringColumn(dictionary, codes, keys, key_codes, order, offsets, trigrams_index)
+
+
+def _merge_numbers(
+    column: IntColumn, other: IntColumn, keep: np.ndarray, kept_ids: np.ndarray, added_ids: np.ndarray, renumber: np.ndarray
+) -> IntColumn:
+    added = np.asarray(other.values[added_ids], dtype=column.values.dtype)
+    values = np.concatenate([column.values[kept_ids], added])
+    order = sorted_values = None
+    if column.order is not None:
+        survives = keep[column.order]
+        kept_order = renumber[column.order[survives]]
+        kept_sorted = column.sorted_values[survives]
+        added_order = np.argsort(added, kind="stable")
+        added_sorted = added[added_order]
+        # After equal kept values, as a stable sort of the merged column would place them
+        at = np.searchsorted(kept_sorted, added_sorted, side="right")
+        order = np.insert(kept_order, at, len(kept_ids) + added_order.astype(np.int32))
+        sorted_values = np.insert(kept_sorted, at, added_sorted)
+    return type(column)(values, order, sorted_values)
+
+
+def refresh(live: LiveCatalog, source: str, delta: bool = False, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> LoadReport:
+    """
+    Load `source` into `live` (with its model, and the current catalog's
+    indexes), or apply it as a delta on its key fields, then swap it in.
+    """
+    current = live.current
+    if delta:
+        catalog, report = apply_delta(current, source, live.key, live.model, chunk_rows)
+    else:
+        catalog, report = load_catalog(source, model=live.model, chunk_rows=chunk_rows, **index_spec(current))
+    live.swap(catalog)
+    return report
+
+
+# One loader thread: loads run in the background, one at a time, so deltas never race each other
+_LOADER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="catalog-loader")
+
+
+def refresh_in_background(live: LiveCatalog, source: str, delta: bool = False, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> "Future[LoadReport]":
+    return _LOADER.submit(refresh, live, source, delta, chunk_rows)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Stream rows into catalog files and apply delta files to them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("load", help="Stream JSON-lines/CSV rows into a new catalog file")
+    load.add_argument("source", help="Input .jsonl or .csv file")
+    load.add_argument("output", help="Catalog file to write (replaced atomically)")
+    load.add_argument("--keys", nargs="*", default=[], help="String fields to index for equality filters")
+    load.add_argument("--ranges", nargs="*", default=[], help="Numeric fields to index for range filters")
+    load.add_argument("--search", nargs="*", default=[], help="String fields to index for substring and free-text search")
+    apply = commands.add_parser("apply", help="Apply a delta file of upserts and deletes to a catalog file")
+    apply.add_argument("catalog", help="Catalog file to update (replaced atomically)")
+    apply.add_argument("delta", help="Delta .jsonl or .csv file; rows carry an optional op of upsert or delete")
+    apply.add_argument("--key", nargs="+", required=True, help="Fields identifying a row")
+    for command in (load, apply):
+        command.add_argument("--model", help='Validate and pre-encode rows with a response model, e.g. "Book Suggestor/Book Suggestor.py:Book"')
+        command.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows read and validated per batch")
+    args = parser.parse_args(argv)
+
+    model = load_model(args.model) if args.model else None
+    if args.command == "load":
+        catalog, report = load_catalog(args.source, args.keys, args.ranges, args.search, model, args.chunk_rows)
+        output = args.output
+    else:
+        catalog, report = apply_delta(open_catalog(args.catalog), args.delta, args.key, model, args.chunk_rows)
+        output = args.catalog
+    version = write_catalog(catalog, output)
+    print(f"Wrote {catalog.size} rows to {output} (version {version}): {report.rows} loaded, {report.deleted} deleted, {report.rejected} rejected")
+    for error in report.errors:
+        print(f"  line {error.line}: {error.message}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Structured, lazy request logging.
+
+`log_event(logger, "Suggesting books", genre=genre, limit=limit)` logs the
+message followed by its fields as `key=value` pairs. Nothing is formatted
+unless a handler actually emits the record: the level check comes first,
+and the fields are rendered by `Fields.__str__` when the record's message
+is built. The fields are also attached to the record (`record.fields`), so
+a JSON formatter can emit them as-is.
+
+Routine INFO/DEBUG events can be sampled with LOG_SAMPLE_RATE (a fraction,
+1 by default) to keep log volume down under load; warnings and errors are
+always logged.
+"""
+import logging
+import os
+import random
+from typing import Any, Dict
+
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1"))
+
+
+class Fields:
+    """Event fields, rendered as `key=value` pairs only when logged."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: Dict[str, Any]):
+        self.values = values
+
+    def __str__(self) -> str:
+        return " ".join(f"{key}={value!r}" if isinstance(value, str) else f"{key}={value}" for key, value in self.values.items())
+
+
+def log_event(logger: logging.Logger, message: str, level: int = logging.INFO, **fields: Any) -> None:
+    """Log `message` with structured `fields`, sampling routine levels by LOG_SAMPLE_RATE."""
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING and LOG_SAMPLE_RATE < 1 and random.random() >= LOG_SAMPLE_RATE:
+        return
+    logger.log(level, "%s %s", message, Fields(fields), extra={"event": message, "fields": fields})
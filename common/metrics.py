@@ -0,0 +1,256 @@
+"""
+Request metrics for the services, exposed in Prometheus text format.
+
+`instrument(app, name)` adds `MetricsMiddleware` and a `/metrics` route to a
+service app. The middleware times every request into a histogram per route
+template (not per raw path, so the series stay bounded) and counts
+responses per status. While a request runs, the hot-path helpers record
+into it: `phase("filter")` blocks time the filter, sample, rank and
+serialize steps, and `candidates(n)` the size of the filtered candidate
+set. Outside a request both are no-ops, so the catalog code can call them
+unconditionally.
+
+Observations are a bisect and three additions under an uncontended lock;
+nothing is formatted until `/metrics` is scraped. Query cache hit and miss
+counts are read from the registry's caches at scrape time. When apps are
+mounted in the gateway, the innermost instrumented app names the request
+and the outermost records it, so each request is counted once. Metrics are
+per process: with several uvicorn workers each worker reports its own.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import FastAPI, Response
+
+# Upper bounds of the histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HELP = {
+    "http_request_duration_seconds": ("histogram", "Time to handle a request, including streaming the response body."),
+    "http_requests_total": ("counter", "Requests handled, by response status."),
+    "request_phase_seconds": ("histogram", "Time spent in each hot-path phase of a request."),
+    "request_candidates": ("histogram", "Rows matching a request's filters before sampling."),
+    "query_cache_hits_total": ("counter", "Query cache lookups answered from the cache."),
+    "query_cache_misses_total": ("counter", "Query cache lookups that had to be computed."),
+    "query_cache_entries": ("gauge", "Entries currently held by a query cache."),
+    "scheduler_jobs_total": ("counter", "Catalog jobs run, by where they ran: inline, thread or process."),
+    "scheduler_shed_total": ("counter", "Requests answered 503 because a scheduler lane was backed up."),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects it."""
+
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Metrics:
+    """Process-wide set of labelled histograms and counters."""
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], int] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, labels: Labels, bounds: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram(bounds))
+        return histogram
+
+    def inc(self, name: str, labels: Labels, amount: int = 1) -> None:
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def record(self, request: "RequestMetrics", route: str, status: int, seconds: float) -> None:
+        labels = (("app", request.app), ("route", route))
+        self.histogram("http_request_duration_seconds", labels).observe(seconds)
+        self.inc("http_requests_total", labels + (("status", str(status)),))
+        for name, elapsed in request.phases:
+            self.histogram("request_phase_seconds", labels + (("phase", name),)).observe(elapsed)
+        if request.candidates is not None:
+            self.histogram("request_candidates", labels, SIZE_BUCKETS).observe(request.candidates)
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format."""
+        families: Dict[str, List[str]] = {}
+        with self._lock:
+            histograms = list(self.histograms.items())
+            counters = list(self.counters.items())
+        for (name, labels), histogram in sorted(histograms, key=lambda item: item[0]):
+            counts, total, count = histogram.snapshot()
+            lines = families.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket in zip(histogram.bounds + (float("inf"),), counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total!r}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for (name, labels), value in sorted(counters, key=lambda item: item[0]):
+            families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+        for name, labels, value in _cache_samples():
+            families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+
+        output = []
+        for name, lines in families.items():
+            kind, description = HELP.get(name, ("untyped", name))
+            output.append(f"# HELP {name} {description}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(lines)
+        return "\n".join(output) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _cache_samples() -> List[Tuple[str, Labels, int]]:
+    # Imported here: the registry imports the catalog modules, which record into this one
+    from common.registry import REGISTRY
+
+    samples = []
+    for name, cache in sorted(REGISTRY.caches.items()):
+        for kind, lru in (("candidates", cache.candidates), ("responses", cache.responses)):
+            labels = (("cache", name), ("kind", kind))
+            samples.append(("query_cache_hits_total", labels, lru.hits))
+            samples.append(("query_cache_misses_total", labels, lru.misses))
+            samples.append(("query_cache_entries", labels, len(lru)))
+    return samples
+
+
+METRICS = Metrics()
+
+
+class RequestMetrics:
+    """What the hot path recorded while handling one request."""
+
+    __slots__ = ("app", "phases", "candidates")
+
+    def __init__(self, app: str):
+        self.app = app
+        self.phases: List[Tuple[str, float]] = []
+        self.candidates: Optional[int] = None
+
+
+_CURRENT: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+class phase:
+    """Context manager timing a named phase of the current request."""
+
+    __slots__ = ("name", "request", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "phase":
+        self.request = _CURRENT.get()
+        if self.request is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self.request is not None:
+            self.request.phases.append((self.name, time.perf_counter() - self.started))
+
+
+def candidates(count: int) -> None:
+    """Record the size of the current request's candidate set."""
+    request = _CURRENT.get()
+    if request is not None:
+        request.candidates = count
+
+
+def detach() -> None:
+    """Stop recording into the current request from this task; requests it makes in-process record themselves."""
+    _CURRENT.set(None)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency, status and hot-path metrics of each request."""
+
+    def __init__(self, app: Any, name: str, metrics: Metrics = METRICS):
+        self.app = app
+        self.name = name
+        self.metrics = metrics
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        current = _CURRENT.get()
+        if current is not None:
+            # Mounted inside another instrumented app, which records the request
+            current.app = self.name
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestMetrics(self.name)
+        status = 500
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _CURRENT.set(request)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except asyncio.CancelledError:
+            # The client went away or its caller's deadline passed (nginx's "client closed request")
+            status = 499
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _CURRENT.reset(token)
+            # Routing stores the matched route in the shared scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.metrics.record(request, route, status, elapsed)
+
+
+def instrument(app: FastAPI, name: str, metrics: Metrics = METRICS) -> None:
+    """Record request metrics for `app` under `name` and serve them at /metrics."""
+    app.add_middleware(MetricsMiddleware, name=name, metrics=metrics)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint():
+        return Response(metrics.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,161 @@
+"""
+Bounded, cursor-addressable headline storage plus streaming ingestion.
+
+Every headline gets a global, increasing sequence number which clients use
+as a `since` cursor. Headlines are kept in fixed-size ring buffers (one per
+celebrity and one for the combined feed), so memory and request cost stay
+bounded however many headlines are ingested.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_right
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Headline(NamedTuple):
+    seq: int
+    name: str
+    headline: str
+    published_at: float
+
+
+class RingBuffer:
+    """Fixed-capacity sequence that overwrites its oldest item when full."""
+
+    def __init__(self, capacity: int):
+        self._items: List[Any] = [None] * capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("ring buffer index out of range")
+        return self._items[(self._start + index) % len(self._items)]
+
+    def append(self, item: Any) -> None:
+        capacity = len(self._items)
+        if self._size < capacity:
+            self._items[(self._start + self._size) % capacity] = item
+            self._size += 1
+        else:
+            self._items[self._start] = item
+            self._start = (self._start + 1) % capacity
+
+
+class NewsFeed:
+    """Headlines per celebrity and combined, addressable by sequence cursor."""
+
+    def __init__(self, per_celebrity: int = 100, combined: int = 1000):
+        self.per_celebrity = per_celebrity
+        self.cursor = 0
+        self.names: List[str] = []
+        self._by_name: Dict[str, RingBuffer] = {}
+        self._combined = RingBuffer(combined)
+
+    def add(self, name: str, headline: str, published_at: Optional[float] = None) -> Headline:
+        self.cursor += 1
+        item = Headline(self.cursor, name, headline, time.time() if published_at is None else published_at)
+        buffer = self._by_name.get(name)
+        if buffer is None:
+            buffer = self._by_name[name] = RingBuffer(self.per_celebrity)
+            self.names.append(name)
+        buffer.append(item)
+        self._combined.append(item)
+        return item
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def buffer(self, name: str) -> RingBuffer:
+        return self._by_name[name]
+
+    def latest(self, name: Optional[str] = None, since: Optional[int] = None, limit: int = 10) -> List[Headline]:
+        """
+        Headlines for `name` (or all celebrities), oldest first.
+        With `since`, the first `limit` headlines newer than that cursor;
+        otherwise the newest `limit` headlines.
+        """
+        buffer = self._combined if name is None else self._by_name[name]
+        if since is None:
+            start = max(0, len(buffer) - limit)
+        else:
+            start = bisect_right(buffer, since, key=lambda item: item.seq)
+        return [buffer[i] for i in range(start, min(start + limit, len(buffer)))]
+
+    def latest_many(self, names: Optional[Iterable[str]], since: Optional[int] = None, limit: int = 10) -> List[Headline]:
+        """Like `latest`, merged across several celebrities (all of them when `names` is None)."""
+        if names is None:
+            return self.latest(None, since, limit)
+        items = sorted(
+            (item for name in names if name in self._by_name for item in self.latest(name, since, limit)),
+            key=lambda item: item.seq,
+        )
+        return items[:limit] if since is not None else items[-limit:]
+
+
+async def follow_file(path: str, poll_interval: float = 1.0) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield JSON-lines records appended to `path`, like `tail -f`.
+    Each line is an object with "name", "headline" and an optional
+    "published_at" (epoch seconds). Truncation or replacement of the file
+    restarts reading from its beginning.
+    """
+    position = 0
+    inode = None
+    pending = b""
+    while True:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            await asyncio.sleep(poll_interval)
+            continue
+        if st.st_ino != inode or st.st_size < position:
+            inode, position, pending = st.st_ino, 0, b""
+        if st.st_size > position:
+            with open(path, "rb") as fh:
+                fh.seek(position)
+                data = fh.read(st.st_size - position)
+            position += len(data)
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping malformed news record: %r", line[:200])
+        else:
+            await asyncio.sleep(poll_interval)
+
+
+async def drain_queue(queue: "asyncio.Queue[Dict[str, Any]]") -> AsyncIterator[Dict[str, Any]]:
+    """Yield records put on an in-process queue (a stand-in for a message broker)."""
+    while True:
+        yield await queue.get()
+
+
+async def ingest(
+    feed: NewsFeed,
+    source: AsyncIterator[Dict[str, Any]],
+    normalize_name: Callable[[str], str] = str.strip,
+    on_headline: Optional[Callable[[Headline], None]] = None,
+) -> None:
+    """Append every record from `source` to `feed` until cancelled, calling `on_headline` for each."""
+    async for record in source:
+        try:
+            item = feed.add(normalize_name(record["name"]), record["headline"], record.get("published_at"))
+        except (KeyError, TypeError, AttributeError):
+            logger.warning("Skipping news record without name/headline: %r", record)
+            continue
+        if on_headline is not None:
+            on_headline(item)
@@ -0,0 +1,251 @@
+"""
+Playlist sequencing over a music catalog.
+
+Tracks are grouped once per catalog into buckets of equal (genre, mood,
+decade). A playlist is built greedily: after each track the next bucket is
+the cheapest transition from the current one, where moving between moods
+costs their difference in energy level, moving between decades costs the
+number of decades crossed, changing genre costs a fixed amount and every
+track already taken from a bucket makes it more expensive, so the playlist
+keeps drifting to neighbouring buckets instead of circling a few. Within a bucket,
+tracks are drawn at random, skipping tracks already played and artists
+heard within the last `artist_gap` tracks.
+
+Each step only looks at a handful of buckets and a handful of tracks, so a
+playlist of hundreds of tracks costs milliseconds whatever the catalog
+size, and the tracks can be streamed out as they are chosen.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Iterator, Mapping, Optional
+
+import numpy as np
+
+from common.catalog import Catalog
+from common.scheduler import shared
+
+logger = logging.getLogger(__name__)
+
+# Random draws tried in a bucket before moving on to the next cheapest one
+_PROBES = 8
+# Cheapest buckets considered at each step
+_CANDIDATE_BUCKETS = 8
+
+
+class TrackBuckets:
+    """Row ids grouped by (genre, mood, decade), with each bucket's features."""
+
+    def __init__(
+        self,
+        catalog: Catalog,
+        genre_field: str,
+        mood_field: str,
+        decade_field: str,
+        artist_field: str,
+        mood_levels: Mapping[str, float],
+    ):
+        genres = self._key_codes(catalog, genre_field)
+        moods = self._key_codes(catalog, mood_field)
+        decades = np.asarray(catalog.columns[decade_field].values)
+        self.artists = self._key_codes(catalog, artist_field)
+
+        self.order = np.lexsort((decades, moods, genres)).astype(np.int32)
+        genres, moods, decades = genres[self.order], moods[self.order], decades[self.order]
+        changes = np.flatnonzero((genres[1:] != genres[:-1]) | (moods[1:] != moods[:-1]) | (decades[1:] != decades[:-1])) + 1
+        self.starts = np.concatenate(([0], changes)).astype(np.int64) if catalog.size else np.empty(0, dtype=np.int64)
+        self.ends = np.concatenate((changes, [catalog.size])).astype(np.int64) if catalog.size else np.empty(0, dtype=np.int64)
+
+        self.genres = genres[self.starts]
+        self.moods = moods[self.starts]
+        self.decades = decades[self.starts].astype(np.float64)
+        # Unknown moods sit in the middle of the energy scale
+        mood_keys = catalog.columns[mood_field].keys
+        default = float(np.mean(list(mood_levels.values()))) if mood_levels else 0.0
+        self.key_levels = np.array([mood_levels.get(key, default) for key in mood_keys], dtype=np.float64)
+        self.levels = self.key_levels[self.moods] if len(mood_keys) else np.empty(0)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @staticmethod
+    def _key_codes(catalog: Catalog, field: str) -> np.ndarray:
+        column = catalog.columns[field]
+        return column.key_codes[column.codes]
+
+
+class PlaylistEngine:
+    """
+    Greedy playlist sequencer for the catalogs a service serves.
+
+    `mood_levels` maps normalized moods to an energy level; the `*_weight`
+    arguments set the cost of a one-level mood change, a one-decade jump, a
+    genre change and each track already taken from the same bucket. `budget`
+    bounds the seconds spent choosing tracks for one playlist; a playlist
+    that runs out of budget (or of eligible tracks) ends early.
+    """
+
+    def __init__(
+        self,
+        mood_levels: Mapping[str, float],
+        genre_field: str = "genre",
+        mood_field: str = "mood",
+        decade_field: str = "decade",
+        artist_field: str = "artist",
+        mood_weight: float = 1.0,
+        decade_weight: float = 0.5,
+        genre_weight: float = 1.5,
+        reuse_weight: float = 0.3,
+        budget: float = 0.25,
+    ):
+        self.mood_levels = dict(mood_levels)
+        self.fields = (genre_field, mood_field, decade_field, artist_field)
+        self.mood_weight = mood_weight
+        self.decade_weight = decade_weight
+        self.genre_weight = genre_weight
+        self.reuse_weight = reuse_weight
+        self.budget = budget
+        self._catalog: Optional[Catalog] = None
+        self._buckets: Optional[TrackBuckets] = None
+        self._lock = threading.Lock()
+
+    def buckets(self, catalog: Catalog) -> TrackBuckets:
+        """Buckets for `catalog`, rebuilt on first use after the catalog changes."""
+        with self._lock:
+            if self._catalog is not catalog:
+                self._buckets = TrackBuckets(catalog, *self.fields, self.mood_levels)
+                self._catalog = catalog
+            return self._buckets
+
+    def generate(
+        self,
+        catalog: Catalog,
+        length: int,
+        artist_gap: int = 5,
+        genre: Optional[str] = None,
+        mood: Optional[str] = None,
+        decade: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> Optional[Iterator[int]]:
+        """
+        Iterator over the row ids of a playlist of up to `length` tracks, or
+        None when no track matches `genre` or `mood`. The playlist stays
+        within `genre` when given and starts as close as possible to `mood`
+        and `decade`. No artist repeats within `artist_gap` consecutive tracks
+        and no track repeats at all.
+        """
+        buckets = self.buckets(catalog)
+        genre_field, mood_field = self.fields[:2]
+        allowed = np.ones(len(buckets), dtype=bool)
+        if genre:
+            genre_code = catalog.columns[genre_field].find_key(genre)
+            if genre_code is None:
+                return None
+            allowed &= buckets.genres == genre_code
+        if not allowed.any():
+            return None
+
+        start_cost = np.zeros(len(buckets))
+        if mood:
+            mood_code = catalog.columns[mood_field].find_key(mood)
+            if mood_code is None:
+                return None
+            level = buckets.key_levels[mood_code]
+            start_cost += self.mood_weight * (np.abs(buckets.levels - level) + (buckets.moods != mood_code))
+        if decade is not None:
+            start_cost += self.decade_weight * np.abs(buckets.decades - decade) / 10
+        return self._sequence(buckets, allowed, start_cost, length, artist_gap, np.random.default_rng(seed))
+
+    def playlist(
+        self,
+        catalog: Catalog,
+        length: int,
+        artist_gap: int = 5,
+        genre: Optional[str] = None,
+        mood: Optional[str] = None,
+        decade: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> Optional[np.ndarray]:
+        """`generate`, collected into an array of row ids (e.g. to return it from a worker process)."""
+        tracks = self.generate(catalog, length, artist_gap, genre, mood, decade, seed)
+        return None if tracks is None else np.fromiter(tracks, dtype=np.int32)
+
+    def __reduce__(self):
+        # Sent to worker processes by configuration; each process builds its own buckets
+        return shared, (
+            PlaylistEngine, self.mood_levels, *self.fields,
+            self.mood_weight, self.decade_weight, self.genre_weight, self.reuse_weight, self.budget,
+        )
+
+    def _sequence(
+        self,
+        buckets: TrackBuckets,
+        allowed: np.ndarray,
+        start_cost: np.ndarray,
+        length: int,
+        artist_gap: int,
+        rng: np.random.Generator,
+    ) -> Iterator[int]:
+        remaining = (buckets.ends - buckets.starts) * allowed
+        taken = np.zeros(len(buckets))
+        used = set()
+        recent = deque(maxlen=max(artist_gap - 1, 0))
+        current = None
+        spent = 0.0
+
+        for produced in range(length):
+            started = time.perf_counter()
+            if current is None:
+                cost = start_cost.copy()
+            else:
+                cost = (
+                    self.mood_weight * np.abs(buckets.levels - buckets.levels[current])
+                    + self.decade_weight * np.abs(buckets.decades - buckets.decades[current]) / 10
+                    + self.genre_weight * (buckets.genres != buckets.genres[current])
+                    + self.reuse_weight * taken
+                )
+            # A little noise keeps equally cheap buckets from always winning in the same order
+            cost += rng.random(len(cost)) * 0.1
+            cost[remaining == 0] = np.inf
+
+            row_id = bucket = None
+            count = min(_CANDIDATE_BUCKETS, len(cost))
+            nearest = np.argpartition(cost, count - 1)[:count] if count < len(cost) else np.arange(len(cost))
+            for bucket in nearest[np.argsort(cost[nearest])].tolist():
+                if not np.isfinite(cost[bucket]):
+                    break
+                row_id = self._draw(buckets, bucket, remaining[bucket], used, recent, rng)
+                if row_id is not None:
+                    break
+            spent += time.perf_counter() - started
+            if row_id is None:
+                logger.info("Playlist ended after %d tracks: no eligible track left", produced)
+                return
+
+            used.add(row_id)
+            remaining[bucket] -= 1
+            taken[bucket] += 1
+            recent.append(int(buckets.artists[row_id]))
+            current = bucket
+            yield row_id
+
+            if spent > self.budget:
+                logger.warning("Playlist ended after %d tracks: %.0f ms budget spent", produced + 1, self.budget * 1000)
+                return
+
+    @staticmethod
+    def _draw(buckets: TrackBuckets, bucket: int, remaining: int, used: set, recent: deque, rng: np.random.Generator) -> Optional[int]:
+        start, end = int(buckets.starts[bucket]), int(buckets.ends[bucket])
+        if remaining * 4 > end - start:
+            # Mostly unplayed bucket: a few random draws almost always succeed
+            positions = rng.integers(start, end, size=_PROBES).tolist()
+        else:
+            # Mostly played: scan the whole bucket from a random offset
+            offset = int(rng.integers(start, end))
+            positions = list(range(offset, end)) + list(range(start, offset))
+        for position in positions:
+            row_id = int(buckets.order[position])
+            if row_id not in used and int(buckets.artists[row_id]) not in recent:
+                return row_id
+        return None
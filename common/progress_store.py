@@ -0,0 +1,531 @@
+"""
+Storage backends for per-user show progress.
+
+Every backend exposes the same small API (`track_many`, `watched`,
+`shows_for`, `recent_for`, `histogram`, `close`) and keeps progress as
+"highest episode watched" per (user, show), plus the time of the user's
+last activity on the show. Three implementations are available:
+
+    memory  process-local, the original behaviour
+    log     append-only log plus snapshot file, shared by all workers
+    sqlite  SQLite database in WAL mode, shared by all workers
+
+Show names are interned to small integer ids and a user's progress is an
+`array("H")` indexed by show id, so a user costs a few bytes per show
+instead of a dict entry.
+
+Two secondary indexes are maintained on every write, so the per-user and
+per-show views cost the size of their answer rather than a scan of every
+user: each user's shows ordered by last activity, and for each show the
+number of viewers at each episode.
+"""
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from common.group_commit import GroupCommitter
+
+# (username, show name, episode watched)
+TrackItem = Tuple[str, str, int]
+# (show name, episode watched, last activity as a Unix timestamp)
+RecentItem = Tuple[str, int, int]
+
+# A user's recency entries pack the activity time above the show id
+_SHOW_BITS = 32
+_SHOW_MASK = (1 << _SHOW_BITS) - 1
+
+
+class ProgressTable:
+    """Compact in-memory progress: interned show ids and one array per user."""
+
+    def __init__(self):
+        self.shows: List[str] = []
+        self.show_ids: Dict[str, int] = {}
+        self.users: Dict[str, array] = {}
+        # Username -> the user's shows by last activity, oldest first, as (time << 32) | show id
+        self.recent: Dict[str, array] = {}
+        # Show id -> number of viewers whose highest episode watched is each index
+        self.histograms: List[array] = []
+
+    def intern(self, show_name: str) -> Tuple[int, bool]:
+        """Id for `show_name`, and whether it was newly assigned."""
+        show_id = self.show_ids.get(show_name)
+        if show_id is not None:
+            return show_id, False
+        show_id = self.show_ids[show_name] = len(self.shows)
+        self.shows.append(show_name)
+        return show_id, True
+
+    def define(self, show_id: int, show_name: str) -> None:
+        """Register an id assigned elsewhere (when replaying a log)."""
+        while len(self.shows) <= show_id:
+            self.shows.append("")
+        self.shows[show_id] = show_name
+        self.show_ids[show_name] = show_id
+
+    def apply(self, username: str, show_id: int, episode: int, at: int = 0) -> int:
+        progress = self.users.get(username)
+        if progress is None:
+            progress = self.users[username] = array("H")
+        if len(progress) <= show_id:
+            progress.extend([0] * (show_id + 1 - len(progress)))
+        previous = progress[show_id]
+        if episode > previous:
+            progress[show_id] = episode
+            self._count(show_id, previous, episode)
+        self._touch(username, show_id, at)
+        return progress[show_id]
+
+    def load(self, username: str, progress: array, recent: Optional[array] = None) -> None:
+        """Add a user read from a snapshot; without `recent` their shows are ordered by id."""
+        self.users[username] = progress
+        self.recent[username] = recent if recent is not None else array("Q", (i for i, episode in enumerate(progress) if episode))
+        for show_id, episode in enumerate(progress):
+            if episode:
+                self._count(show_id, 0, episode)
+
+    def _touch(self, username: str, show_id: int, at: int) -> None:
+        recent = self.recent.get(username)
+        if recent is None:
+            recent = self.recent[username] = array("Q")
+        # Searched from the newest end, where a show being watched usually is
+        for index in range(len(recent) - 1, -1, -1):
+            if recent[index] & _SHOW_MASK == show_id:
+                del recent[index]
+                break
+        recent.append(at << _SHOW_BITS | show_id)
+
+    def _count(self, show_id: int, previous: int, episode: int) -> None:
+        while len(self.histograms) <= show_id:
+            self.histograms.append(array("L"))
+        histogram = self.histograms[show_id]
+        if len(histogram) <= episode:
+            histogram.extend([0] * (episode + 1 - len(histogram)))
+        if previous:
+            histogram[previous] -= 1
+        histogram[episode] += 1
+
+    def watched(self, username: str, show_name: str) -> int:
+        show_id = self.show_ids.get(show_name)
+        progress = self.users.get(username)
+        if show_id is None or progress is None or show_id >= len(progress):
+            return 0
+        return progress[show_id]
+
+    def shows_for(self, username: str) -> Dict[str, int]:
+        progress = self.users.get(username, ())
+        return {self.shows[show_id]: episode for show_id, episode in enumerate(progress) if episode}
+
+    def recent_for(self, username: str) -> List[RecentItem]:
+        progress = self.users.get(username)
+        return [
+            (self.shows[packed & _SHOW_MASK], progress[packed & _SHOW_MASK], packed >> _SHOW_BITS)
+            for packed in reversed(self.recent.get(username, ()))
+        ]
+
+    def histogram(self, show_name: str) -> Dict[int, int]:
+        show_id = self.show_ids.get(show_name)
+        if show_id is None or show_id >= len(self.histograms):
+            return {}
+        return {episode: viewers for episode, viewers in enumerate(self.histograms[show_id]) if viewers}
+
+
+class ProgressStore(ABC):
+    """Interface shared by the storage backends."""
+
+    def track(self, username: str, show_name: str, episode: int) -> int:
+        """Record a watched episode; returns the user's progress on the show afterwards."""
+        return self.track_many([(username, show_name, episode)])[0]
+
+    @abstractmethod
+    def track_many(self, items: Sequence[TrackItem]) -> List[int]:
+        """Record a batch of watched episodes; returns each user's progress on the show afterwards."""
+
+    @abstractmethod
+    def watched(self, username: str, show_name: str) -> int:
+        """Highest episode of `show_name` watched by `username` (0 if none)."""
+
+    @abstractmethod
+    def shows_for(self, username: str) -> Dict[str, int]:
+        """Progress of `username` on every show they have started."""
+
+    @abstractmethod
+    def recent_for(self, username: str) -> List[RecentItem]:
+        """Every show `username` has started, most recently active first."""
+
+    @abstractmethod
+    def histogram(self, show_name: str) -> Dict[int, int]:
+        """Number of viewers of `show_name` by highest episode watched (episodes nobody stopped at are left out)."""
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryProgressStore(ProgressStore):
+    """Process-local store; progress is lost on restart and not shared between workers."""
+
+    def __init__(self):
+        self._table = ProgressTable()
+        self._lock = threading.Lock()
+
+    def track_many(self, items: Sequence[TrackItem]) -> List[int]:
+        at = int(time.time())
+        with self._lock:
+            return [self._table.apply(username, self._table.intern(show)[0], episode, at) for username, show, episode in items]
+
+    def watched(self, username: str, show_name: str) -> int:
+        return self._table.watched(username, show_name)
+
+    def shows_for(self, username: str) -> Dict[str, int]:
+        with self._lock:
+            return self._table.shows_for(username)
+
+    def recent_for(self, username: str) -> List[RecentItem]:
+        with self._lock:
+            return self._table.recent_for(username)
+
+    def histogram(self, show_name: str) -> Dict[int, int]:
+        with self._lock:
+            return self._table.histogram(show_name)
+
+
+class LogProgressStore(ProgressStore):
+    """
+    Append-only log plus snapshot, shared by every worker using the same `path`.
+
+    Writes are group-committed: one locked append and fsync per batch. Before
+    reading, a worker replays whatever other workers appended since its last
+    read. `compact()` writes a snapshot and starts a new log generation, which
+    other workers notice through the snapshot file and reload from. It runs
+    on its own once the log has grown past `compact_bytes`, so the log stays
+    bounded and a starting worker replays at most that much of it.
+
+    Files: `<path>.snapshot`, `<path>.<generation>.log` and `<path>.lock`.
+    """
+
+    def __init__(self, path: str, max_batch: int = 1024, max_delay: float = 0.002, compact_bytes: int = 64 << 20):
+        self.path = path
+        self.compact_bytes = compact_bytes
+        self._lock = threading.RLock()
+        self._lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._snapshot_stat: Optional[Tuple[int, int]] = None
+        self._log_fd: Optional[int] = None
+        self._generation = 0
+        self._offset = 0
+        self._table = ProgressTable()
+        with self._lock:
+            self._sync()
+        self._committer = GroupCommitter(self._commit, max_batch, max_delay)
+
+    def track_many(self, items: Sequence[TrackItem]) -> List[int]:
+        return self._committer.submit(items)
+
+    def watched(self, username: str, show_name: str) -> int:
+        with self._lock:
+            self._sync()
+            return self._table.watched(username, show_name)
+
+    def shows_for(self, username: str) -> Dict[str, int]:
+        with self._lock:
+            self._sync()
+            return self._table.shows_for(username)
+
+    def recent_for(self, username: str) -> List[RecentItem]:
+        with self._lock:
+            self._sync()
+            return self._table.recent_for(username)
+
+    def histogram(self, show_name: str) -> Dict[int, int]:
+        with self._lock:
+            self._sync()
+            return self._table.histogram(show_name)
+
+    def compact(self, min_bytes: int = 0) -> None:
+        """Snapshot the current state and switch every worker to a fresh log, unless the log is under `min_bytes`."""
+        with self._lock, _FileLock(self._lock_fd):
+            self._sync()
+            # Another worker may have compacted while this one waited for the lock
+            if self._offset < min_bytes:
+                return
+            generation = self._generation + 1
+            snapshot = {
+                "generation": generation,
+                "shows": self._table.shows,
+                "users": {username: list(progress) for username, progress in self._table.users.items()},
+                "recent": {username: list(recent) for username, recent in self._table.recent.items()},
+            }
+            open(self._log_path(generation), "ab").close()
+            tmp_path = f"{self.path}.snapshot.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(snapshot, fh, separators=(",", ":"))
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, f"{self.path}.snapshot")
+            old_log = self._log_path(self._generation)
+            self._sync()
+            if os.path.exists(old_log):
+                os.unlink(old_log)
+
+    def close(self) -> None:
+        self._committer.close()
+        with self._lock:
+            if self._log_fd is not None:
+                os.close(self._log_fd)
+                self._log_fd = None
+            os.close(self._lock_fd)
+
+    def _log_path(self, generation: int) -> str:
+        return f"{self.path}.{generation}.log"
+
+    def _commit(self, items: List[TrackItem]) -> List[int]:
+        with self._lock, _FileLock(self._lock_fd):
+            self._sync()
+            records = []
+            results = []
+            at = int(time.time())
+            for username, show_name, episode in items:
+                show_id, is_new = self._table.intern(show_name)
+                if is_new:
+                    records.append(["S", show_id, show_name])
+                records.append(["T", username, show_id, episode, at])
+                results.append(self._table.apply(username, show_id, episode, at))
+            data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode("utf-8")
+            os.write(self._log_fd, data)
+            os.fsync(self._log_fd)
+            self._offset += len(data)
+        if self._offset >= self.compact_bytes:
+            self.compact(self.compact_bytes)
+        return results
+
+    def _sync(self) -> None:
+        """Reload after a compaction elsewhere, then replay the unread tail of the log."""
+        snapshot_path = f"{self.path}.snapshot"
+        try:
+            st = os.stat(snapshot_path)
+            snapshot_stat = (st.st_ino, st.st_mtime_ns)
+        except FileNotFoundError:
+            snapshot_stat = None
+
+        if self._log_fd is None or snapshot_stat != self._snapshot_stat:
+            table = ProgressTable()
+            generation = 0
+            if snapshot_stat is not None:
+                with open(snapshot_path, encoding="utf-8") as fh:
+                    snapshot = json.load(fh)
+                generation = snapshot["generation"]
+                for show_id, show_name in enumerate(snapshot["shows"]):
+                    table.define(show_id, show_name)
+                # Snapshots written before activity was tracked have no "recent"
+                recent = snapshot.get("recent", {})
+                for username, progress in snapshot["users"].items():
+                    table.load(username, array("H", progress), array("Q", recent[username]) if username in recent else None)
+            if self._log_fd is not None:
+                os.close(self._log_fd)
+            self._log_fd = os.open(self._log_path(generation), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            self._table, self._generation, self._offset = table, generation, 0
+            self._snapshot_stat = snapshot_stat
+
+        size = os.fstat(self._log_fd).st_size
+        if size <= self._offset:
+            return
+        data = os.pread(self._log_fd, size - self._offset, self._offset)
+        # Only consume complete lines; a concurrent append may still be in flight
+        data = data[:data.rfind(b"\n") + 1]
+        for line in data.splitlines():
+            record = json.loads(line)
+            if record[0] == "S":
+                self._table.define(record[1], record[2])
+            else:
+                # Track records written before activity was tracked have no time
+                self._table.apply(*record[1:5])
+        self._offset += len(data)
+
+
+class SqliteProgressStore(ProgressStore):
+    """
+    SQLite database in WAL mode, shared by every worker using the same `path`.
+
+    Writes go through one writer connection and are group-committed as a
+    single transaction per batch; reads use a connection per thread, which
+    WAL lets run concurrently with the writer. The recency order is an index
+    on (username, updated_at), and viewer counts per episode are kept in
+    `show_stats`, updated in the same transaction as the progress they count.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS shows (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+        CREATE TABLE IF NOT EXISTS progress (
+            username TEXT NOT NULL,
+            show_id INTEGER NOT NULL,
+            episode INTEGER NOT NULL,
+            PRIMARY KEY (username, show_id)
+        ) WITHOUT ROWID;
+    """
+
+    # Secondary indexes, added to databases created before they existed
+    _INDEXES = """
+        CREATE INDEX IF NOT EXISTS progress_recent ON progress (username, updated_at);
+        CREATE TABLE show_stats (
+            show_id INTEGER NOT NULL,
+            episode INTEGER NOT NULL,
+            viewers INTEGER NOT NULL,
+            PRIMARY KEY (show_id, episode)
+        ) WITHOUT ROWID;
+        INSERT INTO show_stats SELECT show_id, episode, count(*) FROM progress WHERE episode > 0 GROUP BY show_id, episode;
+    """
+
+    def __init__(self, path: str, max_batch: int = 1024, max_delay: float = 0.002):
+        self.path = path
+        self._local = threading.local()
+        self._show_ids: Dict[str, int] = {}
+        self._writer = self._connect()
+        self._writer.executescript(self._SCHEMA)
+        self._migrate()
+        self._committer = GroupCommitter(self._commit, max_batch, max_delay)
+
+    def track_many(self, items: Sequence[TrackItem]) -> List[int]:
+        return self._committer.submit(items)
+
+    def watched(self, username: str, show_name: str) -> int:
+        show_id = self._show_id(self._reader(), show_name, create=False)
+        if show_id is None:
+            return 0
+        row = self._reader().execute(
+            "SELECT episode FROM progress WHERE username = ? AND show_id = ?", (username, show_id)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def shows_for(self, username: str) -> Dict[str, int]:
+        rows = self._reader().execute(
+            "SELECT s.name, p.episode FROM progress p JOIN shows s ON s.id = p.show_id WHERE p.username = ?",
+            (username,),
+        ).fetchall()
+        return dict(rows)
+
+    def recent_for(self, username: str) -> List[RecentItem]:
+        return self._reader().execute(
+            "SELECT s.name, p.episode, p.updated_at FROM progress p JOIN shows s ON s.id = p.show_id "
+            "WHERE p.username = ? ORDER BY p.updated_at DESC",
+            (username,),
+        ).fetchall()
+
+    def histogram(self, show_name: str) -> Dict[int, int]:
+        show_id = self._show_id(self._reader(), show_name, create=False)
+        if show_id is None:
+            return {}
+        rows = self._reader().execute(
+            "SELECT episode, viewers FROM show_stats WHERE show_id = ? AND viewers > 0", (show_id,)
+        ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        self._committer.close()
+        self._writer.close()
+
+    def _migrate(self) -> None:
+        conn = self._writer
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(progress)")]
+            if "updated_at" not in columns:
+                conn.execute("ALTER TABLE progress ADD COLUMN updated_at INTEGER NOT NULL DEFAULT 0")
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'show_stats'").fetchone() is None:
+                for statement in self._INDEXES.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _show_id(self, conn: sqlite3.Connection, show_name: str, create: bool) -> Optional[int]:
+        show_id = self._show_ids.get(show_name)
+        if show_id is not None:
+            return show_id
+        if create:
+            conn.execute("INSERT OR IGNORE INTO shows (name) VALUES (?)", (show_name,))
+        row = conn.execute("SELECT id FROM shows WHERE name = ?", (show_name,)).fetchone()
+        if row is None:
+            return None
+        self._show_ids[show_name] = row[0]
+        return row[0]
+
+    def _commit(self, items: List[TrackItem]) -> List[int]:
+        conn = self._writer
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = []
+            at = int(time.time())
+            for username, show_name, episode in items:
+                show_id = self._show_id(conn, show_name, create=True)
+                row = conn.execute(
+                    "SELECT episode FROM progress WHERE username = ? AND show_id = ?", (username, show_id)
+                ).fetchone()
+                previous = row[0] if row else 0
+                current = max(previous, episode)
+                conn.execute(
+                    "INSERT INTO progress (username, show_id, episode, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (username, show_id) DO UPDATE SET episode = excluded.episode, updated_at = excluded.updated_at",
+                    (username, show_id, current, at),
+                )
+                if current != previous:
+                    if previous:
+                        conn.execute(
+                            "UPDATE show_stats SET viewers = viewers - 1 WHERE show_id = ? AND episode = ?", (show_id, previous)
+                        )
+                    conn.execute(
+                        "INSERT INTO show_stats (show_id, episode, viewers) VALUES (?, ?, 1) "
+                        "ON CONFLICT (show_id, episode) DO UPDATE SET viewers = viewers + 1",
+                        (show_id, current),
+                    )
+                results.append(current)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+
+
+class _FileLock:
+    """Exclusive `flock` held for the duration of a `with` block."""
+
+    def __init__(self, fd: int):
+        self._fd = fd
+
+    def __enter__(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+def open_progress_store(backend: str = "memory", path: Optional[str] = None) -> ProgressStore:
+    """Create the backend named `backend` ("memory", "log" or "sqlite")."""
+    if backend == "memory":
+        return MemoryProgressStore()
+    if not path:
+        raise ValueError(f"The {backend!r} progress backend needs a path")
+    if backend == "log":
+        return LogProgressStore(path)
+    if backend == "sqlite":
+        return SqliteProgressStore(path)
+    raise ValueError(f"Unknown progress backend {backend!r}")
@@ -0,0 +1,94 @@
+import asyncio
+from typing import Any, Dict, Iterable, Optional, Set
+
+# Put on a subscription's queue when the hub drops it
+EVICTED = object()
+
+
+class Subscription:
+    """One consumer's bounded queue of published items."""
+
+    def __init__(self, hub: "Hub", topics: Optional[frozenset], maxsize: int):
+        self.hub = hub
+        self.topics = topics
+        self.queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize)
+        self.evicted = False
+
+    async def get(self, timeout: Optional[float] = None) -> Any:
+        """
+        Next item, None if `timeout` expires first, or EVICTED once the hub
+        has dropped this subscriber for falling behind.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class Hub:
+    """
+    Asyncio fan-out of published items to subscribers by topic.
+
+    Publishing never blocks: each subscriber has a queue of at most
+    `max_queue` items, and a subscriber whose queue is full is evicted (its
+    backlog is dropped and it receives EVICTED) rather than slowing down
+    everyone else. Subscribers without topics receive everything. Must be
+    used from the event loop thread.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._by_topic: Dict[str, Set[Subscription]] = {}
+        self._everything: Set[Subscription] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._everything) + sum(len(subs) for subs in self._by_topic.values())
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None) -> Subscription:
+        topics = frozenset(topics) if topics else None
+        sub = Subscription(self, topics, self.max_queue)
+        if topics is None:
+            self._everything.add(sub)
+        else:
+            for topic in topics:
+                self._by_topic.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        if sub.topics is None:
+            self._everything.discard(sub)
+            return
+        for topic in sub.topics:
+            subs = self._by_topic.get(topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_topic[topic]
+
+    def publish(self, topic: str, item: Any) -> int:
+        """Deliver `item` to every subscriber of `topic`; returns how many received it."""
+        delivered = 0
+        for sub in list(self._by_topic.get(topic, ())) + list(self._everything):
+            try:
+                sub.queue.put_nowait(item)
+                delivered += 1
+            except asyncio.QueueFull:
+                self._evict(sub)
+        return delivered
+
+    def _evict(self, sub: Subscription) -> None:
+        self.unsubscribe(sub)
+        sub.evicted = True
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(EVICTED)
@@ -0,0 +1,41 @@
+import threading
+from typing import Callable, Dict, TypeVar
+
+from common.cache import QueryCache
+from common.catalog_file import LiveCatalog
+
+T = TypeVar("T")
+
+
+class Registry:
+    """
+    Process-wide registry of named catalogs and caches.
+
+    Services register their catalog and cache here under a short name, so
+    when several services share one process (see gateway.py) everything that
+    needs a catalog by name, such as the gateway's catalog listing, finds the
+    same instance the service itself serves from.
+    """
+
+    def __init__(self):
+        self.catalogs: Dict[str, LiveCatalog] = {}
+        self.caches: Dict[str, QueryCache] = {}
+        self._lock = threading.Lock()
+
+    def catalog(self, name: str, factory: Callable[[], LiveCatalog]) -> LiveCatalog:
+        """Catalog registered as `name`, created with `factory` the first time."""
+        return self._get_or_create(self.catalogs, name, factory)
+
+    def cache(self, name: str, factory: Callable[[], QueryCache] = QueryCache) -> QueryCache:
+        """Cache registered as `name`, created with `factory` the first time."""
+        return self._get_or_create(self.caches, name, factory)
+
+    def _get_or_create(self, registry: Dict[str, T], name: str, factory: Callable[[], T]) -> T:
+        with self._lock:
+            item = registry.get(name)
+            if item is None:
+                item = registry[name] = factory()
+            return item
+
+
+REGISTRY = Registry()
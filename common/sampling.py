@@ -0,0 +1,64 @@
+import random
+from typing import Any, List, Optional, Sequence
+
+from common.metrics import phase
+
+
+def sample(candidates: Sequence[Any], limit: int, seed: Optional[int] = None) -> List[Any]:
+    """
+    Draw up to `limit` distinct items from `candidates` in random order.
+    The source is never mutated, and only `limit` positions are drawn, so a
+    `range` of row ids costs O(limit) however large the catalog is.
+    Passing a `seed` makes the draw reproducible.
+    """
+    with phase("sample"):
+        rng = random if seed is None else random.Random(seed)
+        size = len(candidates)
+        positions = rng.sample(range(size), min(limit, size))
+        return [candidates[i] for i in positions]
+
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(value: int) -> int:
+    """splitmix64 finalizer: a cheap, well-distributed 64-bit hash."""
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+class Permutation:
+    """
+    Pseudo-random permutation of range(size) determined by `seed`, computed
+    one position at a time in O(1) memory: a 4-round Feistel network over
+    the smallest even number of bits covering `size`, cycle-walking past
+    values outside the range. Walking positions 0, 1, 2, ... draws every item
+    exactly once, so a seed plus an offset is enough to resume a draw without
+    replacement.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        self.seed = seed & _MASK64
+        self._half_bits = max(1, (max(size - 1, 1).bit_length() + 1) // 2)
+        self._half_mask = (1 << self._half_bits) - 1
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> int:
+        if not 0 <= index < self.size:
+            raise IndexError("permutation index out of range")
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self._half_bits, value & self._half_mask
+        for round_ in range(self.ROUNDS):
+            left, right = right, left ^ (_mix(self.seed ^ (round_ << 56) ^ right) & self._half_mask)
+        return (left << self._half_bits) | right
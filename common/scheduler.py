@@ -0,0 +1,239 @@
+"""
+Where request work runs: inline, on a thread, or in a worker process.
+
+`await SCHEDULER.run(live, catalog, Catalog.select, equals=...)` calls
+`function(catalog, ...)` and returns its result, choosing where by the size
+of the catalog:
+
+    inline    catalogs up to SCHEDULER_INLINE_ROWS rows; index lookups on
+              them cost less than a hand-off would, so they run on the
+              event loop
+    process   larger file-backed catalogs; a pool of SCHEDULER_PROCESSES
+              worker processes maps the same catalog file, so the work runs
+              next to the event loop instead of on it and outside this
+              process's GIL. By default the cores are divided among the
+              WEB_CONCURRENCY server workers, each of which has its own pool
+    thread    larger in-memory catalogs, which a worker process cannot map
+
+Functions and their arguments are pickled to worker processes, so they
+must be importable from common (e.g. `Catalog.select`, or a method of a
+LiveSimilarity or PlaylistEngine, which arrive as the worker's own copy of
+that engine and keep its derived index between jobs). Results should be
+small, such as row ids; the caller encodes them from its own catalog,
+which the worker checks it is looking at the same version of.
+
+Each lane admits at most SCHEDULER_MAX_QUEUE jobs per worker. Beyond that,
+and for jobs that waited longer than SCHEDULER_MAX_WAIT_MS before
+starting, the request is shed with 503 and a Retry-After estimated from
+the lane's backlog, so a burst of expensive requests cannot queue up
+latency for everything behind it.
+
+Services pass `lifespan` to FastAPI, which starts the scheduler before
+serving, so the worker processes are forked before the first request
+rather than mid-traffic. Their `__main__` sets WEB_CONCURRENCY, which
+uvicorn reads for its worker count and the scheduler for its share of
+the cores.
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException
+
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog, open_catalog
+from common.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_INLINE_ROWS = int(os.environ.get("SCHEDULER_INLINE_ROWS", "20000"))
+# By default the cores are shared among the server's worker processes (uvicorn's WEB_CONCURRENCY)
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+SCHEDULER_PROCESSES = int(os.environ.get("SCHEDULER_PROCESSES", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+SCHEDULER_THREADS = int(os.environ.get("SCHEDULER_THREADS", str(min(32, (os.cpu_count() or 1) + 4))))
+SCHEDULER_MAX_QUEUE = int(os.environ.get("SCHEDULER_MAX_QUEUE", "8"))
+SCHEDULER_MAX_WAIT_MS = float(os.environ.get("SCHEDULER_MAX_WAIT_MS", "1000"))
+
+
+class Expired(Exception):
+    """A job waited in the queue past its deadline and was dropped unrun."""
+
+
+class StaleCatalog(Exception):
+    """The catalog file no longer holds the version the job was submitted for."""
+
+
+def shared(cls: type, *args: Any) -> Any:
+    """
+    One instance of `cls(*args)` per process. Engines reduce to this when
+    pickled, so a worker process builds an engine's derived index once
+    rather than once per job.
+    """
+    key = (cls, repr(args))
+    with _SHARED_LOCK:
+        instance = _SHARED.get(key)
+        if instance is None:
+            instance = _SHARED[key] = cls(*args)
+        return instance
+
+
+_SHARED: Dict[Tuple[type, str], Any] = {}
+_SHARED_LOCK = threading.Lock()
+
+# Catalog files opened by this worker process, by path
+_OPENED: Dict[str, Catalog] = {}
+
+
+def _run_in_worker(path: str, version: str, deadline: float, function: Callable, args: tuple, kwargs: dict) -> Any:
+    if time.time() > deadline:
+        raise Expired()
+    catalog = _OPENED.get(path)
+    if catalog is None or catalog.version != version:
+        catalog = _OPENED[path] = open_catalog(path)
+        if catalog.version != version:
+            raise StaleCatalog()
+    return function(catalog, *args, **kwargs)
+
+
+def _run_on_thread(deadline: float, function: Callable, catalog: Catalog, args: tuple, kwargs: dict) -> Any:
+    if time.time() > deadline:
+        raise Expired()
+    return function(catalog, *args, **kwargs)
+
+
+class Lane:
+    """An executor plus the bookkeeping for admitting and shedding its jobs."""
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.limit = workers * max_queue
+        self.pending = 0
+        self.seconds = 0.01  # moving average of job latency, for Retry-After
+        self.executor: Optional[Executor] = None
+
+    def admit(self) -> None:
+        if self.pending >= self.limit:
+            raise self.overloaded()
+        self.pending += 1
+
+    def done(self, seconds: float) -> None:
+        self.pending -= 1
+        self.seconds += (seconds - self.seconds) * 0.1
+
+    def overloaded(self) -> HTTPException:
+        METRICS.inc("scheduler_shed_total", (("lane", self.name),))
+        retry_after = max(1, math.ceil(self.pending * self.seconds / self.workers))
+        return HTTPException(
+            status_code=503, detail="Server is busy, please retry.", headers={"Retry-After": str(retry_after)}
+        )
+
+
+class Scheduler:
+    """Runs catalog work inline, on a thread pool or on a process pool; see the module docstring."""
+
+    def __init__(
+        self,
+        inline_rows: int = SCHEDULER_INLINE_ROWS,
+        processes: int = SCHEDULER_PROCESSES,
+        threads: int = SCHEDULER_THREADS,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+        max_wait: float = SCHEDULER_MAX_WAIT_MS / 1000,
+    ):
+        self.inline_rows = inline_rows
+        self.max_wait = max_wait
+        self.processes = Lane("process", processes, max_queue) if processes > 0 else None
+        self.threads = Lane("thread", max(1, threads), max_queue)
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Start the worker processes now rather than on the first offloaded
+        job. They are forked, so starting them before serving (e.g. from a
+        lifespan handler) forks a process with no requests in flight.
+        """
+        if self.processes is not None:
+            self._executor(self.processes).submit(os.getpid).result()
+
+    def shutdown(self) -> None:
+        for lane in (self.processes, self.threads):
+            if lane is not None:
+                self._reset(lane)
+
+    def lane(self, live: LiveCatalog, catalog: Catalog) -> str:
+        """Where `run` sends work on `catalog`: "inline", "process" or "thread"."""
+        if catalog.size <= self.inline_rows:
+            return "inline"
+        if self.processes is not None and live.path and catalog.version:
+            return "process"
+        return "thread"
+
+    async def run(self, live: LiveCatalog, catalog: Catalog, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        """`function(catalog, *args, **kwargs)`, run where its cost is best absorbed."""
+        lane = self.lane(live, catalog)
+        if lane == "inline":
+            METRICS.inc("scheduler_jobs_total", (("lane", "inline"),))
+            return function(catalog, *args, **kwargs)
+        if lane == "process":
+            try:
+                return await self._submit(
+                    self.processes, _run_in_worker, live.path, catalog.version, self._deadline(), function, args, kwargs
+                )
+            except StaleCatalog:
+                pass  # the file was replaced after this request took its snapshot
+            except BrokenExecutor:
+                logger.exception("Worker process pool broke; restarting it")
+                self._reset(self.processes)
+        return await self._submit(self.threads, _run_on_thread, self._deadline(), function, catalog, args, kwargs)
+
+    def _deadline(self) -> float:
+        # Wall-clock time, which worker processes share
+        return time.time() + self.max_wait
+
+    async def _submit(self, lane: Lane, call: Callable, *args: Any) -> Any:
+        lane.admit()
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wrap_future(self._executor(lane).submit(call, *args))
+        except Expired:
+            raise lane.overloaded()
+        finally:
+            lane.done(time.perf_counter() - started)
+        METRICS.inc("scheduler_jobs_total", (("lane", lane.name),))
+        return result
+
+    def _executor(self, lane: Lane) -> Executor:
+        with self._lock:
+            if lane.executor is None:
+                if lane is self.processes:
+                    lane.executor = ProcessPoolExecutor(lane.workers, mp_context=_MP_CONTEXT)
+                else:
+                    lane.executor = ThreadPoolExecutor(lane.workers, thread_name_prefix="scheduler")
+            return lane.executor
+
+    def _reset(self, lane: Lane) -> None:
+        with self._lock:
+            if lane.executor is not None:
+                lane.executor.shutdown(wait=False, cancel_futures=True)
+                lane.executor = None
+
+
+# Workers are forked where possible, so they start with the services' modules already imported
+_MP_CONTEXT = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+
+SCHEDULER = Scheduler()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Service lifespan: start SCHEDULER before serving and shut it down after."""
+    SCHEDULER.start()
+    yield
+    SCHEDULER.shutdown()
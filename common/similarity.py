@@ -0,0 +1,199 @@
+"""
+Content-based "more like this" ranking over catalog rows.
+
+Every row becomes a unit-length feature vector: each categorical field is a
+one-hot block (hashed into a fixed number of dimensions when its vocabulary
+is large) and each numeric field an angle, so that nearby values point in
+similar directions. Similarity is the dot product of two vectors, computed
+for a whole candidate set with one matrix-vector product, and the top k
+are picked with `np.partition` instead of a full sort.
+
+For large catalogs an optional random-hyperplane LSH index narrows the
+candidates to rows that share a hash bucket with the query in at least one
+of several tables.
+"""
+import threading
+from typing import Mapping, Optional, Tuple
+
+import numpy as np
+
+from common.catalog import Catalog, IntColumn, StringColumn
+from common.metrics import phase
+from common.scheduler import shared
+
+# Categorical fields with more distinct values than this are hashed into this many dimensions
+MAX_FIELD_DIMS = 32
+
+# Odd multipliers for hashing key codes into a block and choosing their sign
+_HASH_MULTIPLIER = np.int64(2654435761)
+_SIGN_MULTIPLIER = np.int64(40503)
+
+
+def feature_vectors(
+    catalog: Catalog,
+    categorical: Mapping[str, float],
+    numeric: Mapping[str, Tuple[float, float]] = {},
+) -> np.ndarray:
+    """
+    L2-normalized float32 feature matrix with one row per catalog row.
+
+    `categorical` maps string fields to their weight. `numeric` maps integer
+    fields to (weight, span): values `span` apart are orthogonal in that
+    field and values two spans or more apart are opposite.
+    """
+    blocks = []
+    for field, weight in categorical.items():
+        column = catalog.columns[field]
+        if not isinstance(column, StringColumn):
+            raise TypeError(f"{field} is not a string column")
+        codes = column.key_codes[column.codes].astype(np.int64)
+        vocabulary = len(column.keys)
+        block = np.zeros((catalog.size, min(vocabulary, MAX_FIELD_DIMS)), dtype=np.float32)
+        rows = np.arange(catalog.size)
+        if vocabulary <= MAX_FIELD_DIMS:
+            block[rows, codes] = weight
+        else:
+            # Signed feature hashing keeps colliding values uncorrelated on average
+            signs = np.where((codes * _SIGN_MULTIPLIER) >> 7 & 1, weight, -weight).astype(np.float32)
+            block[rows, (codes * _HASH_MULTIPLIER) % MAX_FIELD_DIMS] = signs
+        blocks.append(block)
+
+    for field, (weight, span) in numeric.items():
+        column = catalog.columns[field]
+        if not isinstance(column, IntColumn):
+            raise TypeError(f"{field} is not an integer column")
+        values = column.values.astype(np.float32)
+        lowest = values.min() if len(values) else 0.0
+        angle = np.clip((values - lowest) / span, 0.0, 2.0) * (np.pi / 2)
+        blocks.append(weight * np.stack([np.cos(angle), np.sin(angle)], axis=1).astype(np.float32))
+
+    vectors = np.hstack(blocks) if blocks else np.zeros((catalog.size, 0), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LSHIndex:
+    """
+    Random-hyperplane LSH: each table hashes a vector to the sign pattern of
+    its projections onto `bits` random hyperplanes. Rows are kept sorted by
+    signature per table, so a bucket is a `searchsorted` range.
+    """
+
+    def __init__(self, vectors: np.ndarray, tables: int = 8, bits: int = 12, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((tables, vectors.shape[1], bits)).astype(np.float32)
+        self._weights = (1 << np.arange(bits, dtype=np.int64))
+        self.orders = []
+        self.signatures = []
+        for planes in self.planes:
+            signatures = self._signatures(vectors, planes)
+            order = np.argsort(signatures, kind="stable").astype(np.int32)
+            self.orders.append(order)
+            self.signatures.append(signatures[order])
+
+    def _signatures(self, vectors: np.ndarray, planes: np.ndarray) -> np.ndarray:
+        return ((vectors @ planes) > 0).astype(np.int64) @ self._weights
+
+    def candidates(self, vector: np.ndarray) -> np.ndarray:
+        """Row ids sharing a bucket with `vector` in any table."""
+        found = []
+        for planes, order, signatures in zip(self.planes, self.orders, self.signatures):
+            signature = self._signatures(vector[None, :], planes)[0]
+            start = np.searchsorted(signatures, signature, side="left")
+            stop = np.searchsorted(signatures, signature, side="right")
+            found.append(order[start:stop])
+        return np.unique(np.concatenate(found))
+
+
+class SimilarityIndex:
+    """Ranks catalog rows by cosine similarity to a given row."""
+
+    def __init__(self, vectors: np.ndarray, lsh: Optional[LSHIndex] = None):
+        self.vectors = vectors
+        self.lsh = lsh
+
+    @classmethod
+    def build(
+        cls,
+        catalog: Catalog,
+        categorical: Mapping[str, float],
+        numeric: Mapping[str, Tuple[float, float]] = {},
+        lsh_threshold: int = 100_000,
+    ) -> "SimilarityIndex":
+        """Build the feature matrix, plus an LSH index once the catalog has `lsh_threshold` rows."""
+        vectors = feature_vectors(catalog, categorical, numeric)
+        lsh = LSHIndex(vectors) if catalog.size >= lsh_threshold and vectors.shape[1] else None
+        return cls(vectors, lsh)
+
+    def similar(self, row_id: int, k: int, exact: bool = False) -> np.ndarray:
+        """
+        Ids of the `k` rows most similar to `row_id` (excluding itself), most
+        similar first, ties broken by row id. The LSH index is used unless
+        `exact` is set or it yields fewer than `k` candidates.
+        """
+        with phase("rank"):
+            return self._similar(row_id, k, exact)
+
+    def _similar(self, row_id: int, k: int, exact: bool) -> np.ndarray:
+        query = self.vectors[row_id]
+        candidates = None
+        if self.lsh is not None and not exact:
+            candidates = self.lsh.candidates(query)
+            candidates = candidates[candidates != row_id]
+            if len(candidates) < k:
+                candidates = None
+        if candidates is None:
+            scores = self.vectors @ query
+            scores[row_id] = -np.inf
+            ids = np.arange(len(scores), dtype=np.int32)
+        else:
+            scores = self.vectors[candidates] @ query
+            ids = candidates
+
+        k = min(k, len(ids) - (1 if candidates is None else 0))
+        if k <= 0:
+            return np.empty(0, dtype=np.int32)
+        if k < len(ids):
+            # Keep every row tied with the k-th best, so the row id decides among them too
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            top = np.flatnonzero(scores >= kth)
+        else:
+            top = np.arange(len(ids))
+        top = top[np.lexsort((ids[top], -scores[top]))][:k]
+        return ids[top].astype(np.int32)
+
+
+class LiveSimilarity:
+    """
+    Similarity index for whichever catalog a LiveCatalog currently serves,
+    rebuilt on first use after the catalog version changes.
+    """
+
+    def __init__(
+        self,
+        categorical: Mapping[str, float],
+        numeric: Mapping[str, Tuple[float, float]] = {},
+        lsh_threshold: int = 100_000,
+    ):
+        self.categorical = dict(categorical)
+        self.numeric = dict(numeric)
+        self.lsh_threshold = lsh_threshold
+        self._catalog: Optional[Catalog] = None
+        self._index: Optional[SimilarityIndex] = None
+        self._lock = threading.Lock()
+
+    def index(self, catalog: Catalog) -> SimilarityIndex:
+        with self._lock:
+            if self._catalog is not catalog:
+                self._index = SimilarityIndex.build(catalog, self.categorical, self.numeric, self.lsh_threshold)
+                self._catalog = catalog
+            return self._index
+
+    def similar(self, catalog: Catalog, row_id: int, k: int) -> np.ndarray:
+        """The `k` rows of `catalog` most similar to `row_id`, most similar first."""
+        return self.index(catalog).similar(row_id, k)
+
+    def __reduce__(self):
+        # Sent to worker processes by configuration; each process builds its own index
+        return shared, (LiveSimilarity, self.categorical, self.numeric, self.lsh_threshold)
@@ -0,0 +1,73 @@
+from typing import Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+
+def trigrams(text: str) -> Set[int]:
+    """Distinct trigrams of `text`, each packed into one int64 (21 bits per code point)."""
+    return {
+        (ord(text[i]) << 42) | (ord(text[i + 1]) << 21) | ord(text[i + 2])
+        for i in range(len(text) - 2)
+    }
+
+
+class TrigramIndex:
+    """
+    Trigram postings over a table of normalized strings (a column's keys).
+
+    `grams` is the sorted array of distinct trigrams and
+    `owners[offsets[g]:offsets[g + 1]]` the sorted codes of the strings
+    containing trigram g. A substring query intersects the posting lists of
+    the needle's trigrams, smallest first, and verifies the survivors, since
+    sharing every trigram does not guarantee the needle occurs contiguously.
+    """
+
+    def __init__(self, grams: np.ndarray, offsets: np.ndarray, owners: np.ndarray):
+        self.grams = grams
+        self.offsets = offsets
+        self.owners = owners
+
+    @classmethod
+    def build(cls, keys: Iterable[str]) -> "TrigramIndex":
+        gram_list: List[int] = []
+        owner_list: List[int] = []
+        for key_code, key in enumerate(keys):
+            grams = trigrams(key)
+            gram_list.extend(grams)
+            owner_list.extend([key_code] * len(grams))
+
+        grams = np.array(gram_list, dtype=np.int64)
+        owners = np.array(owner_list, dtype=np.int32)
+        order = np.lexsort((owners, grams))
+        grams, owners = grams[order], owners[order]
+        distinct, starts = np.unique(grams, return_index=True)
+        offsets = np.append(starts, len(grams)).astype(np.int64)
+        return cls(distinct, offsets, owners)
+
+    def search(self, needle: str, keys: Sequence[str]) -> Optional[np.ndarray]:
+        """
+        Sorted codes of the keys containing `needle` (already normalized).
+        Returns None when the needle is shorter than a trigram and the caller
+        has to fall back to scanning the keys.
+        """
+        grams = trigrams(needle)
+        if not grams:
+            return None
+
+        postings = []
+        for gram in grams:
+            i = int(np.searchsorted(self.grams, gram))
+            if i == len(self.grams) or self.grams[i] != gram:
+                return np.empty(0, dtype=np.int32)
+            postings.append(self.owners[self.offsets[i]:self.offsets[i + 1]])
+        postings.sort(key=len)
+
+        matches = postings[0]
+        for other in postings[1:]:
+            positions = np.minimum(np.searchsorted(other, matches), len(other) - 1)
+            matches = matches[other[positions] == matches]
+            if not len(matches):
+                return matches
+        if len(grams) == 1 and len(needle) == 3:
+            return matches
+        return np.fromiter((code for code in matches.tolist() if needle in keys[code]), dtype=np.int32)
@@ -1,52 +1,131 @@
-import random
 import logging
-from typing import List, Optional
-from fastapi import FastAPI, Query, HTTPException
+import os
+import sys
+from datetime import date
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, Query, HTTPException, Request
 from pydantic import BaseModel
 import uvicorn
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.cache import query_key
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog
+from common.geo import LiveGeoGrid
+from common.logs import log_event
+from common.metrics import instrument
+from common.registry import REGISTRY
+from common.scheduler import SCHEDULER, lifespan
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("event_locator_api")
 
-app = FastAPI(title="Event Locator API", version="1.0")
 
-EVENT_DB = [
-    {"name": "Coldplay Concert", "location": "Delhi", "category": "concert"},
-    {"name": "Startup Expo", "location": "Bangalore", "category": "business"},
-    {"name": "Comic Con", "location": "Mumbai", "category": "entertainment"},
-    {"name": "Food Fest", "location": "Chennai", "category": "food"},
-    {"name": "AI Summit", "location": "Hyderabad", "category": "tech"},
-]
+app = FastAPI(title="Event Locator API", version="1.0", lifespan=lifespan)
+instrument(app, "events")
+
+# Dates are ISO strings, so their sorted order is chronological
+EVENT_DB = Catalog([
+    {"name": "Coldplay Concert", "location": "Delhi", "category": "concert", "lat": 28.6139, "lon": 77.209, "start_date": "2026-11-14", "end_date": "2026-11-14"},
+    {"name": "Startup Expo", "location": "Bangalore", "category": "business", "lat": 12.9716, "lon": 77.5946, "start_date": "2026-12-03", "end_date": "2026-12-05"},
+    {"name": "Comic Con", "location": "Mumbai", "category": "entertainment", "lat": 19.076, "lon": 72.8777, "start_date": "2027-01-22", "end_date": "2027-01-24"},
+    {"name": "Food Fest", "location": "Chennai", "category": "food", "lat": 13.0827, "lon": 80.2707, "start_date": "2026-10-30", "end_date": "2026-11-02"},
+    {"name": "AI Summit", "location": "Hyderabad", "category": "tech", "lat": 17.385, "lon": 78.4867, "start_date": "2027-02-10", "end_date": "2027-02-11"},
+], keys=("start_date", "end_date"), searchable=("name", "location", "category"))
 
 class Event(BaseModel):
     name: str
     location: str
     category: str
+    lat: float
+    lon: float
+    start_date: date
+    end_date: date
+
+EVENT_CATALOG = REGISTRY.catalog(
+    "events", lambda: LiveCatalog(os.environ.get("EVENT_CATALOG_PATH"), fallback=EVENT_DB, model=Event, key=("name", "start_date"))
+)
+
+EVENT_CACHE = REGISTRY.cache("events")
+
+# Spatial grid over event coordinates for radius queries
+EVENT_GEO = LiveGeoGrid("lat", "lon")
+
+
+def event_filters(
+    location: Optional[str] = None,
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> Dict[str, Any]:
+    """`Catalog.select` arguments for a /find-events query, before any radius (also run by bench.micro)."""
+    return dict(
+        contains={"location": location, "category": category},
+        text=q,
+        # An event overlaps [from, to] when it ends after `from` and starts before `to`
+        ranges={
+            "end_date": (date_from and date_from.isoformat(), None),
+            "start_date": (None, date_to and date_to.isoformat()),
+        },
+    )
+
 
 @app.get("/", tags=["Health"])
 def root():
     return {"status": "ok", "message": "Event Locator API is online."}
 
 @app.get("/find-events", response_model=List[Event], summary="Find local events")
-def find_events(
+async def find_events(
+    request: Request,
     location: Optional[str] = Query(None, description="City or location"),
     category: Optional[str] = Query(None, description="Event category (e.g., concert, tech)"),
-    limit: int = Query(5, ge=1, le=20)
+    q: Optional[str] = Query(None, description="Free-text search across name, location and category"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Latitude to search around"),
+    lon: Optional[float] = Query(None, ge=-180, le=180, description="Longitude to search around"),
+    radius_km: float = Query(20, gt=0, le=1000, description="Search radius around lat/lon in km"),
+    date_from: Optional[date] = Query(None, alias="from", description="Only events still running on or after this date"),
+    date_to: Optional[date] = Query(None, alias="to", description="Only events starting on or before this date"),
+    limit: int = Query(5, ge=1, le=20),
+    seed: Optional[int] = Query(None, description="Seed for reproducible results")
 ):
-    logger.info(f"Finding events for location={location}, category={category}, limit={limit}")
+    """
+    Find events by location, category, free text and date range. With
+    lat/lon, only events within `radius_km` are returned, nearest first.
+    """
+    log_event(
+        logger, "Finding events", location=location, category=category, q=q, lat=lat, lon=lon,
+        radius_km=radius_km, date_from=date_from, date_to=date_to, limit=limit,
+    )
 
-    results = EVENT_DB
-    if location:
-        results = [event for event in results if location.lower() in event["location"].lower()]
-    if category:
-        results = [event for event in results if category.lower() in event["category"].lower()]
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="lat and lon must be given together.")
+    nearby = lat is not None
 
-    if not results:
+    catalog = EVENT_CATALOG.current
+    filters = query_key(
+        location=location, category=category, q=q, lat=lat, lon=lon,
+        radius_km=radius_km if nearby else None, date_from=date_from, date_to=date_to,
+    )
+    conditions = event_filters(location, category, q, date_from, date_to)
+    row_ids = await EVENT_CACHE.select_async(catalog.version, filters, lambda: (
+        SCHEDULER.run(EVENT_CATALOG, catalog, EVENT_GEO.select_within, lat, lon, radius_km, **conditions) if nearby
+        else SCHEDULER.run(EVENT_CATALOG, catalog, Catalog.select, **conditions)
+    ))
+
+    if len(row_ids) == 0:
         logger.warning("No events found.")
         raise HTTPException(status_code=404, detail="No events found for given filters.")
 
-    random.shuffle(results)
-    return results[:limit]
+    if nearby:
+        # Nearby events are ranked by distance, so the response is deterministic and can be revalidated
+        return EVENT_CACHE.json_response(
+            request, catalog.version, filters + (("limit", limit),),
+            lambda: catalog.json_array(EVENT_GEO.index(catalog).nearest(lat, lon, row_ids, limit)),
+        )
+
+    return EVENT_CACHE.sampled_response(request, catalog, filters, row_ids, limit, seed)
 
 if __name__ == "__main__":
-    uvicorn.run("event_locator_api:app", host="0.0.0.0", port=8002, workers=4, log_level="info")
+    os.environ.setdefault("WEB_CONCURRENCY", "4")
+    uvicorn.run("event locator:app", app_dir=os.path.dirname(os.path.abspath(__file__)), host="0.0.0.0", port=8007, log_level="info")
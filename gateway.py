@@ -0,0 +1,185 @@
+"""
+Single-process gateway serving every entertainment service.
+
+Each service app is mounted under its own prefix, so one process (one event
+loop, one threadpool, one copy of each catalog and cache through
+common.registry) replaces a separate uvicorn deployment per service. The
+services can still be run on their own from their directories.
+
+Run with:
+
+    python gateway.py
+"""
+import importlib.util
+import logging
+import os
+import sys
+from contextlib import AsyncExitStack, asynccontextmanager
+from concurrent.futures import Future
+from types import ModuleType
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+import uvicorn
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+from common.digest import Digest, Source, split_params
+from common.loader import refresh_in_background
+from common.logs import log_event
+from common.metrics import instrument
+from common.registry import REGISTRY
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("entertainment_gateway")
+
+# Mount prefix -> service file, relative to the repository root
+SERVICES = {
+    "/books": "Book Suggestor/Book Suggestor.py",
+    "/games": "Game finder/Game finder.py",
+    "/movies": "Movie recommender/Movie recommender.py",
+    "/music": "Music Playlist Curator/Music playlist curator.py",
+    "/events": "event locator/event locator.py",
+    "/podcasts": "podcast selector/podcast selector.py",
+    "/trivia": "Trivia provider/Trivia provider.py",
+    "/celebrities": "Celebrity news updater/Celebrity news updater.py",
+    "/tv": "Tv show tracker/Tv show tracker.py",
+}
+
+
+def load_service(path: str) -> ModuleType:
+    """Import a service file by path (the file names are not valid module names)."""
+    name = "service_" + os.path.splitext(os.path.basename(path))[0].lower().replace(" ", "_")
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+MODULES: Dict[str, ModuleType] = {prefix: load_service(path) for prefix, path in SERVICES.items()}
+
+# Directory POST /catalogs/{name}/refresh may read source files from; refreshes are disabled when unset
+CATALOG_IMPORT_DIR = os.environ.get("CATALOG_IMPORT_DIR")
+# Catalog name -> status of its latest background refresh
+REFRESHES: Dict[str, Dict[str, Any]] = {}
+
+# Digest source -> mounted service and endpoint it calls
+DIGEST_SOURCES = {
+    "movies": Source("/movies", "/recommend"),
+    "music": Source("/music", "/curate-playlist"),
+    "books": Source("/books", "/suggest-books"),
+    "games": Source("/games", "/suggest-games"),
+    "podcasts": Source("/podcasts", "/suggest-podcasts"),
+    "events": Source("/events", "/find-events"),
+    "trivia": Source("/trivia", "/trivia"),
+    "celebrities": Source("/celebrities", "/celebrity-news"),
+}
+# Sources deployed on their own, called over HTTP instead of in-process: "movies=http://movies:8000,..."
+DIGEST_UPSTREAMS = dict(item.split("=", 1) for item in os.environ.get("DIGEST_UPSTREAMS", "").split(",") if "=" in item)
+DIGEST_TIMEOUT_MS = float(os.environ.get("DIGEST_TIMEOUT_MS", "500"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mounted apps do not get lifespan events of their own, so run them here
+    async with AsyncExitStack() as stack:
+        for prefix, module in MODULES.items():
+            await stack.enter_async_context(module.app.router.lifespan_context(module.app))
+        await stack.enter_async_context(DIGEST)
+        yield
+
+
+app = FastAPI(title="Entertainment Gateway", version="1.0", lifespan=lifespan)
+# Records every request once, labelled with the mounted service that handled it
+instrument(app, "gateway")
+DIGEST = Digest(app, DIGEST_SOURCES, DIGEST_UPSTREAMS, DIGEST_TIMEOUT_MS / 1000)
+
+
+@app.get("/", tags=["Health"])
+def root():
+    return {"status": "ok", "message": "Entertainment Gateway is online.", "services": list(SERVICES)}
+
+
+@app.get("/catalogs", tags=["Health"], summary="List the catalogs loaded in this process")
+def list_catalogs():
+    return {
+        name: {"version": live.current.version, "rows": live.current.size, "path": live.path, "refresh": REFRESHES.get(name)}
+        for name, live in REGISTRY.catalogs.items()
+    }
+
+
+@app.post("/catalogs/{name}/refresh", status_code=202, tags=["Admin"], summary="Reload a catalog from a file in the background")
+def refresh_catalog(
+    name: str,
+    source: str = Query(..., description="JSON-lines or CSV file, relative to CATALOG_IMPORT_DIR"),
+    delta: bool = Query(False, description="Apply the file's upserts and deletes instead of replacing the catalog"),
+):
+    """
+    Stream `source` into a new version of the catalog, or apply it as a
+    delta, on the loader thread; requests keep being served from the current
+    version until the new one is swapped in. Progress is reported by
+    GET /catalogs. File-backed catalogs are rewritten, so every worker picks
+    the new version up; in-memory ones only change in this process.
+    """
+    if not CATALOG_IMPORT_DIR:
+        raise HTTPException(status_code=403, detail="Catalog refreshes are disabled; set CATALOG_IMPORT_DIR.")
+    live = REGISTRY.catalogs.get(name)
+    if live is None:
+        raise HTTPException(status_code=404, detail="Catalog not found.")
+    if delta and not live.key:
+        raise HTTPException(status_code=400, detail="This catalog has no key fields to apply a delta on.")
+    root = os.path.realpath(CATALOG_IMPORT_DIR)
+    path = os.path.realpath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Source file not found.")
+
+    log_event(logger, "Refreshing catalog", name=name, source=source, delta=delta)
+    status: Dict[str, Any] = {"source": source, "delta": delta, "state": "running"}
+    REFRESHES[name] = status
+    refresh_in_background(live, path, delta).add_done_callback(lambda future: status.update(_refresh_outcome(name, future)))
+    return status
+
+
+@app.get("/digest", tags=["Digest"], summary="Get everything the home screen shows in one call")
+async def digest(
+    request: Request,
+    sources: Optional[str] = Query(None, description="Comma-separated sources to include (default: all)"),
+    timeout_ms: float = Query(DIGEST_TIMEOUT_MS, gt=0, le=10_000, description="Deadline for each source"),
+):
+    """
+    Calls the recommendation, playlist, book, game, podcast, event, trivia
+    and celebrity news endpoints concurrently and returns their results
+    under "sources". Parameters are passed to a single source by prefixing
+    them with its name (`movies.genre=drama`, `events.lat=28.6`); `seed`
+    and `limit` apply to every source not given its own. Sources that fail
+    or miss their deadline are listed under "errors" instead of failing the
+    whole digest.
+    """
+    names = list(DIGEST_SOURCES) if sources is None else list(dict.fromkeys(
+        name.strip() for name in sources.split(",") if name.strip()
+    ))
+    unknown = [name for name in names if name not in DIGEST_SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown digest sources: {', '.join(unknown)}.")
+    params = split_params(request.query_params.multi_items(), names, shared=("seed", "limit"))
+    log_event(logger, "Building digest", sources=len(names), timeout_ms=timeout_ms)
+    return Response(await DIGEST.fetch(names, params, timeout_ms / 1000), media_type="application/json")
+
+
+def _refresh_outcome(name: str, future: Future) -> Dict[str, Any]:
+    try:
+        report = future.result()
+    except Exception as exc:
+        logger.exception("Refreshing catalog %s failed", name)
+        return {"state": "failed", "error": str(exc)}
+    log_event(logger, "Refreshed catalog", name=name, rows=report.rows, deleted=report.deleted, rejected=report.rejected)
+    return {"state": "done", **report.as_dict()}
+
+
+for prefix, module in MODULES.items():
+    app.mount(prefix, module.app)
+
+
+if __name__ == "__main__":
+    uvicorn.run("gateway:app", app_dir=ROOT, host="0.0.0.0", port=8080, log_level="info")
@@ -1,55 +1,85 @@
-import random
 import logging
-from typing import List, Optional
-from fastapi import FastAPI, Query, HTTPException
+import os
+import sys
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, Query, HTTPException, Request
 from pydantic import BaseModel
 import uvicorn
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.cache import query_key
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog
+from common.logs import log_event
+from common.metrics import instrument
+from common.registry import REGISTRY
+from common.scheduler import SCHEDULER, lifespan
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("podcast_selector_api")
 
-app = FastAPI(title="Podcast Selector API", version="1.0")
 
-# Sample podcast dataset
-PODCAST_DB = [
+app = FastAPI(title="Podcast Selector API", version="1.0", lifespan=lifespan)
+instrument(app, "podcasts")
+
+# Sample podcast dataset, stored column-wise
+PODCAST_DB = Catalog([
     {"title": "Science Vs", "genre": "science"},
     {"title": "The Daily", "genre": "news"},
     {"title": "Hardcore History", "genre": "history"},
     {"title": "99% Invisible", "genre": "design"},
     {"title": "Darknet Diaries", "genre": "cybersecurity"},
     {"title": "My Favorite Murder", "genre": "true crime"},
-]
+])
 
 # Response model
 class Podcast(BaseModel):
     title: str
     genre: str
 
+PODCAST_CATALOG = REGISTRY.catalog(
+    "podcasts", lambda: LiveCatalog(os.environ.get("PODCAST_CATALOG_PATH"), fallback=PODCAST_DB, model=Podcast, key=("title",))
+)
+
+PODCAST_CACHE = REGISTRY.cache("podcasts")
+
+
+def podcast_filters(genre: Optional[str] = None) -> Dict[str, Any]:
+    """`Catalog.select` arguments for a /suggest-podcasts query (also run by bench.micro)."""
+    return dict(contains={"genre": genre})
+
+
 @app.get("/suggest-podcasts", response_model=List[Podcast], summary="Suggest podcasts based on genre")
-def suggest_podcasts(
+async def suggest_podcasts(
+    request: Request,
     genre: Optional[str] = Query(None, description="Podcast genre like science, news, history, etc."),
-    limit: int = Query(5, ge=1, le=20, description="Number of podcast suggestions (1-20)")
+    limit: int = Query(5, ge=1, le=20, description="Number of podcast suggestions (1-20)"),
+    seed: Optional[int] = Query(None, description="Seed for reproducible results")
 ):
     """
     Suggest a list of podcasts based on genre (optional) and limit.
     """
-    logger.info(f"Received request: genre={genre}, limit={limit}")
+    log_event(logger, "Suggesting podcasts", genre=genre, limit=limit)
     try:
-        results = PODCAST_DB
-        if genre:
-            results = [podcast for podcast in results if genre.lower() in podcast["genre"].lower()]
+        catalog = PODCAST_CATALOG.current
+        filters = query_key(genre=genre)
+        row_ids = await PODCAST_CACHE.select_async(catalog.version, filters, lambda: SCHEDULER.run(
+            PODCAST_CATALOG, catalog, Catalog.select, **podcast_filters(genre)
+        ))
 
-        if not results:
+        if len(row_ids) == 0:
             raise HTTPException(status_code=404, detail="No podcasts found for the given genre.")
 
-        random.shuffle(results)
-        return results[:limit]
+        return PODCAST_CACHE.sampled_response(request, catalog, filters, row_ids, limit, seed)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to suggest podcasts")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 if __name__ == "__main__":
     # Run with multiple workers for handling concurrency
-    uvicorn.run("podcast_selector_api:app", host="0.0.0.0", port=8000, log_level="info", workers=4)
+    os.environ.setdefault("WEB_CONCURRENCY", "4")
+    uvicorn.run("podcast selector:app", app_dir=os.path.dirname(os.path.abspath(__file__)), host="0.0.0.0", port=8006, log_level="info")
@@ -0,0 +1,15 @@
+import importlib.util
+import os
+import sys
+
+# The services and common/ are imported from the repository root, as when they are run
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def load_service(path: str, name: str):
+    """Import a service script, whose directory and file names are not importable as a module."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
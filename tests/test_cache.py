@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+from starlette.requests import Request
+
+from common.cache import QueryCache, query_key
+from common.catalog import Catalog
+
+
+def _request(etag: str = "") -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""})
+
+
+def test_select_caches_per_version():
+    cache = QueryCache()
+    key = query_key(genre="Drama")
+    assert cache.select("v1", key, lambda: [1, 2]) == [1, 2]
+    assert cache.select("v1", key, lambda: [9]) == [1, 2]
+    assert cache.select("v2", key, lambda: [3]) == [3]
+
+
+def test_swap_during_select_does_not_fill_new_version():
+    cache = QueryCache()
+    key = query_key(genre="Drama")
+
+    def compute_on_old_snapshot():
+        # A request on the new catalog version arrives while this one is still filtering
+        assert cache.select("v2", key, lambda: [0]) == [0]
+        return [7, 8, 9]
+
+    assert cache.select("v1", key, compute_on_old_snapshot) == [7, 8, 9]
+    assert cache.select("v2", key, lambda: [1]) == [0]
+    assert cache.select("v2", query_key(genre="Comedy"), lambda: [4]) == [4]
+
+
+def test_swap_during_build_does_not_fill_new_version():
+    cache = QueryCache()
+    key = query_key(seed=1)
+
+    def build_on_old_snapshot():
+        cache._check_version("v2")
+        return [{"title": "old"}]
+
+    assert cache.json_response(_request(), "v1", key, build_on_old_snapshot).body == b'[{"title":"old"}]'
+    assert cache.json_response(_request(), "v2", key, lambda: [{"title": "new"}]).body == b'[{"title":"new"}]'
+
+
+def test_json_response_etag():
+    cache = QueryCache()
+    key = query_key(seed=1)
+    response = cache.json_response(_request(), "v1", key, lambda: b"[1]")
+    etag = response.headers["etag"]
+    assert cache.json_response(_request(etag), "v1", key, lambda: b"[2]").status_code == 304
+    assert cache.json_response(_request(etag), "v2", key, lambda: b"[2]").status_code == 200
+
+
+def test_sampled_response_caches_seeded_draws_only():
+    cache = QueryCache()
+    catalog = Catalog([{"title": str(i)} for i in range(50)])
+    key = query_key(genre="Drama")
+    seeded = cache.sampled_response(_request(), catalog, key, range(50), 5, seed=3)
+    assert len(json.loads(seeded.body)) == 5
+    assert cache.sampled_response(_request(), catalog, key, range(50), 5, seed=3).body == seeded.body
+    assert cache.sampled_response(_request(seeded.headers["etag"]), catalog, key, range(50), 5, seed=3).status_code == 304
+    unseeded = cache.sampled_response(_request(), catalog, key, range(50), 5, seed=None)
+    assert "etag" not in unseeded.headers
+    assert len(json.loads(unseeded.body)) == 5
+    assert len(cache.responses) == 1
+
+
+def test_swap_during_async_select_does_not_fill_new_version():
+    cache = QueryCache()
+    key = query_key(genre="Drama")
+
+    async def compute_on_old_snapshot():
+        # Awaiting the scheduler lets a request on the swapped-in version run meanwhile
+        assert await cache.select_async("v2", key, _returning([0])) == [0]
+        return [7, 8, 9]
+
+    async def scenario():
+        assert await cache.select_async("v1", key, compute_on_old_snapshot) == [7, 8, 9]
+        assert await cache.select_async("v2", key, _returning([1])) == [0]
+        response = await cache.json_response_async(_request(), "v1", query_key(seed=1), _swapping(cache, b"[1]"))
+        assert response.body == b"[1]"
+        response = await cache.json_response_async(_request(), "v2", query_key(seed=1), _returning(b"[2]"))
+        assert response.body == b"[2]"
+
+    asyncio.run(scenario())
+
+
+def _returning(value):
+    async def compute():
+        return value
+
+    return compute
+
+
+def _swapping(cache, value):
+    async def build():
+        cache._check_version("v2")
+        return value
+
+    return build
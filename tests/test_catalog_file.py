@@ -0,0 +1,51 @@
+import time
+
+from pydantic import BaseModel
+
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog, open_catalog, read_source, write_catalog
+
+
+class Book(BaseModel):
+    title: str
+    decade: int
+
+
+def _books(count: int) -> Catalog:
+    return Catalog([{"title": f"Book {i}", "decade": 1900 + 10 * (i % 12)} for i in range(count)], keys=("title",), ranges=("decade",))
+
+
+def test_round_trip(tmp_path):
+    catalog = _books(100).encode_rows(Book)
+    version = write_catalog(catalog, str(tmp_path / "books.cat"))
+    opened = open_catalog(str(tmp_path / "books.cat"))
+    assert opened.version == version
+    assert opened.json_array(range(100)) == catalog.json_array(range(100))
+    assert list(opened.select(ranges={"decade": (1950, 1970)})) == list(catalog.select(ranges={"decade": (1950, 1970)}))
+
+
+def test_replaced_file_is_swapped_in_by_the_watcher(tmp_path):
+    path = str(tmp_path / "books.cat")
+    write_catalog(_books(10), path)
+    live = LiveCatalog(path, check_interval=0.01, model=Book)
+    try:
+        first = live.current
+        assert first.size == 10 and first.row_json is not None
+        write_catalog(_books(20), path)
+        deadline = time.monotonic() + 5
+        while live.current is first and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Published already encoded; the request path only reads it
+        assert live.current.size == 20 and live.current.row_json is not None
+        assert first.json_array(range(10)) == _books(10).encode_rows(Book).json_array(range(10))
+    finally:
+        live.close()
+
+
+def test_csv_columns_are_typed_only_when_every_value_parses(tmp_path):
+    path = tmp_path / "books.csv"
+    path.write_text("title,year,rating,code\nA,-1999,4.5,--5\nB,2001,3,5-\n", encoding="utf-8")
+    assert read_source(str(path)) == [
+        {"title": "A", "year": -1999, "rating": 4.5, "code": "--5"},
+        {"title": "B", "year": 2001, "rating": 3.0, "code": "5-"},
+    ]
@@ -0,0 +1,135 @@
+import json
+import random
+
+import numpy as np
+import pytest
+from pydantic import BaseModel
+
+from common.catalog import Catalog, FloatColumn, IntColumn
+from common.catalog_file import open_catalog, write_catalog
+from common.loader import apply_delta, load_catalog
+
+GENRES = ["fantasy", "Drama", "thriller", "romance", "sci fi"]
+SPEC = dict(keys=("genre",), ranges=("decade",), searchable=("title", "author"))
+KEY = ("title", "author")
+FIELDS = ("title", "author", "genre", "decade", "score")
+
+
+class Book(BaseModel):
+    title: str
+    author: str
+    genre: str
+    decade: int
+    score: float
+
+
+def _book(rng: random.Random, i: int):
+    return {
+        "title": f"Title {i} {rng.choice(['dragon', 'storm', 'river'])}",
+        "author": f"Author {rng.randrange(50)}",
+        "genre": rng.choice(GENRES),
+        "decade": rng.choice(range(1900, 2030, 10)),
+        "score": round(rng.random() * 5, 2),
+    }
+
+
+def _write(path, rows):
+    with open(path, "w", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write((row if isinstance(row, str) else json.dumps(row)) + "\n")
+    return str(path)
+
+
+def _assert_same(catalog: Catalog, expected_rows):
+    expected = Catalog(expected_rows, **SPEC).encode_rows(Book)
+    assert catalog.size == expected.size
+    assert catalog.json_array(range(catalog.size)) == expected.json_array(range(expected.size))
+    queries = (
+        [dict(equals={"genre": genre}) for genre in GENRES + ["new genre"]]
+        + [dict(contains={"author": author}) for author in ("author 1", "thor 7", "new auth")]
+        + [dict(text=text) for text in ("dragon", "title 12", "new")]
+        + [dict(ranges={"decade": (low, low + 30)}) for low in (1890, 1950, 2000)]
+        + [dict(equals={"genre": "drama"}, ranges={"decade": (1950, 1990)}, text="storm")]
+    )
+    for query in queries:
+        assert list(catalog.select(**query)) == list(expected.select(**query)), query
+    for field in ("decade", "score"):
+        assert np.array_equal(catalog.columns[field].order, expected.columns[field].order), field
+
+
+def _delta(rng: random.Random, rows, round_: int):
+    operations = []
+    for n in range(rng.randrange(1, 300)):
+        kind = rng.random()
+        if kind < 0.3:
+            row = rng.choice(rows)
+            operations.append({"op": "delete", "title": row["title"].upper(), "author": row["author"]})
+        elif kind < 0.6:
+            row = dict(rng.choice(rows), genre=rng.choice(GENRES + ["new genre"]), decade=rng.choice(range(1900, 2030, 10)))
+            operations.append({"op": "upsert", **row})
+        else:
+            row = _book(rng, 10_000 + round_ * 1000 + n)
+            operations.append(dict(row, author=rng.choice([row["author"], "New Author"])))
+    operations.append({"op": "delete", "title": "missing", "author": "nobody"})
+
+    # The last operation on a key wins; survivors keep their order and upserts follow in the order of their last operation
+    final = {}
+    for position, operation in enumerate(operations):
+        key = (operation["title"].lower(), operation["author"].lower())
+        final[key] = None if operation.get("op") == "delete" else (position, {field: operation[field] for field in FIELDS})
+    kept = [row for row in rows if (row["title"].lower(), row["author"].lower()) not in final]
+    added = [row for _, row in sorted(value for value in final.values() if value is not None)]
+    return operations, kept + added
+
+
+def test_load_matches_catalog(tmp_path):
+    rng = random.Random(1)
+    rows = [_book(rng, i) for i in range(3000)]
+    bad = {"title": "bad", "author": "x", "genre": "y", "decade": "abc", "score": 1}
+    catalog, report = load_catalog(_write(tmp_path / "books.jsonl", rows + ["not json", bad]), model=Book, chunk_rows=700, **SPEC)
+    assert (report.rows, report.rejected) == (3000, 2)
+    _assert_same(catalog, rows)
+
+
+def test_apply_delta_matches_rebuild(tmp_path):
+    rng = random.Random(2)
+    rows = [_book(rng, i) for i in range(3000)]
+    current, _ = load_catalog(_write(tmp_path / "books.jsonl", rows), model=Book, chunk_rows=700, **SPEC)
+    for round_ in range(6):
+        operations, rows = _delta(rng, rows, round_)
+        if round_ % 2:
+            # Deltas also apply to a memory-mapped catalog file
+            write_catalog(current, str(tmp_path / "books.cat"))
+            current = open_catalog(str(tmp_path / "books.cat"))
+        current, _ = apply_delta(current, _write(tmp_path / f"delta{round_}.jsonl", operations), KEY, Book, chunk_rows=50)
+        _assert_same(current, rows)
+
+
+def test_float_after_int_promotes_column(tmp_path):
+    rows = [{"title": f"Book {i}", "price": 10} for i in range(5)] + [{"title": "Book 5", "price": 9.5}]
+    catalog = Catalog(rows)
+    assert isinstance(catalog.columns["price"], FloatColumn)
+    assert catalog[5]["price"] == 9.5
+    # Within the first chunk and in a later one
+    for chunk_rows in (100, 2):
+        loaded, report = load_catalog(_write(tmp_path / "books.jsonl", rows), chunk_rows=chunk_rows)
+        assert report.rejected == 0
+        assert isinstance(loaded.columns["price"], FloatColumn)
+        assert [loaded[i]["price"] for i in range(6)] == [10, 10, 10, 10, 10, 9.5]
+
+
+def test_integer_column_rejects_fractions(tmp_path):
+    catalog, _ = load_catalog(_write(tmp_path / "books.jsonl", [{"title": "Dune", "decade": 1960}]))
+    assert isinstance(catalog.columns["decade"], IntColumn)
+    delta = _write(tmp_path / "delta.jsonl", [{"title": "Emma", "decade": 1810.5}, {"title": "Ulysses", "decade": 1920.0}])
+    updated, report = apply_delta(catalog, delta, ("title",))
+    assert report.rejected == 1 and "not an integer" in report.errors[0].message
+    assert [updated[i]["decade"] for i in range(updated.size)] == [1960, 1920]
+
+
+def test_text_mixed_with_numbers_is_rejected(tmp_path):
+    rows = [{"title": "Dune", "decade": 1960}, {"title": "Emma", "decade": "1810s"}]
+    with pytest.raises(ValueError, match="mixes text and numbers"):
+        Catalog(rows)
+    with pytest.raises(ValueError, match="mixes text and numbers"):
+        load_catalog(_write(tmp_path / "books.jsonl", rows))
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from common.news_feed import NewsFeed, RingBuffer
+from conftest import load_service
+
+news = load_service("Celebrity news updater/Celebrity news updater.py", "celebrity_news")
+
+
+def test_ring_buffer_keeps_the_newest_items():
+    buffer = RingBuffer(3)
+    for i in range(5):
+        buffer.append(i)
+    assert [buffer[i] for i in range(len(buffer))] == [2, 3, 4]
+    assert buffer[-1] == 4
+
+
+def test_cursor_resumes_after_the_last_seen_headline():
+    feed = NewsFeed(per_celebrity=10, combined=10)
+    for i in range(6):
+        feed.add("Zendaya" if i % 2 else "Tom Holland", f"h{i}")
+    first = feed.latest(None, since=0, limit=4)
+    assert [item.headline for item in first] == ["h0", "h1", "h2", "h3"]
+    assert [item.headline for item in feed.latest(None, since=first[-1].seq, limit=4)] == ["h4", "h5"]
+    assert [item.headline for item in feed.latest("Zendaya", since=2, limit=10)] == ["h3", "h5"]
+    assert [item.headline for item in feed.latest_many(["Zendaya", "Tom Holland"], since=3, limit=2)] == ["h3", "h4"]
+    assert feed.latest(None, since=feed.cursor) == []
+
+
+def test_cursor_older_than_the_buffer_resumes_from_the_oldest_kept():
+    feed = NewsFeed(per_celebrity=3, combined=3)
+    for i in range(8):
+        feed.add("Zendaya", f"h{i}")
+    # Headlines 1-5 were overwritten; the rest are still delivered in order
+    assert [item.headline for item in feed.latest("Zendaya", since=1, limit=10)] == ["h5", "h6", "h7"]
+    assert [item.headline for item in feed.latest(None, since=1, limit=2)] == ["h5", "h6"]
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    monkeypatch.setattr(news, "NEWS_FEED", NewsFeed(per_celebrity=5, combined=5))
+    monkeypatch.setattr(news, "NEWS_HUB", news.Hub(max_queue=2))
+    return news.NEWS_FEED
+
+
+def _publish(name, headline):
+    news.NEWS_HUB.publish(name, news.NEWS_FEED.add(name, headline))
+
+
+def test_stream_replays_backlog_then_pushes_new_headlines(feed):
+    async def scenario():
+        for i in range(3):
+            feed.add("Zendaya", f"h{i}")
+        response = await news.stream_celebrity_news(names=["zendaya"], since=None, last_event_id="1")
+        events = response.body_iterator
+        assert await anext(events) == "retry: 3000\n\n"
+        assert [await anext(events) for _ in range(2)] == [news.format_event(item) for item in feed.latest("Zendaya", since=1)]
+        _publish("Tom Holland", "elsewhere")
+        _publish("Zendaya", "h3")
+        assert await anext(events) == news.format_event(feed.latest("Zendaya", limit=1)[0])
+        await events.aclose()
+        assert news.NEWS_HUB.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_stream_subscriber_that_falls_behind_is_evicted(feed):
+    async def scenario():
+        response = await news.stream_celebrity_news(names=None, since=None, last_event_id=None)
+        events = response.body_iterator
+        assert await anext(events) == "retry: 3000\n\n"
+        for i in range(3):
+            _publish("Zendaya", f"h{i}")
+        assert await anext(events) == "event: evicted\ndata: {}\n\n"
+        with pytest.raises(StopAsyncIteration):
+            await anext(events)
+        # Reconnecting with the last event id replays what was missed, as far as the buffer reaches
+        response = await news.stream_celebrity_news(names=None, since=None, last_event_id="0")
+        events = response.body_iterator
+        await anext(events)
+        assert [await anext(events) for _ in range(3)] == [news.format_event(item) for item in feed.latest(None, since=0)]
+        await events.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_poll_returns_missed_headlines_immediately(feed):
+    async def scenario():
+        for i in range(3):
+            feed.add("Zendaya", f"h{i}")
+        page = await news.poll_celebrity_news(names=None, since=0, timeout=0, limit=2)
+        assert ([item.headline for item in page.items], page.cursor) == (["h0", "h1"], 2)
+        page = await news.poll_celebrity_news(names=None, since=page.cursor, timeout=0, limit=2)
+        assert ([item.headline for item in page.items], page.cursor) == (["h2"], 3)
+        page = await news.poll_celebrity_news(names=None, since=page.cursor, timeout=0, limit=2)
+        assert (page.items, page.cursor) == ([], 3)
+
+    asyncio.run(scenario())
+
+
+def test_poll_waits_for_the_next_headline(feed):
+    async def scenario():
+        feed.add("Zendaya", "old")
+        poll = asyncio.create_task(news.poll_celebrity_news(names=["Zendaya"], since=None, timeout=5, limit=10))
+        await asyncio.sleep(0.05)
+        _publish("Tom Holland", "elsewhere")
+        await asyncio.sleep(0.05)
+        assert not poll.done()
+        _publish("Zendaya", "new")
+        page = await asyncio.wait_for(poll, 1)
+        assert ([item.headline for item in page.items], page.cursor) == (["new"], 3)
+
+    asyncio.run(scenario())
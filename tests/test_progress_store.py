@@ -0,0 +1,122 @@
+import glob
+import os
+import random
+
+import pytest
+
+from common.progress_store import LogProgressStore, MemoryProgressStore, ProgressStore, SqliteProgressStore
+
+SHOWS = [f"Show {i}" for i in range(12)]
+USERS = [f"user{i}" for i in range(30)]
+
+
+def _ops(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [(rng.choice(USERS), rng.choice(SHOWS), rng.randrange(1, 20)) for _ in range(count)]
+
+
+def _track(store: ProgressStore, ops, batch: int = 100):
+    results = []
+    for start in range(0, len(ops), batch):
+        results.extend(store.track_many(ops[start:start + batch]))
+    return results
+
+
+def _state(store: ProgressStore, ordered: bool = True):
+    # SQLite orders activity within the same second arbitrarily, so only the in-process tables compare in order
+    def recent(username):
+        items = [(show, episode) for show, episode, _ in store.recent_for(username)]
+        return items if ordered else sorted(items)
+
+    return {
+        "watched": {(user, show): store.watched(user, show) for user in USERS for show in SHOWS},
+        "shows": {user: store.shows_for(user) for user in USERS},
+        "recent": {user: recent(user) for user in USERS},
+        "histograms": {show: store.histogram(show) for show in SHOWS},
+    }
+
+
+@pytest.fixture
+def memory():
+    store = MemoryProgressStore()
+    yield store
+    store.close()
+
+
+def test_store_is_abstract():
+    with pytest.raises(TypeError):
+        ProgressStore()
+
+
+def test_backends_agree(tmp_path, memory):
+    ops = _ops(3000)
+    log = LogProgressStore(str(tmp_path / "progress"))
+    sqlite = SqliteProgressStore(str(tmp_path / "progress.db"))
+    try:
+        expected = _track(memory, ops)
+        assert _track(log, ops) == expected
+        assert _track(sqlite, ops) == expected
+        assert _state(log) == _state(memory)
+        assert _state(sqlite, ordered=False) == _state(memory, ordered=False)
+        assert memory.track("user0", "Show 0", 1) == log.track("user0", "Show 0", 1) == sqlite.track("user0", "Show 0", 1)
+    finally:
+        log.close()
+        sqlite.close()
+
+
+def test_workers_share_log_and_database(tmp_path):
+    ops = _ops(500)
+    for cls, path in ((LogProgressStore, tmp_path / "progress"), (SqliteProgressStore, tmp_path / "progress.db")):
+        writer, reader = cls(str(path)), cls(str(path))
+        try:
+            _track(writer, ops)
+            assert _state(reader, ordered=False) == _state(writer, ordered=False)
+        finally:
+            writer.close()
+            reader.close()
+
+
+def test_compact_keeps_state(tmp_path, memory):
+    path = str(tmp_path / "progress")
+    ops = _ops(2000)
+    store, other = LogProgressStore(path), LogProgressStore(path)
+    try:
+        _track(memory, ops)
+        _track(store, ops)
+        store.compact()
+        assert _state(store) == _state(memory)
+        assert glob.glob(f"{path}.*.log") == [f"{path}.1.log"]
+        # Another worker reloads from the snapshot and keeps following the new log
+        assert _state(other) == _state(memory)
+        more = _ops(200, seed=2)
+        _track(memory, more)
+        _track(store, more)
+        assert _state(other) == _state(memory)
+    finally:
+        store.close()
+        other.close()
+    reopened = LogProgressStore(path)
+    try:
+        assert _state(reopened) == _state(memory)
+    finally:
+        reopened.close()
+
+
+def test_log_compacts_itself(tmp_path, memory):
+    path = str(tmp_path / "progress")
+    ops = _ops(3000)
+    store = LogProgressStore(path, compact_bytes=8192)
+    try:
+        _track(memory, ops, batch=50)
+        _track(store, ops, batch=50)
+        assert os.path.exists(f"{path}.snapshot")
+        (log,) = glob.glob(f"{path}.*.log")
+        assert os.path.getsize(log) < 8192
+        assert _state(store) == _state(memory)
+    finally:
+        store.close()
+    reopened = LogProgressStore(path)
+    try:
+        assert _state(reopened) == _state(memory)
+    finally:
+        reopened.close()
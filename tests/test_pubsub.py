@@ -0,0 +1,34 @@
+import asyncio
+
+from common.pubsub import EVICTED, Hub
+
+
+def test_publish_reaches_topic_and_catch_all_subscribers():
+    async def scenario():
+        hub = Hub()
+        zendaya, everything, other = hub.subscribe(["Zendaya"]), hub.subscribe(), hub.subscribe(["Tom Holland"])
+        assert hub.publish("Zendaya", 1) == 2
+        assert await zendaya.get(1) == 1 and await everything.get(1) == 1
+        assert await other.get(0.01) is None
+        for sub in (zendaya, everything, other):
+            sub.close()
+        assert hub.subscriber_count == 0
+        assert hub.publish("Zendaya", 2) == 0
+
+    asyncio.run(scenario())
+
+
+def test_subscriber_that_falls_behind_is_evicted():
+    async def scenario():
+        hub = Hub(max_queue=3)
+        slow, fast = hub.subscribe(["Zendaya"]), hub.subscribe(["Zendaya"])
+        for i in range(3):
+            hub.publish("Zendaya", i)
+            assert await fast.get(1) == i
+        assert hub.publish("Zendaya", 3) == 1
+        # The backlog is dropped, so the eviction is the very next item
+        assert slow.evicted and await slow.get(1) is EVICTED
+        assert await fast.get(1) == 3
+        assert hub.subscriber_count == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,30 @@
+import pytest
+
+from common.sampling import Permutation, sample
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 4, 5, 7, 8, 15, 16, 17, 100, 255, 256, 257, 1000, 4099])
+@pytest.mark.parametrize("seed", [0, 1, 42, -1, 2**63 + 5])
+def test_permutation_is_a_bijection(size, seed):
+    permutation = Permutation(size, seed)
+    assert len(permutation) == size
+    assert sorted(permutation[i] for i in range(size)) == list(range(size))
+
+
+def test_permutation_depends_only_on_seed():
+    first, again, other = Permutation(1000, 7), Permutation(1000, 7), Permutation(1000, 8)
+    assert [first[i] for i in range(1000)] == [again[i] for i in range(1000)]
+    assert [first[i] for i in range(1000)] != [other[i] for i in range(1000)]
+
+
+@pytest.mark.parametrize("index", [-1, 10])
+def test_permutation_index_out_of_range(index):
+    with pytest.raises(IndexError):
+        Permutation(10, 1)[index]
+
+
+def test_sample_is_distinct_and_reproducible():
+    drawn = sample(range(10_000), 50, seed=3)
+    assert len(set(drawn)) == 50
+    assert drawn == sample(range(10_000), 50, seed=3)
+    assert sorted(sample(range(5), 50, seed=3)) == list(range(5))
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from common.catalog import Catalog
+from common.catalog_file import LiveCatalog
+from common.metrics import METRICS
+from common.scheduler import Scheduler
+
+CATALOG = Catalog([{"title": f"Book {i}", "genre": "drama" if i % 2 else "comedy"} for i in range(100)])
+LIVE = LiveCatalog(None, fallback=CATALOG)
+
+
+def _blocking(release: threading.Event):
+    def wait(catalog: Catalog) -> int:
+        release.wait(5)
+        return catalog.size
+
+    return wait
+
+
+def _shed() -> int:
+    return METRICS.counters.get(("scheduler_shed_total", (("lane", "thread"),)), 0)
+
+
+def test_lanes():
+    assert Scheduler(inline_rows=1000, processes=0).lane(LIVE, LIVE.current) == "inline"
+    # An in-memory catalog cannot be mapped by a worker process
+    assert Scheduler(inline_rows=0, processes=1).lane(LIVE, LIVE.current) == "thread"
+
+
+def test_run_matches_inline():
+    scheduler = Scheduler(inline_rows=0, processes=0, threads=2)
+    try:
+        offloaded = asyncio.run(scheduler.run(LIVE, LIVE.current, Catalog.select, equals={"genre": "drama"}))
+    finally:
+        scheduler.shutdown()
+    assert list(offloaded) == list(CATALOG.select(equals={"genre": "drama"}))
+
+
+def test_full_lane_sheds_with_retry_after():
+    scheduler = Scheduler(inline_rows=0, processes=0, threads=1, max_queue=2)
+    release = threading.Event()
+    shed = _shed()
+
+    async def scenario():
+        admitted = [asyncio.ensure_future(scheduler.run(LIVE, LIVE.current, _blocking(release))) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as raised:
+            await scheduler.run(LIVE, LIVE.current, _blocking(release))
+        release.set()
+        return raised.value, await asyncio.gather(*admitted)
+
+    try:
+        error, results = asyncio.run(scenario())
+    finally:
+        scheduler.shutdown()
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
+    assert results == [CATALOG.size, CATALOG.size]
+    assert _shed() == shed + 1
+    assert scheduler.threads.pending == 0
+
+
+def test_job_waiting_past_deadline_is_shed():
+    scheduler = Scheduler(inline_rows=0, processes=0, threads=1, max_queue=2, max_wait=0.05)
+    release = threading.Event()
+    ran = []
+
+    def record(catalog: Catalog) -> None:
+        ran.append(catalog.size)
+
+    async def scenario():
+        busy = asyncio.ensure_future(scheduler.run(LIVE, LIVE.current, _blocking(release)))
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(scheduler.run(LIVE, LIVE.current, record))
+        await asyncio.sleep(0.1)
+        release.set()
+        await busy
+        return await asyncio.gather(queued, return_exceptions=True)
+
+    try:
+        (error,) = asyncio.run(scenario())
+    finally:
+        scheduler.shutdown()
+    assert isinstance(error, HTTPException) and error.status_code == 503
+    assert "Retry-After" in error.headers
+    assert ran == []
@@ -0,0 +1,44 @@
+import random
+
+import numpy as np
+
+from common.catalog import Catalog
+from common.similarity import LSHIndex, SimilarityIndex, feature_vectors
+
+CATEGORICAL = {"genre": 1.0, "mood": 0.5}
+NUMERIC = {"decade": (0.5, 20.0)}
+
+
+def _tracks(count: int, seed: int = 0) -> Catalog:
+    rng = random.Random(seed)
+    # Few distinct values, so many rows have identical vectors and tie
+    return Catalog([
+        {"title": f"t{i}", "genre": rng.choice("abc"), "mood": rng.choice("xy"), "decade": rng.choice((1970, 1980, 2000))}
+        for i in range(count)
+    ])
+
+
+def _brute_force(vectors: np.ndarray, row_id: int, k: int) -> list:
+    scores = vectors @ vectors[row_id]
+    ranked = sorted((i for i in range(len(vectors)) if i != row_id), key=lambda i: (-scores[i], i))
+    return ranked[:k]
+
+
+def test_top_k_matches_brute_force_with_ties():
+    catalog = _tracks(300)
+    index = SimilarityIndex.build(catalog, CATEGORICAL, NUMERIC)
+    vectors = feature_vectors(catalog, CATEGORICAL, NUMERIC)
+    for row_id in (0, 17, 299):
+        for k in (1, 5, 40, 299, 500):
+            assert index.similar(row_id, k).tolist() == _brute_force(vectors, row_id, k)
+
+
+def test_lsh_results_are_ranked_candidates():
+    catalog = _tracks(500, seed=1)
+    vectors = feature_vectors(catalog, CATEGORICAL, NUMERIC)
+    index = SimilarityIndex(vectors, LSHIndex(vectors))
+    result = index.similar(3, 10).tolist()
+    assert 3 not in result and len(result) == 10
+    scores = vectors @ vectors[3]
+    assert result == sorted(result, key=lambda i: (-scores[i], i))
+    assert set(result) <= set(index.lsh.candidates(vectors[3]).tolist())
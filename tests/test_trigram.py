@@ -0,0 +1,42 @@
+import random
+
+from common.catalog import Catalog, normalize
+from common.trigram import TrigramIndex, trigrams
+
+
+def _keys(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    # A tiny alphabet makes repeated trigrams and trigram-sharing non-matches common
+    return sorted({"".join(rng.choice("abé ") for _ in range(rng.randint(0, 9))) for _ in range(count)})
+
+
+def test_trigrams_are_distinct():
+    assert len(trigrams("aaaaa")) == 1
+    assert trigrams("ab") == set()
+
+
+def test_search_matches_naive_scan():
+    keys = _keys(400)
+    index = TrigramIndex.build(keys)
+    rng = random.Random(1)
+    needles = ["aaa", "aba", "abab", "é é", "bbbbbbbb", "zzz"] + [
+        "".join(rng.choice("abé ") for _ in range(rng.randint(3, 6))) for _ in range(200)
+    ]
+    for needle in needles:
+        expected = [code for code, key in enumerate(keys) if needle in key]
+        assert index.search(needle, keys).tolist() == expected, needle
+
+
+def test_short_needles_fall_back_to_a_scan():
+    keys = _keys(50)
+    assert TrigramIndex.build(keys).search("ab", keys) is None
+
+
+def test_catalog_contains_matches_naive_scan():
+    rng = random.Random(2)
+    rows = [{"title": "".join(rng.choice("AbÉ ") for _ in range(rng.randint(1, 8)))} for _ in range(300)]
+    catalog = Catalog(rows, keys=("title",), searchable=("title",))
+    for needle in ("a", "ab", "Bab", "é", "ÉÉÉ", "b É", "zz"):
+        expected = [i for i, row in enumerate(rows) if normalize(needle) in normalize(row["title"])]
+        assert sorted(catalog.select(contains={"title": needle})) == expected, needle
+        assert sorted(catalog.select(text=needle)) == expected, needle
@@ -0,0 +1,49 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from common.catalog import Catalog
+from conftest import load_service
+
+trivia = load_service("Trivia provider/Trivia provider.py", "trivia_provider")
+QUESTIONS = [{"category": "big", "question": f"Question {i}?", "answer": str(i)} for i in range(250)]
+
+
+@pytest.fixture
+def client():
+    trivia.TRIVIA_CATALOG.swap(Catalog(QUESTIONS, keys=("category",)))
+    yield TestClient(trivia.app)
+    trivia.TRIVIA_CATALOG.swap(trivia.TRIVIA_DB)
+
+
+def _drain(client, session_id, n):
+    seen = []
+    while True:
+        draw = client.get(f"/trivia/sessions/{session_id}/next", params={"n": n}).json()
+        if not draw["questions"]:
+            return seen, draw["remaining"]
+        seen += [question["question"] for question in draw["questions"]]
+        session_id = draw["session_id"]
+
+
+def test_session_draws_every_question_once(client):
+    session = client.post("/trivia/sessions", params={"category": "big"}).json()
+    assert (session["total"], session["remaining"]) == (250, 250)
+    seen, remaining = _drain(client, session["session_id"], 33)
+    assert sorted(seen) == sorted(question["question"] for question in QUESTIONS)
+    assert remaining == 0
+
+
+def test_session_is_reproducible_and_stateless(client):
+    first = client.post("/trivia/sessions", params={"category": "big", "seed": 5}).json()["session_id"]
+    second = client.post("/trivia/sessions", params={"category": "big", "seed": 5}).json()["session_id"]
+    assert _drain(client, first, 7) == _drain(client, second, 50)
+    # A token is a cursor: drawing with it again returns the same questions
+    assert client.get(f"/trivia/sessions/{first}/next").json() == client.get(f"/trivia/sessions/{first}/next").json()
+
+
+def test_session_errors(client):
+    assert client.get("/trivia/sessions/not-a-session/next").status_code == 404
+    assert client.post("/trivia/sessions", params={"category": "nope"}).status_code == 404
+    session_id = client.post("/trivia/sessions", params={"category": "big"}).json()["session_id"]
+    trivia.TRIVIA_CATALOG.swap(Catalog(QUESTIONS[:100], keys=("category",)))
+    assert client.get(f"/trivia/sessions/{session_id}/next").status_code == 410
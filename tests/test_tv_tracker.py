@@ -0,0 +1,74 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from common.catalog import Catalog
+from common.progress_store import MemoryProgressStore
+from conftest import load_service
+
+# Keep the import from creating the default SQLite file next to the service
+os.environ.setdefault("TV_TRACKER_BACKEND", "memory")
+tv = load_service("Tv show tracker/Tv show tracker.py", "tv_show_tracker")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(tv, "USER_SHOWS_DB", MemoryProgressStore())
+    yield TestClient(tv.app)
+    tv.TV_SHOWS_CATALOG.swap(tv.TV_SHOWS)
+
+
+def _track(client, username, show_name, episode):
+    item = {"username": username, "show_name": show_name, "episode_watched": episode}
+    assert client.post("/track-episode", json=item).status_code == 200
+
+
+def test_batch_reports_errors_per_item(client):
+    items = [
+        {"username": "ana", "show_name": "Breaking Bad", "episode_watched": 3},
+        {"username": "ana", "show_name": "Breaking Badd", "episode_watched": 1},
+        {"username": "ana", "show_name": "The Office", "episode_watched": 0},
+        {"username": "bo", "show_name": "The Office", "episode_watched": 25},
+        {"username": "bo", "show_name": "Stranger Things", "episode_watched": 8},
+    ]
+    result = client.post("/track-episodes:batch", json=items).json()
+    assert result["tracked"] == 2
+    assert [(error["index"], error["status_code"]) for error in result["errors"]] == [(1, 404), (2, 400), (3, 400)]
+    assert result["errors"][2]["detail"] == "Invalid episode. Must be between 1 and 24."
+    assert client.get("/next-episode", params={"username": "ana", "show_name": "Breaking Bad"}).json()["next_episode"] == 4
+    assert client.get("/next-episodes", params={"username": "ana"}).json() == [
+        {"next_episode": 4, "total_episodes": 13, "show_name": "Breaking Bad"}
+    ]
+    assert client.get("/next-episode", params={"username": "bo", "show_name": "Stranger Things"}).json()["next_episode"] is None
+
+
+def test_batch_size_is_limited(client, monkeypatch):
+    monkeypatch.setattr(tv, "MAX_BATCH_ITEMS", 2)
+    item = {"username": "ana", "show_name": "Breaking Bad", "episode_watched": 1}
+    assert client.post("/track-episodes:batch", json=[item] * 3).status_code == 413
+    assert client.post("/track-episodes:batch", json=[item] * 2).json() == {"tracked": 2, "errors": []}
+
+
+def test_stats_histogram(client):
+    for username, episode in (("ana", 2), ("bo", 2), ("cy", 5), ("di", 13)):
+        _track(client, username, "Breaking Bad", episode)
+    stats = client.get("/shows/Breaking Bad/stats").json()
+    assert stats["histogram"] == [0, 2, 0, 0, 1] + [0] * 7 + [1]
+    assert (stats["viewers"], stats["completed"]) == (4, 1)
+    assert client.get("/shows/Breaking Badd/stats").status_code == 404
+
+
+def test_stats_of_a_shortened_show_count_progress_past_the_end_as_completed(client):
+    for username, episode in (("ana", 2), ("bo", 4), ("cy", 5), ("di", 13)):
+        _track(client, username, "Breaking Bad", episode)
+    tv.TV_SHOWS_CATALOG.swap(Catalog([
+        {"show_name": "Breaking Bad", "total_episodes": 4},
+        {"show_name": "Untitled Pilot", "total_episodes": 0},
+    ]))
+    stats = client.get("/shows/Breaking Bad/stats").json()
+    assert (stats["total_episodes"], stats["histogram"]) == (4, [0, 1, 0, 3])
+    assert (stats["viewers"], stats["completed"]) == (4, 3)
+    assert client.get("/shows/Untitled Pilot/stats").json() == {
+        "show_name": "Untitled Pilot", "total_episodes": 0, "viewers": 0, "completed": 0, "histogram": [],
+    }